@@ -0,0 +1,96 @@
+"""
+Defines an in-memory Bloom filter for answering "is this value taken?"
+without querying the DB in the common case that it isn't.
+"""
+
+import hashlib
+import math
+import threading
+
+# The default number of values a filter is sized for
+DEFAULT_CAPACITY = 100000
+# The default fraction of lookups for absent values that report them present
+# when the filter holds its capacity
+DEFAULT_ERROR_RATE = 0.01
+
+# Counters stop counting at this value and are never decremented after, since
+# their true count is unknown
+MAX_COUNT = 255
+
+
+class BloomFilter:
+    """
+    A counting Bloom filter of strings. A lookup that returns False means the
+    value was definitely never added (or has been removed); one that returns
+    True means it probably was, so callers check the source of truth.
+
+    Each slot holds a small counter rather than a bit so values can be removed
+    as well as added.
+    """
+
+    def __init__(self,
+                 values=(),
+                 capacity=DEFAULT_CAPACITY,
+                 error_rate=DEFAULT_ERROR_RATE):
+        """Creates a new filter.
+
+        Args:
+            values: the strings to add to the filter
+            capacity (int): the number of values to size the filter for
+            error_rate (float): the false positive rate to size the filter
+                for
+        """
+        self._lock = threading.Lock()
+        self.error_rate = error_rate
+        self.rebuild(values, capacity)
+
+    def rebuild(self, values, capacity=DEFAULT_CAPACITY):
+        """Replaces the contents of the filter with the given values, sizing
+        it for at least twice as many so it has room to grow."""
+        values = list(values)
+        capacity = max(capacity, 2 * len(values), 1)
+        size = math.ceil(-capacity * math.log(self.error_rate) /
+                         math.log(2)**2)
+        num_hashes = max(round(size / capacity * math.log(2)), 1)
+        counts = bytearray(size)
+        for value in values:
+            for i in _slots(value, size, num_hashes):
+                if counts[i] < MAX_COUNT:
+                    counts[i] += 1
+        with self._lock:
+            self._counts = counts
+            self._num_hashes = num_hashes
+
+    def add(self, value):
+        """Adds a string to the filter."""
+        with self._lock:
+            for i in _slots(value, len(self._counts), self._num_hashes):
+                if self._counts[i] < MAX_COUNT:
+                    self._counts[i] += 1
+
+    def remove(self, value):
+        """Removes a string that was added to the filter."""
+        with self._lock:
+            slots = list(_slots(value, len(self._counts), self._num_hashes))
+            # Removing a value that isn't there would remove others
+            if not all(self._counts[i] for i in slots):
+                return
+            for i in slots:
+                if self._counts[i] < MAX_COUNT:
+                    self._counts[i] -= 1
+
+    def __contains__(self, value):
+        with self._lock:
+            return all(
+                self._counts[i]
+                for i in _slots(value, len(self._counts), self._num_hashes))
+
+
+def _slots(value, size, num_hashes):
+    """Yields the slots the given string maps to in a filter of the given
+    size, deriving all of them from one hash (Kirsch-Mitzenmacher)."""
+    digest = hashlib.blake2b(bytes(value, 'utf-8'), digest_size=16).digest()
+    first = int.from_bytes(digest[:8], 'little')
+    second = int.from_bytes(digest[8:], 'little') | 1
+    for i in range(num_hashes):
+        yield (first + i * second) % size
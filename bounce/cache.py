@@ -0,0 +1,139 @@
+"""
+Defines a size-bounded, time-limited in-process cache for data we read far
+more often than we write.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import REGISTRY
+
+# The default maximum number of entries in a cache
+DEFAULT_MAX_SIZE = 1024
+# The default number of seconds entries stay in a cache
+DEFAULT_TTL = 30
+
+# Returned by TTLCache.get when there is no fresh entry for a key, so that
+# None can be cached
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Maps keys to values, evicting the least recently used entry when the cache
+    is full and treating entries older than the TTL as missing.
+
+    Writers call `invalidate` after changing the data a cache is derived from.
+    Readers take a `generation` before reading that data and pass it to `put`
+    so a value read before an invalidation is never cached after it.
+    """
+
+    def __init__(self, name, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        """Creates a new cache.
+
+        Args:
+            name (str): the name the cache's metrics are recorded under
+            max_size (int): the maximum number of entries to keep
+            ttl (float): the number of seconds to keep each entry for
+        """
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.configure(max_size, ttl)
+        self._hits = REGISTRY.counter(f'cache.{name}.hits',
+                                      'lookups that found a fresh entry')
+        self._misses = REGISTRY.counter(f'cache.{name}.misses',
+                                        'lookups that found no fresh entry')
+        self._evictions = REGISTRY.counter(
+            f'cache.{name}.evictions',
+            'entries dropped because the cache was full or they expired')
+        self._invalidations = REGISTRY.counter(
+            f'cache.{name}.invalidations',
+            'times entries were removed because their data changed')
+        REGISTRY.gauge(f'cache.{name}.size',
+                       'entries in the cache').set_function(self.__len__)
+        REGISTRY.gauge(f'cache.{name}.hit_rate',
+                       'fraction of lookups that found a fresh entry'
+                       ).set_function(self.hit_rate)
+
+    def configure(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        """Updates the cache's size bound and TTL. A max_size or ttl of 0
+        disables the cache."""
+        with self._lock:
+            self.max_size = max_size
+            self.ttl = ttl
+            self._entries.clear()
+
+    @property
+    def enabled(self):
+        """Returns whether the cache stores anything."""
+        return self.max_size > 0 and self.ttl > 0
+
+    @property
+    def generation(self):
+        """Returns a token that changes every time the cache is
+        invalidated."""
+        return self._generation
+
+    def hit_rate(self):
+        """Returns the fraction of lookups so far that found a fresh
+        entry."""
+        hits = self._hits.value
+        lookups = hits + self._misses.value
+        return hits / lookups if lookups else 0.0
+
+    def get(self, key):
+        """Returns the fresh value cached for the given key, or MISSING."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits.inc()
+                    return value
+                del self._entries[key]
+                self._evictions.inc()
+        self._misses.inc()
+        return MISSING
+
+    def put(self, key, value, generation=None, ttl=None):
+        """Caches the given value for the given key.
+
+        Args:
+            key: a hashable key
+            value: the value to cache
+            generation: the value of `generation` from before the value was
+                read. The value isn't cached if the cache has been
+                invalidated since.
+            ttl (float): the number of seconds to keep this entry for if
+                that's less than the cache's TTL
+        """
+        if not self.enabled:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions.inc()
+
+    def invalidate(self, key=MISSING):
+        """Removes the entry for the given key, or every entry if no key is
+        given."""
+        self._invalidations.inc()
+        with self._lock:
+            self._generation += 1
+            if key is MISSING:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
@@ -2,18 +2,29 @@
 Defines Bounce's command line interface.
 """
 
+import json
 import logging
+import os
+import sys
 
 import click
 from sanic.log import logger
 
-from .server import Server
+from . import db
+from .db import club, membership, user
+from .server import DB_DRIVER, Server, codec
+from .server.api import util
 from .server.api.auth import LoginEndpoint
 from .server.api.clubs import (ClubEndpoint, ClubImagesEndpoint, ClubsEndpoint,
-                               SearchClubsEndpoint)
-from .server.api.membership import MembershipEndpoint
-from .server.api.users import (SearchUsersEndpoint, UserEndpoint,
-                               UserImagesEndpoint, UsersEndpoint)
+                               SearchClubsEndpoint, SuggestClubsEndpoint)
+from .server.api.membership import (ClubMembershipEndpoint,
+                                    ImportMembershipsEndpoint,
+                                    MembershipEndpoint)
+from .server.api.metrics import MetricsEndpoint
+from .server.api.users import (SearchUsersEndpoint, SuggestUsersEndpoint,
+                               UserAvailabilityEndpoint, UserEndpoint,
+                               UserImagesEndpoint, UserMembershipsEndpoint,
+                               UsersEndpoint)
 from .server.config import ServerConfig
 
 
@@ -59,6 +70,71 @@ def cli():
     '-d',
     help='the name of the Postgres database the server should use',
     envvar='POSTGRES_DB')
+@click.option(
+    '--pg-pool-size',
+    type=int,
+    help='number of connections to keep open to the DB',
+    envvar='POSTGRES_POOL_SIZE')
+@click.option(
+    '--pg-max-overflow',
+    type=int,
+    help='number of extra DB connections that can be opened under load',
+    envvar='POSTGRES_MAX_OVERFLOW')
+@click.option(
+    '--pg-pool-timeout',
+    type=int,
+    help='seconds to wait for a DB connection before failing the request',
+    envvar='POSTGRES_POOL_TIMEOUT')
+@click.option(
+    '--pg-pool-recycle',
+    type=int,
+    help='seconds after which DB connections are replaced (-1 for never)',
+    envvar='POSTGRES_POOL_RECYCLE')
+@click.option(
+    '--pg-pool-pre-ping/--no-pg-pool-pre-ping',
+    default=None,
+    help='whether to test DB connections for liveness before using them',
+    envvar='POSTGRES_POOL_PRE_PING')
+@click.option(
+    '--pg-pool-prewarm/--no-pg-pool-prewarm',
+    default=None,
+    help='whether to open the pool size\'s worth of DB connections on start',
+    envvar='POSTGRES_POOL_PREWARM')
+@click.option(
+    '--slow-query-ms',
+    type=float,
+    help='log DB queries that take at least this many milliseconds',
+    envvar='BOUNCE_SLOW_QUERY_MS')
+@click.option(
+    '--query-sample-rate',
+    type=float,
+    help='fraction (0 to 1) of other DB queries to log',
+    envvar='BOUNCE_QUERY_SAMPLE_RATE')
+@click.option(
+    '--explain-slow-queries',
+    is_flag=True,
+    help='log the query plan of slow DB queries',
+    envvar='BOUNCE_EXPLAIN_SLOW_QUERIES')
+@click.option(
+    '--search-cache-size',
+    type=int,
+    help='number of club and user searches to cache (0 to disable)',
+    envvar='BOUNCE_SEARCH_CACHE_SIZE')
+@click.option(
+    '--search-cache-ttl',
+    type=float,
+    help='seconds to cache search results for',
+    envvar='BOUNCE_SEARCH_CACHE_TTL')
+@click.option(
+    '--role-cache-size',
+    type=int,
+    help='number of membership roles to cache (0 to disable)',
+    envvar='BOUNCE_ROLE_CACHE_SIZE')
+@click.option(
+    '--role-cache-ttl',
+    type=float,
+    help='seconds to cache membership roles for',
+    envvar='BOUNCE_ROLE_CACHE_TTL')
 @click.option(
     '--allowed-origin',
     '-o',
@@ -70,23 +146,209 @@ def cli():
     '-i',
     help=('path to directory containing images'),
     envvar='IMAGE_DIR')
+@click.option(
+    '--executor-size',
+    '-e',
+    type=int,
+    help='number of threads to run blocking work (DB, files, bcrypt) on',
+    envvar='BOUNCE_EXECUTOR_SIZE')
+@click.option(
+    '--hasher-size',
+    type=int,
+    help='number of processes to hash passwords on (defaults to one per core)',
+    envvar='BOUNCE_HASHER_SIZE')
+@click.option(
+    '--hasher-queue-size',
+    type=int,
+    help='number of password hashes that can wait before requests get a 503',
+    envvar='BOUNCE_HASHER_QUEUE_SIZE')
+@click.option(
+    '--bcrypt-cost',
+    type=click.IntRange(util.MIN_BCRYPT_COST, util.MAX_BCRYPT_COST),
+    help='bcrypt cost to hash passwords with (see `bounce bcrypt-benchmark`)',
+    envvar='BOUNCE_BCRYPT_COST')
+@click.option(
+    '--response-validation-rate',
+    type=float,
+    help='fraction (0 to 1) of responses to check against their schemas',
+    envvar='BOUNCE_RESPONSE_VALIDATION_RATE')
+@click.option(
+    '--json-codec',
+    type=click.Choice([codec.AUTO] + list(codec.LIBRARIES)),
+    help='JSON library to parse requests and write responses with',
+    envvar='BOUNCE_JSON_CODEC')
 @click.option(
     '--loglevel',
     '-l',
     help='the level to log at [critical, error, warning, info, debug]',
     default='debug')
 def start(port, secret, pg_host, pg_port, pg_user, pg_password, pg_database,
-          allowed_origin, image_dir, loglevel):
+          pg_pool_size, pg_max_overflow, pg_pool_timeout, pg_pool_recycle,
+          pg_pool_pre_ping, pg_pool_prewarm, slow_query_ms,
+          query_sample_rate, explain_slow_queries, search_cache_size,
+          search_cache_ttl, role_cache_size, role_cache_ttl, allowed_origin,
+          image_dir, executor_size, hasher_size, hasher_queue_size,
+          bcrypt_cost, response_validation_rate, json_codec, loglevel):
     """Starts the Bounce webserver with the given configuration."""
+    # Click passes every option as a parameter
+    # pylint: disable=too-many-locals
     # Set log level
     logger.setLevel(getattr(logging, loglevel.upper()))
-    conf = ServerConfig(port, secret, pg_host, pg_port, pg_user, pg_password,
-                        pg_database, allowed_origin, image_dir)
+    conf = ServerConfig(
+        port,
+        secret,
+        pg_host,
+        pg_port,
+        pg_user,
+        pg_password,
+        pg_database,
+        allowed_origin,
+        image_dir,
+        executor_size=executor_size,
+        pg_pool_size=pg_pool_size,
+        pg_max_overflow=pg_max_overflow,
+        pg_pool_timeout=pg_pool_timeout,
+        pg_pool_recycle=pg_pool_recycle,
+        pg_pool_pre_ping=pg_pool_pre_ping,
+        pg_pool_prewarm=pg_pool_prewarm,
+        slow_query_ms=slow_query_ms,
+        query_sample_rate=query_sample_rate,
+        explain_slow_queries=explain_slow_queries,
+        search_cache_size=search_cache_size,
+        search_cache_ttl=search_cache_ttl,
+        role_cache_size=role_cache_size,
+        role_cache_ttl=role_cache_ttl,
+        hasher_size=hasher_size,
+        hasher_queue_size=hasher_queue_size,
+        bcrypt_cost=bcrypt_cost,
+        response_validation_rate=response_validation_rate,
+        json_codec=json_codec)
     # Register your new endpoints here
     endpoints = [
         UsersEndpoint, UserEndpoint, UserImagesEndpoint, ClubsEndpoint,
         ClubEndpoint, ClubImagesEndpoint, SearchClubsEndpoint,
-        SearchUsersEndpoint, LoginEndpoint, MembershipEndpoint
+        SearchUsersEndpoint, SuggestClubsEndpoint, SuggestUsersEndpoint,
+        LoginEndpoint, MembershipEndpoint, ClubMembershipEndpoint,
+        ImportMembershipsEndpoint, UserMembershipsEndpoint,
+        UserAvailabilityEndpoint, MetricsEndpoint
     ]
     serv = Server(conf, endpoints)
     serv.start()
+
+
+@cli.command('import-memberships')
+@click.argument('club_name')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    '--editor',
+    required=True,
+    help='username of the club member to import the memberships as')
+@click.option(
+    '--format',
+    'file_format',
+    type=click.Choice(['json', 'csv']),
+    help='format of the file (guessed from its extension by default)')
+@click.option(
+    '--pg-host',
+    '-h',
+    help='hostname of the Postgres instance to import into',
+    envvar='POSTGRES_HOST')
+@click.option(
+    '--pg-port',
+    '-s',
+    help='port the Postgres daemon is listening on',
+    envvar='POSTGRES_PORT')
+@click.option(
+    '--pg-user',
+    '-u',
+    help='name of the Postgres user to access the DB as',
+    envvar='POSTGRES_USER')
+@click.option(
+    '--pg-password',
+    '-p',
+    help='password to access the DB with',
+    envvar='POSTGRES_PASSWORD')
+@click.option(
+    '--pg-database',
+    '-d',
+    help='the name of the Postgres database to import into',
+    envvar='POSTGRES_DB')
+def import_memberships(club_name, path, editor, file_format, pg_host,
+                       pg_port, pg_user, pg_password, pg_database):
+    """Creates or updates the memberships listed in a JSON or CSV file in the
+    given club. Each membership has a username or user_id, a role and a
+    position. Exits with status 1 if any row couldn't be imported."""
+    rows = _read_import_file(path, file_format)
+    engine = db.create_engine(DB_DRIVER, pg_user, pg_password, pg_host,
+                              pg_port, pg_database)
+    try:
+        report = _import_rows(engine, club_name, editor, rows)
+    finally:
+        engine.dispose()
+
+    click.echo(f'Imported {report["imported"]} memberships')
+    for failure in report['failures']:
+        click.echo(f'Row {failure["row"]}: {failure["error"]}', err=True)
+    if report['failures']:
+        sys.exit(1)
+
+
+def _read_import_file(path, file_format):
+    """Returns the rows in the given JSON or CSV membership import file. The
+    format is guessed from the file's extension if it's None."""
+    if file_format is None:
+        file_format = 'csv' if os.path.splitext(path)[1] == '.csv' else 'json'
+    with open(path, encoding='utf-8') as import_file:
+        text = import_file.read()
+    try:
+        if file_format == 'csv':
+            return membership.parse_import_csv(text)
+        return json.loads(text)
+    except ValueError as err:
+        raise click.ClickException(f'Failed to read {path}: {err}')
+
+
+def _import_rows(engine, club_name, editor, rows):
+    """Imports the given membership rows into the named club as the named
+    user and returns the import report."""
+    session = db.get_sessionmaker(engine)()
+    try:
+        club_id = club.select_id(session, club_name)
+        if club_id is None:
+            raise click.ClickException(f'No club named {club_name}')
+        editor_info = user.select(session, editor)
+        if editor_info is None:
+            raise click.ClickException(f'No user named {editor}')
+        return membership.import_rows(session, club_id,
+                                      editor_info.identifier, rows)
+    except (ValueError, PermissionError) as err:
+        raise click.ClickException(str(err))
+    finally:
+        session.close()
+
+
+@cli.command('bcrypt-benchmark')
+@click.option(
+    '--budget-ms',
+    type=float,
+    default=250,
+    help='the most milliseconds hashing or checking a password should take')
+@click.option(
+    '--samples',
+    type=click.IntRange(1, None),
+    default=3,
+    help='number of times to hash with each cost')
+def bcrypt_benchmark(budget_ms, samples):
+    """Times password hashing with increasing bcrypt costs on this host and
+    recommends the highest cost that fits the latency budget. Logins take
+    about as long as hashing, on top of any time spent waiting for a hashing
+    process."""
+    timings, recommended = util.benchmark_costs(
+        budget_ms / 1000, samples=samples)
+    for cost, seconds in timings:
+        click.echo(f'cost {cost:2d}: {seconds * 1000:8.1f} ms')
+    if recommended is None:
+        raise click.ClickException(
+            f'Even the lowest cost takes longer than {budget_ms} ms')
+    click.echo(f'Recommended cost: {recommended} '
+               f'(set BOUNCE_BCRYPT_COST={recommended})')
@@ -1,11 +1,25 @@
 """Utilities for interacting with the DB."""
 
+import base64
+import itertools
+import math
+import re
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
 from enum import Enum
 
+import asyncpg
 import sqlalchemy
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.dialects.postgresql import ENUM
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from . import querylog
+from ..cache import MISSING
+from ..metrics import REGISTRY
 
 BASE = declarative_base()
 
@@ -13,6 +27,120 @@ BASE = declarative_base()
 ROLE = ENUM('President', 'Admin', 'Member', name='role')
 
 
+# Dialect used to render SQLAlchemy statements for asyncpg, which only
+# understands numbered ($1, $2, ...) placeholders. Statements are rendered
+# with %s placeholders, which SQLAlchemy keeps apart from the rest of the SQL
+# by doubling every literal percent sign, and then numbered.
+ASYNC_DIALECT = postgresql.dialect(paramstyle='format')
+FORMAT_TOKEN = re.compile(r'%%|%s')
+# Characters that have to be escaped to match them literally with LIKE
+LIKE_SPECIAL = re.compile(r'([\\%_])')
+
+# Connection pool defaults. POOL_SIZE connections are kept open at all times
+# and up to MAX_OVERFLOW more are opened under load. Callers wait at most
+# POOL_TIMEOUT seconds for a connection, and connections are replaced once
+# they are POOL_RECYCLE seconds old.
+POOL_SIZE = 10
+MAX_OVERFLOW = 10
+POOL_TIMEOUT = 5
+POOL_RECYCLE = 1800
+POOL_PRE_PING = True
+# Whether pools open POOL_SIZE connections when the server starts. Otherwise
+# the async pool starts with ASYNC_POOL_MIN_SIZE connections and both pools
+# open more as requests need them.
+POOL_PREWARM = True
+ASYNC_POOL_MIN_SIZE = 1
+
+CHECKOUT_TIME = REGISTRY.timer(
+    'db.pool.checkout_time', 'time spent waiting for a pooled connection')
+CHECKOUT_TIMEOUTS = REGISTRY.counter(
+    'db.pool.checkout_timeouts',
+    'number of times no pooled connection was available in time')
+CHECKED_OUT = REGISTRY.gauge('db.pool.checked_out',
+                             'number of pooled connections in use')
+SATURATION = REGISTRY.gauge(
+    'db.pool.saturation',
+    'fraction of the maximum number of pooled connections in use')
+ASYNC_CHECKOUT_TIME = REGISTRY.timer(
+    'db.async_pool.checkout_time',
+    'time spent waiting for a connection from the async pool')
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool that records how long callers wait for connections."""
+
+    def _do_get(self):
+        start = time.monotonic()
+        try:
+            return super()._do_get()
+        except sqlalchemy.exc.TimeoutError:
+            CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            CHECKOUT_TIME.observe(time.monotonic() - start)
+
+
+class InstrumentedAcquire:
+    """Wraps an asyncpg pool acquire context so that the time spent waiting
+    for a connection is recorded."""
+
+    def __init__(self, pool):
+        self._acquire = pool.acquire()
+
+    async def __aenter__(self):
+        with ASYNC_CHECKOUT_TIME.time():
+            return await self._acquire.__aenter__()
+
+    async def __aexit__(self, *exc):
+        return await self._acquire.__aexit__(*exc)
+
+
+# The text search configuration used to build and query search vectors. It's
+# rendered inline rather than as a bound parameter so Postgres doesn't have
+# to infer its type (regconfig).
+TS_CONFIG = sqlalchemy.literal_column("'english'")
+
+
+# The start of Unix time, used to encode timestamps in pagination cursors
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# The number of rows `iterate` fetches from a server-side cursor at a time
+ITERATE_PREFETCH = 500
+
+# One page of search results. In page/size mode total_pages is set and
+# next_cursor is None; in cursor mode next_cursor is set (or None on the last
+# page) and total_pages is None. result_count and total_pages are None if
+# totals weren't requested, and result_count is only set on the first page in
+# cursor mode.
+SearchResult = namedtuple(
+    'SearchResult', ['results', 'result_count', 'total_pages', 'next_cursor'])
+
+
+class SearchMode(Enum):
+    """
+    Python enum used to choose how search queries are matched against
+    clubs and users.
+    """
+    # Ranked full-text search on the search_vector columns
+    fulltext = 'fulltext'
+    # Case-insensitive substring matching
+    substring = 'substring'
+
+
+class Totals(Enum):
+    """
+    Python enum used to choose how the total number of search results is
+    counted.
+    """
+    # Count every matching row
+    exact = 'exact'
+    # Use the planner's row estimate for the table when the query has no
+    # filters, which doesn't require scanning the table
+    estimate = 'estimate'
+    # Don't count results at all
+    none = 'none'
+
+
 class Roles(Enum):
     """
     Python enum used for getting the role of a club's member.
@@ -23,7 +151,17 @@ class Roles(Enum):
     member = ROLE.enums[2]
 
 
-def create_engine(driver, user, password, host, port, db_name):
+def create_engine(driver,
+                  user,
+                  password,
+                  host,
+                  port,
+                  db_name,
+                  pool_size=POOL_SIZE,
+                  max_overflow=MAX_OVERFLOW,
+                  pool_timeout=POOL_TIMEOUT,
+                  pool_recycle=POOL_RECYCLE,
+                  pool_pre_ping=POOL_PRE_PING):
     """Create an Engine for interacting with the DB.
 
     Args:
@@ -33,9 +171,47 @@ def create_engine(driver, user, password, host, port, db_name):
         host (str): the hostname of the DB
         port (int or str): the port the DB daemon listens on
         db_name (str): the name of the DB
+        pool_size (int): the number of connections to keep open
+        max_overflow (int): the number of connections that can be opened in
+            addition to pool_size under load
+        pool_timeout (int): the number of seconds to wait for a connection
+            before giving up
+        pool_recycle (int): the number of seconds after which a connection
+            is replaced, or -1 to never replace connections
+        pool_pre_ping (bool): whether to test connections for liveness
+            before using them
     """
-    return sqlalchemy.create_engine(
-        f'{driver}://{user}:{password}@{host}:{port}/{db_name}', echo=True)
+    engine = sqlalchemy.create_engine(
+        f'{driver}://{user}:{password}@{host}:{port}/{db_name}',
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping)
+    querylog.install(engine)
+
+    # The engine replaces its pool when disposed, so always look it up
+    def checked_out():
+        return engine.pool.checkedout()
+
+    CHECKED_OUT.set_function(checked_out)
+    SATURATION.set_function(
+        lambda: checked_out() / (pool_size + max_overflow))
+    return engine
+
+
+def prewarm(engine, size):
+    """Opens the given number of connections in the engine's pool up front so
+    that the first requests don't pay for establishing them.
+
+    Args:
+        engine (Engine): the engine created using `create_engine`
+        size (int): the number of connections to open
+    """
+    conns = [engine.connect() for _ in range(size)]
+    for conn in conns:
+        conn.close()
 
 
 def get_sessionmaker(engine):
@@ -46,3 +222,327 @@ def get_sessionmaker(engine):
             used to interact with the DB
     """
     return sessionmaker(bind=engine)
+
+
+async def create_pool(user,
+                      password,
+                      host,
+                      port,
+                      db_name,
+                      min_size=POOL_SIZE,
+                      max_size=POOL_SIZE + MAX_OVERFLOW):
+    """Create an asyncpg connection pool for interacting with the DB without
+    blocking the event loop. Must be called from within a running loop.
+
+    Args:
+        user (str): the username to use when connecting to the DB
+        password (str): the password to use when connecting to the DB
+        host (str): the hostname of the DB
+        port (int or str): the port the DB daemon listens on
+        db_name (str): the name of the DB
+        min_size (int): the number of connections to open up front
+        max_size (int): the maximum number of connections in the pool
+    """
+    return await asyncpg.create_pool(
+        user=user,
+        password=password,
+        host=host,
+        port=int(port),
+        database=db_name,
+        min_size=min_size,
+        max_size=max_size)
+
+
+def compile_statement(statement, params=None):
+    """Returns a (query, args) tuple that asyncpg can execute for the given
+    SQLAlchemy statement.
+
+    Args:
+        statement (ClauseElement or str): a SQLAlchemy Core statement or a
+            raw SQL string with :named parameters
+        params (dict): values for the named parameters in a raw SQL string
+    """
+    if isinstance(statement, str):
+        statement = sqlalchemy.text(statement)
+    if params:
+        statement = statement.bindparams(**params)
+    compiled = statement.compile(dialect=ASYNC_DIALECT)
+    positions = itertools.count(1)
+    query = FORMAT_TOKEN.sub(
+        lambda match: '%' if match.group() == '%%' else f'${next(positions)}',
+        compiled.string)
+    return query, [compiled.params[name] for name in compiled.positiontup]
+
+
+async def _record_query(conn, query, args, duration, row_count):
+    """Records a query executed on an asyncpg connection in the query log,
+    logging its plan if it was slow."""
+    slow = querylog.QUERY_LOG.record(query, args, duration, row_count)
+    if slow and querylog.QUERY_LOG.should_explain(query):
+        try:
+            plan_rows = await conn.fetch('EXPLAIN ' + query, *args)
+            querylog.QUERY_LOG.log_plan(query, plan_rows)
+        except Exception:
+            querylog.logger.exception('Failed to EXPLAIN slow query %s',
+                                      query)
+
+
+async def fetch(conn, statement, params=None):
+    """Executes the given statement on an asyncpg connection and returns
+    all resulting rows."""
+    query, args = compile_statement(statement, params)
+    start = time.monotonic()
+    rows = await conn.fetch(query, *args)
+    await _record_query(conn, query, args,
+                        time.monotonic() - start, len(rows))
+    return rows
+
+
+async def fetchrow(conn, statement, params=None):
+    """Executes the given statement on an asyncpg connection and returns the
+    first resulting row, or None if there is no such row."""
+    query, args = compile_statement(statement, params)
+    start = time.monotonic()
+    row = await conn.fetchrow(query, *args)
+    await _record_query(conn, query, args,
+                        time.monotonic() - start, int(row is not None))
+    return row
+
+
+async def fetchval(conn, statement, params=None):
+    """Executes the given statement on an asyncpg connection and returns the
+    first column of the first resulting row."""
+    query, args = compile_statement(statement, params)
+    start = time.monotonic()
+    value = await conn.fetchval(query, *args)
+    await _record_query(conn, query, args, time.monotonic() - start, 1)
+    return value
+
+
+async def execute(conn, statement, params=None):
+    """Executes the given statement on an asyncpg connection and returns the
+    number of rows it affected."""
+    query, args = compile_statement(statement, params)
+    start = time.monotonic()
+    # The status is a command tag like 'DELETE 3'
+    status = await conn.execute(query, *args)
+    _, _, count = status.rpartition(' ')
+    row_count = int(count) if count.isdigit() else 0
+    await _record_query(conn, query, args, time.monotonic() - start,
+                        row_count)
+    return row_count
+
+
+async def iterate(conn, statement, params=None, prefetch=ITERATE_PREFETCH):
+    """Executes the given statement on an asyncpg connection with a
+    server-side cursor and yields the resulting rows, fetching `prefetch`
+    rows at a time so large results are never held in memory at once."""
+    query, args = compile_statement(statement, params)
+    start = time.monotonic()
+    row_count = 0
+    # Cursors only live as long as the transaction they were opened in
+    async with conn.transaction():
+        async for row in conn.cursor(query, *args, prefetch=prefetch):
+            row_count += 1
+            yield row
+    await _record_query(conn, query, args,
+                        time.monotonic() - start, row_count)
+
+
+def mapped_columns(model):
+    """Returns all columns of the given mapped class's table except deferred
+    ones (e.g. search vectors).
+
+    Args:
+        model (type): the mapped class whose columns to return
+    """
+    mapper = sqlalchemy.inspect(model)
+    return [
+        attr.columns[0] for attr in mapper.column_attrs if not attr.deferred
+    ]
+
+
+def select_columns(model):
+    """Returns a SELECT of all columns of the given mapped class's table
+    except deferred ones (e.g. search vectors).
+
+    Args:
+        model (type): the mapped class to select
+    """
+    return sqlalchemy.select(mapped_columns(model))
+
+
+def from_row(model, row):
+    """Returns a detached instance of the given mapped class populated from a
+    row returned by asyncpg.
+
+    Args:
+        model (type): the mapped class to instantiate
+        row (Record): a row containing every column in
+            `mapped_columns(model)`
+    """
+    mapper = sqlalchemy.inspect(model)
+    return model(**{
+        attr.key: row[attr.columns[0].name]
+        for attr in mapper.column_attrs if not attr.deferred
+    })
+
+
+def contains(column, term):
+    """Returns a filter that matches rows where the given column contains the
+    given term, ignoring case. The filter is an ILIKE on the bare column so
+    Postgres can answer it with a trigram (pg_trgm) index on that column."""
+    # Backslash is Postgres' default LIKE escape character
+    escaped = LIKE_SPECIAL.sub(r'\\\1', term)
+    return column.ilike(f'%{escaped}%')
+
+
+def search_key(terms, *params):
+    """Returns a key that identifies a search in a search cache.
+
+    Args:
+        terms (tuple[str]): the text the user searched for. Terms are
+            lowercased because every search mode ignores case, and empty terms
+            are the same as no term.
+        params: the other search parameters, which are used as is
+    """
+    return tuple(term.lower() if term else None for term in terms) + params
+
+
+def encode_cursor(created_at, identifier):
+    """Returns an opaque pagination cursor that points just past the row with
+    the given creation time and ID."""
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    micros = (created_at - EPOCH) // timedelta(microseconds=1)
+    return base64.urlsafe_b64encode(
+        bytes(f'{micros}:{identifier}', 'utf-8')).decode('utf-8')
+
+
+def decode_cursor(cursor):
+    """Returns the (created_at, id) tuple encoded in the given pagination
+    cursor. Raises a ValueError if the cursor is invalid."""
+    try:
+        micros, identifier = base64.urlsafe_b64decode(
+            bytes(cursor, 'utf-8')).decode('utf-8').split(':')
+        return EPOCH + timedelta(microseconds=int(micros)), int(identifier)
+    except ValueError:
+        raise ValueError(f'Invalid cursor {cursor}')
+
+
+def paginate(statement, model, order, page, size, cursor=None):
+    """Returns the given SELECT limited to one page of results.
+
+    Args:
+        statement (Select): the statement selecting all results
+        model (type): the mapped class being selected, which must have
+            `created_at` and `identifier` columns
+        order (list): the order of results in page/size mode
+        page (int): the page to select in page/size mode
+        size (int): the number of results in a page
+        cursor (str): None to paginate by page and size, otherwise a cursor
+            returned with the previous page ('' for the first page). Results
+            are then ordered by creation time (newest first) and the page
+            starts just after the cursor, which stays correct when rows are
+            inserted and doesn't make Postgres skip over earlier pages.
+    """
+    if cursor is None:
+        return statement.order_by(*order).limit(size).offset(page * size)
+    key = sqlalchemy.tuple_(model.created_at, model.identifier)
+    if cursor:
+        statement = statement.where(key < sqlalchemy.tuple_(
+            *decode_cursor(cursor)))
+    # Fetch one extra row so we know whether there's a next page
+    return statement.order_by(
+        sqlalchemy.desc(model.created_at),
+        sqlalchemy.desc(model.identifier)).limit(size + 1)
+
+
+def counts_total(totals, cursor):
+    """Returns whether a search page counts its total number of results. In
+    cursor mode only the first page ('' cursor) does, since every later page
+    would count the whole result set again."""
+    return totals is not Totals.none and not cursor
+
+
+def with_total(statement, model, count, totals, filtered, cursor=None):
+    """Returns the given statement built with `paginate` with the total
+    number of results added as a result_count column, so the page and its
+    total are fetched in one query. Statements for pages that don't count
+    their total (see `counts_total`) are returned as is.
+
+    Args:
+        statement (Select): the paginated statement
+        model (type): the mapped class being selected
+        count (Select): a statement that counts all matching rows
+        totals (Totals): how to count results
+        filtered (bool): whether the statement filters the table
+        cursor (str): the cursor the statement was paginated with
+    """
+    if not counts_total(totals, cursor):
+        return statement
+    if totals is Totals.estimate and not filtered:
+        # pg_class.reltuples is -1 for tables that were never analyzed
+        column = sqlalchemy.literal_column(
+            '(SELECT greatest(reltuples, 0)::bigint FROM pg_class '
+            f"WHERE oid = '{model.__tablename__}'::regclass)")
+    elif cursor is None:
+        # The window is computed before LIMIT and OFFSET are applied
+        column = sqlalchemy.func.count().over()
+    else:
+        # On the first cursor page the LIMIT stops the window from seeing
+        # every row, so count the whole result set in a subquery instead
+        column = count.correlate(None).as_scalar()
+    return statement.column(column.label('result_count'))
+
+
+def selected_total(rows):
+    """Returns the result_count column selected by a statement built with
+    `with_total`, or None if no rows were selected."""
+    return rows[0]['result_count'] if rows else None
+
+
+def search_result(model, rows, result_count, size, cursor=None):
+    """Returns a SearchResult for the rows fetched by a statement built with
+    `paginate`."""
+    next_cursor = None
+    total_pages = None
+    if cursor is None and result_count is not None:
+        total_pages = math.ceil(result_count / size)
+    elif len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['created_at'], last['id'])
+    results = [from_row(model, row).to_dict() for row in rows]
+    return SearchResult(results, result_count, total_pages, next_cursor)
+
+
+async def cached_search_async(conn, cache, model, key, statements, size,
+                              cursor, totals):
+    """Returns the SearchResult cached under the given key, or runs a search
+    with the given asyncpg connection and caches its result.
+
+    Args:
+        conn (Connection): the connection to search with
+        cache (TTLCache): the cache to look for and store the result in
+        model (type): the mapped class being searched
+        key: the cache key built with `search_key`
+        statements (callable): returns the (page, count) statements to run
+        size (int): the number of results in a page
+        cursor (str): the cursor the page starts at, if any
+        totals (Totals): how results are counted
+    """
+    result = cache.get(key)
+    if result is not MISSING:
+        return result
+    generation = cache.generation
+
+    page, count = statements()
+    rows = await fetch(conn, page)
+    result_count = selected_total(rows)
+    if result_count is None and counts_total(totals, cursor):
+        # There was no row to select the total with
+        result_count = await fetchval(conn, count)
+    result = search_result(model, rows, result_count, size, cursor)
+    cache.put(key, result, generation)
+    return result
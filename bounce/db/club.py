@@ -2,19 +2,41 @@
 Defines the schema for the Clubs table in our DB.
 Also provides methods to access and edit the DB.
 """
-import math
-
 from sqlalchemy import Column, Integer, String, desc, func, or_
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.types import TIMESTAMP
 
-from . import BASE, Roles
+from . import (BASE, TS_CONFIG, Roles, SearchMode, Totals,
+               cached_search_async, contains, execute, fetchrow, fetchval,
+               from_row, mapped_columns, paginate, search_key,
+               select_columns, with_total)
+from ..cache import MISSING, TTLCache
+from ..prefix import PrefixIndex
 
 # The max and min number of results to return in one page.
 # Used in the search method.
 MAX_SIZE = 20
 MIN_SIZE = 1
 
+# The number of club IDs to cache by name and how many seconds to cache them
+# for. IDs only change when clubs are renamed or deleted, which invalidates
+# them in this process; the TTL bounds how long other processes can see a
+# stale ID.
+ID_CACHE_SIZE = 4096
+ID_CACHE_TTL = 300
+
+# Caches search results so repeated searches (most of all the unfiltered
+# first page) don't query the DB. Every write to clubs invalidates it.
+SEARCH_CACHE = TTLCache('club_search')
+
+# Club names for typeahead suggestions. Loaded when the server starts and kept
+# up to date by insert, update and delete.
+NAME_INDEX = PrefixIndex()
+
+# Maps club names to IDs so club-scoped queries can use the primary key
+ID_CACHE = TTLCache('club_ids', max_size=ID_CACHE_SIZE, ttl=ID_CACHE_TTL)
+
 
 class Club(BASE):
     """
@@ -30,6 +52,8 @@ class Club(BASE):
     facebook_url = Column('facebook_url', String, nullable=True)
     instagram_url = Column('instagram_url', String, nullable=True)
     twitter_url = Column('twitter_url', String, nullable=True)
+    # Maintained by a trigger in the DB from the club's name and description
+    search_vector = deferred(Column('search_vector', TSVECTOR))
     created_at = Column(
         'created_at', TIMESTAMP, nullable=False, server_default=func.now())
     members = relationship('Membership', back_populates='club')
@@ -74,37 +98,138 @@ def select(session, name):
     return None if club is None else club.to_dict()
 
 
-def search(session, name=None, description=None, page=0, size=MAX_SIZE):
-    # TODO: does query, page and size need default values if it's
-    # already being set using the JSON schema?
-    """Returns a list of clubs that contain content from the user's query"""
-    # number used for offset is the
-    # page number multiplied by the size of each page
-    offset_num = page * size
-    clubs = session.query(Club)
+def _search_criteria(name=None,
+                     description=None,
+                     mode=SearchMode.fulltext):
+    """Returns a (filter, order) tuple used to find and order clubs that match
+    the user's query. The filter is None if the query is empty."""
+    if not name and not description:
+        # show clubs ordered by most recently created
+        return None, [desc(Club.created_at)]
+
+    if mode == SearchMode.substring:
+        not_null_filters = []
+        if name:
+            not_null_filters.append(contains(Club.name, name))
+        if description:
+            not_null_filters.append(contains(Club.description, description))
+        return or_(*not_null_filters), []
 
-    not_null_filters = []
+    # Match clubs whose search vector matches any of the given terms, with
+    # the best matches (name before description) first
+    ts_queries = [
+        func.plainto_tsquery(TS_CONFIG, term) for term in (name, description)
+        if term
+    ]
+    ts_query = ts_queries[0]
+    for other in ts_queries[1:]:
+        ts_query = ts_query.op('||')(other)
+    rank = func.ts_rank(Club.search_vector, ts_query)
+    return Club.search_vector.op('@@')(ts_query), [
+        desc(rank), Club.identifier
+    ]
 
-    if name:
-        not_null_filters.append(Club.name.ilike(f'%{name}%'))
-    if description:
-        not_null_filters.append(Club.description.ilike(f'%{description}%'))
 
-    if not not_null_filters:
-        # show clubs ordered by most recently created
-        clubs = clubs.order_by(desc(Club.created_at))
-    else:
-        clubs = clubs.filter(or_(*not_null_filters))
+def _search_statements(name, description, mode, page, size, cursor,
+                       totals):
+    """Returns the statement that selects one page of clubs matching the
+    user's query along with their total, and a statement that counts all
+    matching clubs for when the page is empty."""
+    clubs = select_columns(Club)
+    count = func.count(Club.identifier).select()
 
-    result_count = clubs.count()
-    total_pages = math.ceil(result_count / size)
-    clubs = clubs.limit(size).offset(offset_num)
-    return clubs, result_count, total_pages
+    search_filter, order = _search_criteria(name, description, mode)
+    if search_filter is not None:
+        clubs = clubs.where(search_filter)
+        count = count.where(search_filter)
+    clubs = paginate(clubs, Club, order, page, size, cursor)
+    filtered = search_filter is not None
+    return with_total(clubs, Club, count, totals, filtered, cursor), count
+
+
+def select_id(session, name):
+    """Returns the ID of the club with the given name or None if there is no
+    such club."""
+    club_id = ID_CACHE.get(name)
+    if club_id is not MISSING:
+        return club_id
+    generation = ID_CACHE.generation
+    club_id = session.query(Club.identifier).filter(Club.name == name).scalar()
+    if club_id is not None:
+        ID_CACHE.put(name, club_id, generation)
+    return club_id
+
+
+async def select_id_async(conn, name):
+    """Returns the ID of the club with the given name or None if there is no
+    such club, using the given asyncpg connection."""
+    club_id = ID_CACHE.get(name)
+    if club_id is not MISSING:
+        return club_id
+    generation = ID_CACHE.generation
+    club_id = await fetchval(
+        conn,
+        Club.__table__.select().with_only_columns([Club.identifier]).where(
+            Club.name == name))
+    if club_id is not None:
+        ID_CACHE.put(name, club_id, generation)
+    return club_id
+
+
+async def select_by_id_async(conn, club_id):
+    """
+    Returns the club with the given ID or None if there is no such club,
+    using the given asyncpg connection.
+    """
+    row = await fetchrow(
+        conn, select_columns(Club).where(Club.identifier == club_id))
+    return None if row is None else from_row(Club, row).to_dict()
+
+
+async def select_async(conn, name):
+    """
+    Returns the club with the given name or None if there is no such club,
+    using the given asyncpg connection.
+    """
+    row = await fetchrow(conn,
+                         select_columns(Club).where(Club.name == name))
+    return None if row is None else from_row(Club, row).to_dict()
+
+
+async def search_async(conn,
+                       name=None,
+                       description=None,
+                       page=0,
+                       size=MAX_SIZE,
+                       mode=SearchMode.fulltext,
+                       cursor=None,
+                       totals=Totals.exact):
+    """Returns a SearchResult containing clubs that contain content from the
+    user's query, using the given asyncpg connection. See `paginate` for how
+    page, size and cursor are used and `Totals` for how results are counted.
+    In cursor mode results are only counted for the first page.
+    """
+    key = search_key((name, description), page, size, mode, cursor, totals)
+    return await cached_search_async(
+        conn, SEARCH_CACHE, Club, key,
+        lambda: _search_statements(name, description, mode, page, size,
+                                   cursor, totals), size, cursor, totals)
+
+
+def load_name_index(session):
+    """Loads the names of all clubs into NAME_INDEX."""
+    NAME_INDEX.rebuild(name for name, in session.query(Club.name))
+
+
+def suggest(prefix, size=MAX_SIZE):
+    """Returns up to `size` names of clubs that start with the given prefix,
+    ignoring case, without querying the DB."""
+    return NAME_INDEX.search(prefix, size)
 
 
 def insert(session, name, description, website_url, facebook_url,
            instagram_url, twitter_url):
-    """Insert a new club into the Clubs table.
+    """Insert a new club into the Clubs table and return its ID.
     Any user should have the permission to insert"""
     club = Club(
         name=name,
@@ -115,37 +240,55 @@ def insert(session, name, description, website_url, facebook_url,
         twitter_url=twitter_url)
     session.add(club)
     session.commit()
+    SEARCH_CACHE.invalidate()
+    NAME_INDEX.add(name)
+    return club.identifier
 
 
-def update(session, name, editors_role, new_name, description, website_url,
-           facebook_url, instagram_url, twitter_url):
-    """Updates an existing club in the Clubs table and returns the
-    updated club."""
+async def update_async(conn, name, editors_role, new_name, description,
+                       website_url, facebook_url, instagram_url, twitter_url):
+    """Updates an existing club in the Clubs table using the given asyncpg
+    connection and returns the updated club, or None if there is no club
+    with the given name. Fields that are empty are left as they are."""
     # Only Presidents and Admins can update
     if not can_update(editors_role):
         raise PermissionError("Permission denied for updating the club.")
-    club = session.query(Club).filter(Club.name == name).first()
+    values = {
+        key: value
+        for key, value in [
+            ('name', new_name),
+            ('description', description),
+            ('website_url', website_url),
+            ('facebook_url', facebook_url),
+            ('instagram_url', instagram_url),
+            ('twitter_url', twitter_url),
+        ] if value
+    }
+    if not values:
+        return await select_async(conn, name)
+
+    row = await fetchrow(
+        conn,
+        Club.__table__.update().where(Club.name == name).values(
+            **values).returning(*mapped_columns(Club)))
+    if row is None:
+        return None
+    SEARCH_CACHE.invalidate()
     if new_name:
-        club.name = new_name
-    if description:
-        club.description = description
-    if website_url:
-        club.website_url = website_url
-    if facebook_url:
-        club.facebook_url = facebook_url
-    if instagram_url:
-        club.instagram_url = instagram_url
-    if twitter_url:
-        club.twitter_url = twitter_url
-    session.commit()
-    return club.to_dict()
+        ID_CACHE.invalidate(name)
+        NAME_INDEX.remove(name)
+        NAME_INDEX.add(new_name)
+    return from_row(Club, row).to_dict()
 
 
-def delete(session, name, editors_role):
-    """Deletes the club with the given name."""
+async def delete_async(conn, name, editors_role):
+    """Deletes the club with the given name using the given asyncpg
+    connection."""
     # Only Presidents can delete
     if not can_delete(editors_role):
         raise PermissionError("Permission denied for deleting the club.")
 
-    session.query(Club).filter(Club.name == name).delete()
-    session.commit()
+    await execute(conn, Club.__table__.delete().where(Club.name == name))
+    SEARCH_CACHE.invalidate()
+    ID_CACHE.invalidate(name)
+    NAME_INDEX.remove(name)
@@ -1,9 +1,83 @@
 """Defines the schema for the Memberships table in our DB."""
+import csv
+import io
+
+import asyncpg
 from sqlalchemy import Column, ForeignKey, Integer, String, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.types import TIMESTAMP
 
-from . import BASE, ROLE, Roles
+from . import (BASE, ROLE, Roles, decode_cursor, encode_cursor, execute,
+               fetch, fetchrow, fetchval)
+from ..cache import MISSING, TTLCache
+
+# The number of roles to cache and how many seconds to cache them for. Writes
+# in this process invalidate cached roles; the TTL bounds how long a role
+# changed by another process can still be used to authorize requests.
+ROLE_CACHE_SIZE = 4096
+ROLE_CACHE_TTL = 10
+
+# The default and maximum number of memberships in a page of a roster
+ROSTER_PAGE_SIZE = 100
+MAX_ROSTER_PAGE_SIZE = 1000
+
+# The maximum number of memberships that can be imported at once
+MAX_IMPORT_ROWS = 5000
+
+# Selects the memberships of a club along with the members' user info
+SELECT_ALL_QUERY = """
+    SELECT users.id AS user_id,
+    memberships.created_at, memberships.position,
+    memberships.role, users.full_name, users.username
+    FROM memberships INNER JOIN users ON (
+        memberships.user_id = users.id
+    )
+    WHERE memberships.club_id = :club_id
+"""
+
+# Selects the membership of a single user in a club
+SELECT_QUERY = SELECT_ALL_QUERY + """
+    AND user_id = :user_id
+"""
+
+# Selects the memberships of several users in a club
+SELECT_MANY_QUERY = SELECT_ALL_QUERY + """
+    AND user_id = ANY(:user_ids)
+"""
+
+# Selects the clubs a user is a member of and their roles in them. Only
+# columns in memberships_user_id_club_id_role_idx are read from memberships.
+SELECT_USER_CLUBS_QUERY = """
+    SELECT clubs.id AS club_id, clubs.name, memberships.role
+    FROM users
+    INNER JOIN memberships ON memberships.user_id = users.id
+    INNER JOIN clubs ON clubs.id = memberships.club_id
+    WHERE users.username = :username
+    ORDER BY clubs.name
+"""
+
+# Restricts a roster to memberships after a pagination cursor
+ROSTER_AFTER_QUERY = """
+    AND (memberships.created_at, memberships.user_id)
+    > (:after_created_at, :after_user_id)
+"""
+
+# Orders a roster from the oldest membership to the newest
+ROSTER_ORDER_QUERY = """
+    ORDER BY memberships.created_at, memberships.user_id
+"""
+
+# Selects the role of a single user in a club
+SELECT_ROLE_QUERY = """
+    SELECT role FROM memberships
+    WHERE club_id = :club_id AND user_id = :user_id
+"""
+
+# Maps (user_id, club_id) to the user's role in the club, or None if they
+# aren't a member, for authorization checks. Every write to memberships
+# invalidates the entries it affects.
+ROLE_CACHE = TTLCache(
+    'membership_roles', max_size=ROLE_CACHE_SIZE, ttl=ROLE_CACHE_TTL)
 
 
 class Membership(BASE):
@@ -126,7 +200,109 @@ def can_update(editors_role, members_role, new_role):
     return False
 
 
-def update(session, club_name, user_id, editors_role, members_role,
+def _can_insert_sql(editors_role, members_role):
+    """Returns a SQL condition that matches `can_insert` for the given SQL
+    role expressions."""
+    return (f"({editors_role} = '{Roles.president.value}' OR "
+            f"({editors_role} = '{Roles.admin.value}' AND "
+            f"{members_role} = '{Roles.member.value}'))")
+
+
+def _can_update_sql(editors_role, members_role, new_role):
+    """Returns a SQL condition that matches `can_update` for the given SQL
+    role expressions."""
+    return (f"(CASE {editors_role} "
+            f"WHEN '{Roles.president.value}' "
+            f"THEN {members_role} <> '{Roles.president.value}' "
+            f"WHEN '{Roles.admin.value}' "
+            f"THEN {members_role} = '{Roles.member.value}' "
+            f"AND {new_role} <> '{Roles.president.value}' "
+            f"ELSE FALSE END)")
+
+
+# Creates or updates a membership if the editor is allowed to, in one
+# statement. The editor's and member's current roles are read in the same
+# statement, and the update rule is checked again against the row being
+# updated in case the membership was created after they were read.
+UPSERT_QUERY = f"""
+    WITH params AS (
+        SELECT CAST(:club_id AS INTEGER) AS club_id,
+        CAST(:editors_id AS INTEGER) AS editors_id,
+        CAST(:user_id AS INTEGER) AS user_id,
+        CAST(:members_role AS member_role) AS role,
+        CAST(:position AS TEXT) AS position
+    ), editor AS (
+        SELECT memberships.role FROM memberships, params
+        WHERE memberships.club_id = params.club_id
+        AND memberships.user_id = params.editors_id
+    ), target AS (
+        SELECT memberships.role FROM memberships, params
+        WHERE memberships.club_id = params.club_id
+        AND memberships.user_id = params.user_id
+    ), allowed AS (
+        SELECT CASE
+            WHEN NOT EXISTS (SELECT 1 FROM target)
+            THEN {_can_insert_sql('editor.role', 'params.role')}
+            ELSE {_can_update_sql('editor.role', '(SELECT role FROM target)',
+                                  'params.role')}
+        END AS allowed
+        FROM editor, params
+    ), written AS (
+        INSERT INTO memberships (user_id, club_id, role, position)
+        SELECT params.user_id, params.club_id, params.role, params.position
+        FROM params, allowed
+        WHERE allowed.allowed
+        ON CONFLICT (user_id, club_id) DO UPDATE
+        SET role = EXCLUDED.role, position = EXCLUDED.position
+        WHERE {_can_update_sql('(SELECT role FROM editor)', 'memberships.role',
+                               'EXCLUDED.role')}
+        RETURNING memberships.user_id
+    )
+    SELECT (SELECT role FROM editor) AS editors_role,
+    (SELECT count(*) FROM written) AS written
+"""
+
+
+async def upsert_async(conn, club_id, editors_id, user_id, members_role,
+                       position):
+    """
+    Creates or updates the membership that associates the given user with
+    the given club in a single statement, using the given asyncpg connection.
+    The editor needs the permissions given by `can_insert` to create the
+    membership or `can_update` to update it.
+
+    Args:
+        club_id (int): the ID of the club
+        editors_id (int): the id of the member making the change
+        user_id (int): the id of the user whose membership is being set
+        members_role (str): the role the user should have
+        position (str): the position the user should have
+
+    Raises:
+        ValueError: the club or user doesn't exist, or the editor isn't a
+            member of the club
+        PermissionError: the editor isn't allowed to make the change
+    """
+    try:
+        row = await fetchrow(
+            conn, UPSERT_QUERY, {
+                'club_id': club_id,
+                'editors_id': editors_id,
+                'user_id': user_id,
+                'members_role': members_role,
+                'position': position,
+            })
+    except asyncpg.ForeignKeyViolationError:
+        raise ValueError(f'No user with id {user_id}')
+    finally:
+        ROLE_CACHE.invalidate((user_id, club_id))
+    if row['editors_role'] is None:
+        raise ValueError(f'User {editors_id} is not a member of {club_id}')
+    if not row['written']:
+        raise PermissionError('Permission denied for setting membership.')
+
+
+def update(session, club_id, user_id, editors_role, members_role,
            new_position, new_role):
     """
     Updates membership that asscociates the give user with the given
@@ -139,20 +315,20 @@ def update(session, club_name, user_id, editors_role, members_role,
         UPDATE memberships
         SET role = :new_role, position = :new_position
         WHERE memberships.user_id = :user_id
-        AND memberships.club_id =
-            (SELECT id FROM clubs WHERE name = :club_name)
+        AND memberships.club_id = :club_id
     """
     session.execute(
         query, {
             'new_role': new_role,
             'new_position': new_position,
             'user_id': user_id,
-            'club_name': club_name,
+            'club_id': club_id,
         })
     session.commit()
+    ROLE_CACHE.invalidate((user_id, club_id))
 
 
-def insert(session, club_name, user_id, editors_role, members_role, position):
+def insert(session, club_id, user_id, editors_role, members_role, position):
     """Creates a new membership that associates the given user with the given
     club.
 
@@ -168,7 +344,7 @@ def insert(session, club_name, user_id, editors_role, members_role, position):
     query = f"""
         INSERT INTO memberships (user_id, club_id, role, position) VALUES (
             :user_id,
-            (SELECT id FROM clubs WHERE name = :club_name),
+            :club_id,
             :members_role,
             :position
         )
@@ -177,14 +353,85 @@ def insert(session, club_name, user_id, editors_role, members_role, position):
     session.execute(
         query, {
             'user_id': user_id,
-            'club_name': club_name,
+            'club_id': club_id,
             'members_role': members_role,
             'position': position,
         })
     session.commit()
+    ROLE_CACHE.invalidate((user_id, club_id))
+
+
+def roster_statement(club_id, editors_role, limit=None, cursor=None):
+    """
+    Returns the (query, params) that select the memberships in the given
+    club ordered from the oldest to the newest.
 
+    Args:
+        club_id (int): the ID of the club
+        editors_role (Role): the role of the member selecting the roster
+        limit (int): the maximum number of memberships to select, or None
+            to select all of them
+        cursor (str): a cursor returned with the previous page of the
+            roster, or None to start from the first membership
+
+    Raises:
+        ValueError: the cursor is invalid
+        PermissionError: the editor isn't allowed to read the roster
+    """
+    # All members can read all memberships
+    if not can_select(editors_role):
+        raise PermissionError('Permission denied for selecting membership.')
 
-def select_all(session, club_name, editors_role):
+    query = SELECT_ALL_QUERY
+    params = {'club_id': club_id}
+    if cursor:
+        query += ROSTER_AFTER_QUERY
+        params['after_created_at'], params['after_user_id'] = decode_cursor(
+            cursor)
+    query += ROSTER_ORDER_QUERY
+    if limit is not None:
+        query += 'LIMIT :limit'
+        params['limit'] = limit
+    return query, params
+
+
+async def select_page_async(conn, club_id, editors_role, limit, cursor=None):
+    """
+    Returns a page of the memberships in the given club using the given
+    asyncpg connection, along with a cursor for the next page or None if
+    this is the last page. See `roster_statement` for the arguments.
+    """
+    # Fetch one extra row so we know whether there's a next page
+    rows = await fetch(conn, *roster_statement(club_id, editors_role,
+                                               limit + 1, cursor))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'],
+                                    rows[-1]['user_id'])
+    return [dict(row) for row in rows], next_cursor
+
+
+async def select_role_async(conn, club_id, user_id):
+    """
+    Returns the role of the given user in the specified club, or None if
+    they aren't a member, using the given asyncpg connection. Roles are
+    cached in ROLE_CACHE.
+    """
+    key = (user_id, club_id)
+    role = ROLE_CACHE.get(key)
+    if role is not MISSING:
+        return role
+    generation = ROLE_CACHE.generation
+    role = await fetchval(conn, SELECT_ROLE_QUERY, {
+        'club_id': club_id,
+        'user_id': user_id,
+    })
+    ROLE_CACHE.put(key, role, generation)
+    return role
+
+
+def select_all(session, club_id, editors_role):
     """
     Returns all memberships for the given club. If user_id is given, returns
     only the membership for the given user.
@@ -193,28 +440,11 @@ def select_all(session, club_name, editors_role):
     if not can_select(editors_role):
         raise PermissionError('Permission denied for selecting membership.')
 
-    query = f"""
-        SELECT users.id AS user_id,
-        memberships.created_at, memberships.position,
-        memberships.role, users.full_name, users.username
-        FROM memberships INNER JOIN users ON (
-            memberships.user_id = users.id
-        )
-        WHERE memberships.club_id IN (
-            SELECT id FROM clubs WHERE name = :club_name
-        )
-    """
-    result_proxy = session.execute(query, {'club_name': club_name})
-    results = []
-    for row in result_proxy.fetchall():
-        member_info = {}
-        for i, key in enumerate(result_proxy.keys()):
-            member_info[key] = row[i]
-        results.append(member_info)
-    return results
+    result_proxy = session.execute(SELECT_ALL_QUERY, {'club_id': club_id})
+    return [dict(row) for row in result_proxy]
 
 
-def select(session, club_name, user_id, editors_role):
+def select(session, club_id, user_id, editors_role):
     """
     Returns returns the membership for the given user of the specified club.
     """
@@ -222,20 +452,8 @@ def select(session, club_name, user_id, editors_role):
     if not can_select(editors_role):
         raise PermissionError('Permission denied for selecting membership.')
 
-    query = f"""
-        SELECT users.id AS user_id,
-        memberships.created_at, memberships.position,
-        memberships.role, users.full_name, users.username
-        FROM memberships INNER JOIN users ON (
-            memberships.user_id = users.id
-        )
-        WHERE memberships.club_id IN (
-            SELECT id FROM clubs WHERE name = :club_name
-        )
-        AND user_id = :user_id
-    """
-    result_proxy = session.execute(query, {
-        'club_name': club_name,
+    result_proxy = session.execute(SELECT_QUERY, {
+        'club_id': club_id,
         'user_id': user_id,
     })
     results = []
@@ -248,15 +466,69 @@ def select(session, club_name, user_id, editors_role):
     return results
 
 
-def delete_all(session, club_name, editors_role):
+async def select_all_async(conn, club_id, editors_role):
+    """
+    Returns all memberships for the given club using the given asyncpg
+    connection.
+    """
+    # All members can read all memberships
+    if not can_select(editors_role):
+        raise PermissionError('Permission denied for selecting membership.')
+
+    rows = await fetch(conn, SELECT_ALL_QUERY, {'club_id': club_id})
+    return [dict(row) for row in rows]
+
+
+async def select_async(conn, club_id, user_id, editors_role):
+    """
+    Returns the membership for the given user of the specified club using
+    the given asyncpg connection.
+    """
+    # All members can read all memberships
+    if not can_select(editors_role):
+        raise PermissionError('Permission denied for selecting membership.')
+
+    rows = await fetch(conn, SELECT_QUERY, {
+        'club_id': club_id,
+        'user_id': user_id,
+    })
+    return [dict(row) for row in rows]
+
+
+async def select_clubs_async(conn, username):
+    """
+    Returns the ID, name and role of every club the user with the given
+    username is a member of, ordered by name, using the given asyncpg
+    connection.
+    """
+    rows = await fetch(conn, SELECT_USER_CLUBS_QUERY, {'username': username})
+    return [dict(row) for row in rows]
+
+
+async def select_many_async(conn, club_id, user_ids, editors_role):
+    """
+    Returns the memberships of the given users in the specified club using
+    the given asyncpg connection. Users who aren't members are left out.
     """
-    Deletes all memberships except the Presidents for the given club.
+    # All members can read all memberships
+    if not can_select(editors_role):
+        raise PermissionError('Permission denied for selecting membership.')
+
+    rows = await fetch(conn, SELECT_MANY_QUERY, {
+        'club_id': club_id,
+        'user_ids': user_ids,
+    })
+    return [dict(row) for row in rows]
+
+
+async def delete_all_async(conn, club_id, editors_role):
+    """
+    Deletes all memberships except the Presidents for the given club using
+    the given asyncpg connection.
     Args:
-        club_name: the name of the club memberships are being deleted from
+        club_id: the ID of the club memberships are being deleted from
         editors_role (Role):
             the role of the member who is deleting the membership
-        members_role (Role):
-            the role of the member who's membership is being deleted
     """
     if not can_delete_all(editors_role):
         raise PermissionError(
@@ -265,21 +537,21 @@ def delete_all(session, club_name, editors_role):
     query = f"""
         DELETE FROM memberships
         WHERE NOT memberships.role = :role
-        AND memberships.club_id IN (
-            SELECT id FROM clubs WHERE name = :club_name
-        )
+        AND memberships.club_id = :club_id
     """
-    session.execute(query, {
+    await execute(conn, query, {
         'role': Roles.president.value,
-        'club_name': club_name,
+        'club_id': club_id,
     })
-    session.commit()
+    # Entries are keyed by user, so drop every club's
+    ROLE_CACHE.invalidate()
 
 
-def delete(session, club_name, editors_id, members_id, editors_role,
-           members_role):
+async def delete_async(conn, club_id, editors_id, members_id, editors_role,
+                       members_role):
     """
-    Deletes a specific users' membership for the given club.
+    Deletes a specific users' membership for the given club using the given
+    asyncpg connection.
     Args:
         editors_id (user_id): the id of the member deleting the membership
         members_id (user_id):
@@ -295,14 +567,235 @@ def delete(session, club_name, editors_id, members_id, editors_role,
 
     query = f"""
     DELETE FROM memberships
-    WHERE memberships.club_id IN (
-        SELECT id FROM clubs WHERE name = :club_name
-    )
+    WHERE memberships.club_id = :club_id
     AND memberships.user_id = :members_id
     """
 
-    session.execute(query, {
-        'club_name': club_name,
+    await execute(conn, query, {
+        'club_id': club_id,
         'members_id': members_id,
     })
+    ROLE_CACHE.invalidate((members_id, club_id))
+
+
+# Holds the rows of a bulk import while they are checked and merged. It is
+# dropped when the import's transaction ends.
+CREATE_IMPORT_TABLE_QUERY = """
+    CREATE TEMPORARY TABLE membership_import (
+        row_number INTEGER PRIMARY KEY,
+        user_id INTEGER,
+        username TEXT,
+        role member_role NOT NULL,
+        position TEXT NOT NULL
+    ) ON COMMIT DROP
+"""
+
+COPY_IMPORT_QUERY = """
+    COPY membership_import (row_number, user_id, username, role, position)
+    FROM STDIN WITH (FORMAT csv)
+"""
+
+# Fills in the IDs of users given by username in a bulk import
+RESOLVE_IMPORT_USERS_QUERY = """
+    UPDATE membership_import SET user_id = users.id
+    FROM users
+    WHERE membership_import.user_id IS NULL
+    AND users.username = membership_import.username
+"""
+
+# Selects the users in a bulk import and their current roles in the club
+SELECT_IMPORT_QUERY = """
+    SELECT membership_import.row_number, users.id AS user_id,
+    memberships.role AS current_role
+    FROM membership_import
+    LEFT JOIN users ON users.id = membership_import.user_id
+    LEFT JOIN memberships ON (
+        memberships.user_id = users.id
+        AND memberships.club_id = :club_id
+    )
+    ORDER BY membership_import.row_number
+"""
+
+# Writes the allowed rows of a bulk import. The update rule is checked again
+# against existing rows in case they changed after they were read.
+MERGE_IMPORT_QUERY = f"""
+    INSERT INTO memberships (user_id, club_id, role, position)
+    SELECT user_id, :club_id, role, position FROM membership_import
+    WHERE row_number = ANY(:row_numbers)
+    ON CONFLICT (user_id, club_id) DO UPDATE
+    SET role = EXCLUDED.role, position = EXCLUDED.position
+    WHERE {_can_update_sql('CAST(:editors_role AS member_role)',
+                           'memberships.role', 'EXCLUDED.role')}
+    RETURNING memberships.user_id
+"""
+
+
+def parse_import_csv(text):
+    """
+    Returns the rows of a CSV membership import as dicts. The first line must
+    be a header naming the `username` or `user_id`, `role` and `position`
+    columns. Raises a ValueError if the CSV is malformed.
+    """
+    try:
+        return list(csv.DictReader(io.StringIO(text)))
+    except csv.Error as err:
+        raise ValueError(f'Invalid CSV: {err}')
+
+
+def _check_import_row(row):
+    """Returns the (user_id, username, role, position) of a row in a bulk
+    import, or raises a ValueError describing what's wrong with it."""
+    if not isinstance(row, dict):
+        raise ValueError('Row must be an object')
+    user_id = row.get('user_id') or None
+    username = row.get('username') or None
+    if user_id is None and username is None:
+        raise ValueError('username or user_id is required')
+    if user_id is not None:
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            raise ValueError('user_id must be an integer')
+        username = None
+    elif not isinstance(username, str):
+        raise ValueError('username must be a string')
+    role = row.get('role')
+    if role not in [r.value for r in Roles]:
+        raise ValueError('role must be one of ' +
+                         ', '.join(r.value for r in Roles))
+    position = row.get('position')
+    if not isinstance(position, str) or not position.strip():
+        raise ValueError('position is required')
+    return user_id, username, role, position.strip()
+
+
+def _lock_editors_role(session, club_id, editors_id):
+    """Returns the role of the member doing a bulk import, and keeps it from
+    changing until the import commits. Rolls back and raises a ValueError if
+    they aren't a member, or a PermissionError if they can't add
+    memberships."""
+    editors_role = session.execute(
+        """
+        SELECT role FROM memberships
+        WHERE club_id = :club_id AND user_id = :editors_id
+        FOR SHARE
+        """, {
+            'club_id': club_id,
+            'editors_id': editors_id,
+        }).scalar()
+    if editors_role is None:
+        session.rollback()
+        raise ValueError(f'User {editors_id} is not a member of {club_id}')
+    if not can_insert(editors_role, Roles.member.value):
+        session.rollback()
+        raise PermissionError('Permission denied for importing memberships.')
+    return editors_role
+
+
+def _stage_import(session, rows, failures):
+    """Loads the valid rows of a bulk import into the membership_import
+    table with COPY, recording why each invalid row was skipped in
+    `failures`. Returns a mapping from the number of each staged row to the
+    role it gives."""
+    staged = io.StringIO()
+    writer = csv.writer(staged)
+    roles = {}
+    for number, row in enumerate(rows, start=1):
+        try:
+            user_id, username, role, position = _check_import_row(row)
+        except ValueError as err:
+            failures[number] = str(err)
+            continue
+        roles[number] = role
+        writer.writerow([number, user_id, username, role, position])
+    staged.seek(0)
+
+    session.execute(CREATE_IMPORT_TABLE_QUERY)
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(COPY_IMPORT_QUERY, staged)
+    finally:
+        cursor.close()
+    return roles
+
+
+def _check_import(session, club_id, editors_role, roles, failures):
+    """Resolves the users in the staged rows of a bulk import and checks each
+    row against the rules for single membership changes, recording why each
+    disallowed row was skipped in `failures`. Only the first allowed row for
+    a user is imported. Returns a mapping from the number of each allowed row
+    to its user's ID."""
+    session.execute(RESOLVE_IMPORT_USERS_QUERY)
+    allowed = {}
+    seen = set()
+    for row in session.execute(SELECT_IMPORT_QUERY, {'club_id': club_id}):
+        number, user_id, current_role = row
+        if user_id is None:
+            failures[number] = 'No such user'
+        elif user_id in seen:
+            failures[number] = 'Duplicate user'
+        elif (can_update(editors_role, current_role, roles[number])
+              if current_role else can_insert(editors_role, roles[number])):
+            allowed[number] = user_id
+            seen.add(user_id)
+        else:
+            failures[number] = 'Permission denied'
+    return allowed
+
+
+def import_rows(session, club_id, editors_id, rows):
+    """
+    Creates or updates memberships in the given club for every valid row in
+    a bulk import in a single transaction. The rows are loaded with COPY into
+    a temporary table and merged into memberships with one statement.
+
+    Args:
+        club_id (int): the ID of the club
+        editors_id (int): the ID of the member importing the memberships
+        rows (list[dict]): the memberships to import, each with a `username`
+            or `user_id`, a `role` and a `position`
+
+    Returns:
+        dict: the number of memberships `imported` and a list of `failures`
+            giving the (1-based) `row` number and `error` for each row that
+            wasn't imported
+
+    Raises:
+        ValueError: rows isn't a list, there are too many rows or the editor
+            isn't a member of the club
+        PermissionError: the editor isn't allowed to add memberships
+    """
+    if not isinstance(rows, list):
+        raise ValueError('Import must be a list of memberships')
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise ValueError(f'Can\'t import more than {MAX_IMPORT_ROWS} rows')
+
+    editors_role = _lock_editors_role(session, club_id, editors_id)
+    failures = {}
+    roles = _stage_import(session, rows, failures)
+    allowed = _check_import(session, club_id, editors_role, roles, failures)
+
+    written = set()
+    if allowed:
+        written = {
+            row[0]
+            for row in session.execute(
+                MERGE_IMPORT_QUERY, {
+                    'club_id': club_id,
+                    'editors_role': editors_role,
+                    'row_numbers': list(allowed),
+                })
+        }
     session.commit()
+
+    for number, user_id in allowed.items():
+        ROLE_CACHE.invalidate((user_id, club_id))
+        if user_id not in written:
+            failures[number] = 'Permission denied'
+    return {
+        'imported': len(written),
+        'failures': [{
+            'row': number,
+            'error': failures[number]
+        } for number in sorted(failures)],
+    }
@@ -0,0 +1,125 @@
+"""
+Logs DB queries that take longer than a configurable threshold, along with
+a random sample of all other queries.
+"""
+
+import logging
+import random
+import time
+
+from sqlalchemy import event
+
+from ..metrics import REGISTRY
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+# Queries that take at least this many milliseconds are logged as slow
+SLOW_QUERY_MS = 200
+# The fraction of queries that are not slow that get logged
+SAMPLE_RATE = 0.0
+
+# Statements that Postgres can EXPLAIN
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+QUERY_TIME = REGISTRY.timer('db.query_time', 'time spent executing queries')
+SLOW_QUERIES = REGISTRY.counter('db.slow_queries',
+                                'number of queries slower than the threshold')
+
+
+class QueryLogger:
+    """Decides which queries are logged and logs them."""
+
+    def __init__(self,
+                 slow_query_ms=SLOW_QUERY_MS,
+                 sample_rate=SAMPLE_RATE,
+                 explain=False):
+        self.configure(slow_query_ms, sample_rate, explain)
+
+    def configure(self,
+                  slow_query_ms=SLOW_QUERY_MS,
+                  sample_rate=SAMPLE_RATE,
+                  explain=False):
+        """Updates the logger's configuration.
+
+        Args:
+            slow_query_ms (float): queries that take at least this many
+                milliseconds are logged as slow
+            sample_rate (float): the fraction (0 to 1) of other queries to log
+            explain (bool): whether to log the query plan of slow queries
+        """
+        self.slow_query_ms = slow_query_ms
+        self.sample_rate = sample_rate
+        self.explain = explain
+
+    def record(self, statement, params, duration, row_count):
+        """Records the execution of a query, logging it if it was slow or
+        sampled. Returns True if the query was slow.
+
+        Args:
+            statement (str): the SQL that was executed
+            params: the parameters the SQL was executed with
+            duration (float): the number of seconds the query took
+            row_count (int): the number of rows returned or affected
+        """
+        QUERY_TIME.observe(duration)
+        millis = duration * 1000
+        if millis >= self.slow_query_ms:
+            SLOW_QUERIES.inc()
+            logger.warning('Slow query (%.1f ms, %s rows): %s %r', millis,
+                           row_count, statement, params)
+            return True
+        if self.sample_rate and random.random() < self.sample_rate:
+            logger.info('Query (%.1f ms, %s rows): %s %r', millis, row_count,
+                        statement, params)
+        return False
+
+    def should_explain(self, statement):
+        """Returns True if the plan for the given slow statement should be
+        logged."""
+        return self.explain and statement.lstrip().upper().startswith(
+            EXPLAINABLE)
+
+    @staticmethod
+    def log_plan(statement, plan_rows):
+        """Logs the plan Postgres returned for EXPLAINing a statement."""
+        plan = '\n'.join(row[0] for row in plan_rows)
+        logger.warning('Plan for slow query %s\n%s', statement, plan)
+
+
+# The query logger used by all engines and async queries
+QUERY_LOG = QueryLogger()
+
+
+def _explain(dbapi_conn, statement, params):
+    """EXPLAINs (without ANALYZE, so the statement isn't run again) the given
+    statement on a DBAPI connection and logs the plan."""
+    try:
+        cursor = dbapi_conn.cursor()
+        try:
+            cursor.execute('EXPLAIN ' + statement, params)
+            QUERY_LOG.log_plan(statement, cursor.fetchall())
+        finally:
+            cursor.close()
+    except Exception:
+        logger.exception('Failed to EXPLAIN slow query %s', statement)
+
+
+def install(engine):
+    """Records every query executed by the given engine in QUERY_LOG."""
+
+    # pylint: disable=unused-argument,too-many-arguments
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, params, context,
+                              executemany):
+        conn.info.setdefault('query_start_time', []).append(time.monotonic())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, params, context,
+                             executemany):
+        duration = time.monotonic() - conn.info['query_start_time'].pop()
+        slow = QUERY_LOG.record(statement, params, duration, cursor.rowcount)
+        if slow and not executemany and QUERY_LOG.should_explain(statement):
+            _explain(cursor.connection, statement, params)
+
+    # pylint: enable=unused-argument,too-many-arguments
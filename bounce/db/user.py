@@ -1,18 +1,46 @@
 """Defines the schema for the Users table in our DB."""
 
-import math
-
-from sqlalchemy import Column, Integer, String, desc, func, or_
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, cast, desc, exists, func, or_
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.types import TIMESTAMP
 
-from . import BASE
+from . import (BASE, TS_CONFIG, SearchMode, Totals, cached_search_async,
+               contains, fetchrow, fetchval, from_row, paginate, search_key,
+               select_columns, with_total)
+from ..bloom import BloomFilter
+from ..cache import TTLCache
+from ..metrics import REGISTRY
+from ..prefix import PrefixIndex
 
 # The max and min number of results to return in one page.
 # Used in the search method.
 MAX_SIZE = 20
 MIN_SIZE = 1
 
+# Caches search results so repeated searches (most of all the unfiltered
+# first page) don't query the DB. Every write to users that can change
+# search results invalidates it.
+SEARCH_CACHE = TTLCache('user_search')
+
+# Usernames for typeahead suggestions. Loaded when the server starts and kept
+# up to date by insert and delete.
+USERNAME_INDEX = PrefixIndex()
+
+# Usernames and emails that are taken, so checking whether they're available
+# only queries the DB when they probably aren't. Loaded when the server
+# starts and kept up to date by insert, update and delete in this process
+# only: users created by other server processes since this one started are
+# missing until it restarts.
+USERNAME_FILTER = BloomFilter()
+EMAIL_FILTER = BloomFilter()
+
+TAKEN_CHECKS = REGISTRY.counter(
+    'users.taken_checks', 'username and email availability checks')
+TAKEN_DB_CHECKS = REGISTRY.counter(
+    'users.taken_db_checks',
+    'availability checks the Bloom filters couldn\'t answer without the DB')
+
 
 class User(BASE):
     """
@@ -27,6 +55,8 @@ class User(BASE):
     secret = Column('secret', String, nullable=False)
     email = Column('email', String, nullable=False)
     bio = Column('bio', String, nullable=False)
+    # Maintained by a trigger in the DB from the user's names and bio
+    search_vector = deferred(Column('search_vector', TSVECTOR))
     created_at = Column(
         'created_at', TIMESTAMP, nullable=False, server_default=func.now())
     clubs = relationship('Membership', back_populates='member')
@@ -62,48 +92,156 @@ def select_by_id(session, user_id):
     return session.query(User).filter(User.identifier == user_id).first()
 
 
-def search(session,
-           full_name=None,
-           username=None,
-           identifier=None,
-           email=None,
-           created_at=None,
-           page=0,
-           size=MAX_SIZE):
-    """Returns a list of users that contain content from the user's query"""
-    # number used for offset is the
-    # page number multiplied by the size of each page
-
-    offset_num = page * size
-    users = session.query(User)
-
+def _search_criteria(full_name=None,
+                     username=None,
+                     identifier=None,
+                     email=None,
+                     created_at=None,
+                     mode=SearchMode.fulltext):
+    """Returns a (filter, order) tuple used to find and order users that match
+    the user's query. The filter is None if the query is empty."""
     not_null_filters = []
+    order = []
 
-    if full_name:
-        not_null_filters.append(User.full_name.ilike(f'%{full_name}%'))
-    if username:
-        not_null_filters.append(User.username.ilike(f'%{username}%'))
+    if mode == SearchMode.substring:
+        if full_name:
+            not_null_filters.append(contains(User.full_name, full_name))
+        if username:
+            not_null_filters.append(contains(User.username, username))
+    elif full_name or username:
+        # Match users whose search vector matches any of the given names,
+        # with the best matches (names before bio) first
+        ts_queries = [
+            func.plainto_tsquery(TS_CONFIG, term)
+            for term in (full_name, username) if term
+        ]
+        ts_query = ts_queries[0]
+        for other in ts_queries[1:]:
+            ts_query = ts_query.op('||')(other)
+        not_null_filters.append(User.search_vector.op('@@')(ts_query))
+        order = [desc(func.ts_rank(User.search_vector, ts_query))]
     if email:
-        not_null_filters.append(User.email.ilike(f'%{email}%'))
+        not_null_filters.append(contains(User.email, email))
     if identifier:
-        not_null_filters.append(User.id.ilike(f'%{identifier}%'))
+        not_null_filters.append(
+            contains(cast(User.identifier, String), identifier))
     if created_at:
-        not_null_filters.append(User.id.ilike(f'%{created_at}%'))
-
-        # TODO: implement search_vector functionality:
-        # users = users.filter(User.search_vector.match(query))
-        # Currently search_vector column isn't working properly
+        not_null_filters.append(
+            contains(cast(User.created_at, String), created_at))
 
     if not not_null_filters:
         # show users ordered by most recently created
-        users = users.order_by(desc(User.created_at))
-    else:
-        users = users.filter(or_(*not_null_filters))
+        return None, [desc(User.created_at)]
+    return or_(*not_null_filters), order + [User.identifier]
+
+
+def _search_statements(full_name, username, identifier, email, created_at,
+                       mode, page, size, cursor, totals):
+    """Returns the statement that selects one page of users matching the
+    user's query along with their total, and a statement that counts all
+    matching users for when the page is empty."""
+    users = select_columns(User)
+    count = func.count(User.identifier).select()
 
-    result_count = users.count()
-    total_pages = math.ceil(result_count / size)
-    users = users.limit(size).offset(offset_num)
-    return users, result_count, total_pages
+    search_filter, order = _search_criteria(full_name, username, identifier,
+                                            email, created_at, mode)
+    if search_filter is not None:
+        users = users.where(search_filter)
+        count = count.where(search_filter)
+    users = paginate(users, User, order, page, size, cursor)
+    filtered = search_filter is not None
+    return with_total(users, User, count, totals, filtered, cursor), count
+
+
+async def select_async(conn, username):
+    """
+    Returns the user with the given username or None if there is no such
+    user, using the given asyncpg connection.
+    """
+    row = await fetchrow(
+        conn, select_columns(User).where(User.username == username))
+    return None if row is None else from_row(User, row)
+
+
+async def select_by_id_async(conn, user_id):
+    """
+    Returns the user with the given ID or None if there is no such user,
+    using the given asyncpg connection.
+    """
+    row = await fetchrow(
+        conn, select_columns(User).where(User.identifier == user_id))
+    return None if row is None else from_row(User, row)
+
+
+async def search_async(conn,
+                       full_name=None,
+                       username=None,
+                       identifier=None,
+                       email=None,
+                       created_at=None,
+                       page=0,
+                       size=MAX_SIZE,
+                       mode=SearchMode.fulltext,
+                       cursor=None,
+                       totals=Totals.exact):
+    """Returns a SearchResult containing users that contain content from the
+    user's query, using the given asyncpg connection. See `paginate` for how
+    page, size and cursor are used and `Totals` for how results are counted.
+    In cursor mode results are only counted for the first page.
+    """
+    key = search_key((full_name, username, identifier, email, created_at),
+                     page, size, mode, cursor, totals)
+    return await cached_search_async(
+        conn, SEARCH_CACHE, User, key,
+        lambda: _search_statements(full_name, username, identifier, email,
+                                   created_at, mode, page, size, cursor,
+                                   totals), size, cursor, totals)
+
+
+def load_username_index(session):
+    """Loads the usernames of all users into USERNAME_INDEX."""
+    USERNAME_INDEX.rebuild(
+        username for username, in session.query(User.username))
+
+
+def load_taken_filters(session):
+    """Loads the usernames and emails of all users into USERNAME_FILTER and
+    EMAIL_FILTER."""
+    rows = session.query(User.username, User.email).all()
+    USERNAME_FILTER.rebuild(username for username, _ in rows)
+    EMAIL_FILTER.rebuild(email for _, email in rows)
+
+
+async def taken_async(conn, username=None, email=None):
+    """
+    Returns a dict that maps 'username' and 'email' to whether the given
+    username and email are taken, using the given asyncpg connection. Values
+    that aren't given are left out. The DB is only queried for values the
+    Bloom filters say are probably taken.
+
+    The filters only learn about users created by this process after it
+    started, so a value taken through another process can be reported as
+    free. Callers that write must still handle the unique constraint.
+    """
+    taken = {}
+    for field, value, bloom, column in (
+            ('username', username, USERNAME_FILTER, User.username),
+            ('email', email, EMAIL_FILTER, User.email)):
+        if value is None:
+            continue
+        TAKEN_CHECKS.inc()
+        taken[field] = False
+        if value in bloom:
+            TAKEN_DB_CHECKS.inc()
+            taken[field] = await fetchval(
+                conn, exists().where(column == value).select())
+    return taken
+
+
+def suggest(prefix, size=MAX_SIZE):
+    """Returns up to `size` usernames that start with the given prefix,
+    ignoring case, without querying the DB."""
+    return USERNAME_INDEX.search(prefix, size)
 
 
 def insert(session, full_name, username, secret, email, bio):
@@ -116,6 +254,10 @@ def insert(session, full_name, username, secret, email, bio):
         bio=bio)
     session.add(user)
     session.commit()
+    SEARCH_CACHE.invalidate()
+    USERNAME_INDEX.add(username)
+    USERNAME_FILTER.add(username)
+    EMAIL_FILTER.add(email)
 
 
 def update(session,
@@ -129,17 +271,40 @@ def update(session,
     user = session.query(User).filter(User.username == username).first()
     if full_name:
         user.full_name = full_name
+    old_email = None
     if email:
+        old_email = user.email
         user.email = email
     if secret:
         user.secret = secret
     if bio:
         user.bio = bio
     session.commit()
+    SEARCH_CACHE.invalidate()
+    if old_email is not None and email != old_email:
+        EMAIL_FILTER.remove(old_email)
+        EMAIL_FILTER.add(email)
     return user
 
 
+async def update_secret_async(conn, user_id, secret):
+    """Replaces the secret of the user with the given ID using the given
+    asyncpg connection. Secrets aren't searchable, so unlike `update` this
+    leaves SEARCH_CACHE alone."""
+    await fetchval(
+        conn,
+        User.__table__.update().where(User.identifier == user_id).values(
+            secret=secret).returning(User.identifier))
+
+
 def delete(session, username):
     """Deletes the user with the given username."""
+    email = session.query(User.email).filter(
+        User.username == username).scalar()
     session.query(User).filter(User.username == username).delete()
     session.commit()
+    SEARCH_CACHE.invalidate()
+    USERNAME_INDEX.remove(username)
+    if email is not None:
+        USERNAME_FILTER.remove(username)
+        EMAIL_FILTER.remove(email)
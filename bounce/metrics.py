@@ -0,0 +1,157 @@
+"""
+Defines lightweight in-process metrics that the server exposes so we can
+see how it behaves under load.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Counter:
+    """A value that only ever goes up (e.g. number of cache hits)."""
+
+    def __init__(self, description):
+        self.description = description
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Increments the counter by the given amount."""
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        """Returns the current value of the counter."""
+        return self._value
+
+    def snapshot(self):
+        """Returns a JSON-serializable representation of the counter."""
+        return self._value
+
+
+class Gauge:
+    """A value that can go up and down (e.g. current queue depth)."""
+
+    def __init__(self, description):
+        self.description = description
+        self._value = 0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def set_function(self, function):
+        """Makes the gauge report the result of calling the given function
+        instead of a stored value."""
+        self._function = function
+
+    def set(self, value):
+        """Sets the gauge to the given value."""
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        """Increments the gauge by the given amount."""
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        """Decrements the gauge by the given amount."""
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self):
+        """Returns the current value of the gauge."""
+        if self._function is not None:
+            return self._function()
+        return self._value
+
+    def snapshot(self):
+        """Returns a JSON-serializable representation of the gauge."""
+        return self.value
+
+
+class Timer:
+    """Tracks the number, total and maximum duration of timed events."""
+
+    def __init__(self, description):
+        self.description = description
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Records an event that took the given number of seconds."""
+        with self._lock:
+            self._count += 1
+            self._total += seconds
+            self._max = max(self._max, seconds)
+
+    @contextmanager
+    def time(self):
+        """Records the time it takes to run the wrapped block of code."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start)
+
+    @property
+    def count(self):
+        """Returns the number of events recorded."""
+        return self._count
+
+    def snapshot(self):
+        """Returns a JSON-serializable representation of the timer with
+        durations in milliseconds."""
+        with self._lock:
+            count, total, maximum = self._count, self._total, self._max
+        return {
+            'count': count,
+            'total_ms': total * 1000,
+            'mean_ms': (total / count) * 1000 if count else 0,
+            'max_ms': maximum * 1000,
+        }
+
+
+class Registry:
+    """Stores metrics by name."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_cls, name, description):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_cls(description)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_cls):
+                raise ValueError(f'Metric {name} is not a {metric_cls}')
+            return metric
+
+    def counter(self, name, description=''):
+        """Returns the counter by the given name, creating it if necessary."""
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name, description=''):
+        """Returns the gauge by the given name, creating it if necessary."""
+        return self._get_or_create(Gauge, name, description)
+
+    def timer(self, name, description=''):
+        """Returns the timer by the given name, creating it if necessary."""
+        return self._get_or_create(Timer, name, description)
+
+    def snapshot(self):
+        """Returns a mapping from metric name to the current value of every
+        metric in the registry."""
+        with self._lock:
+            metrics = list(self._metrics.items())
+        return {name: metric.snapshot() for name, metric in sorted(metrics)}
+
+
+# The registry all Bounce metrics are recorded in
+REGISTRY = Registry()
@@ -0,0 +1,59 @@
+"""
+Defines an in-memory index of names that can be searched by prefix fast
+enough to answer typeahead requests without querying the DB.
+"""
+
+import bisect
+import threading
+
+
+class PrefixIndex:
+    """
+    Stores names in a sorted list so that all names starting with a prefix can
+    be found with a binary search. Matching ignores case.
+    """
+
+    def __init__(self, names=()):
+        self._lock = threading.Lock()
+        self._entries = []
+        self.rebuild(names)
+
+    def rebuild(self, names):
+        """Replaces the contents of the index with the given names."""
+        entries = sorted((name.lower(), name) for name in names)
+        with self._lock:
+            self._entries = entries
+
+    def add(self, name):
+        """Adds a name to the index if it isn't already there."""
+        entry = (name.lower(), name)
+        with self._lock:
+            i = bisect.bisect_left(self._entries, entry)
+            if i == len(self._entries) or self._entries[i] != entry:
+                self._entries.insert(i, entry)
+
+    def remove(self, name):
+        """Removes a name from the index if it's there."""
+        entry = (name.lower(), name)
+        with self._lock:
+            i = bisect.bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def search(self, prefix, limit):
+        """Returns up to `limit` names that start with the given prefix in
+        alphabetical order, ignoring case."""
+        prefix = prefix.lower()
+        names = []
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (prefix, ))
+            while i < len(self._entries) and len(names) < limit:
+                key, name = self._entries[i]
+                if not key.startswith(prefix):
+                    break
+                names.append(name)
+                i += 1
+        return names
+
+    def __len__(self):
+        return len(self._entries)
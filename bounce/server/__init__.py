@@ -6,6 +6,10 @@ from sanic import Sanic, response
 from sanic.log import logger
 
 from .. import db
+from ..db import club, membership, querylog, user
+from .codec import CODEC
+from .executor import BlockingExecutor
+from .hasher import HASHER
 
 DB_DRIVER = 'postgresql'
 
@@ -25,6 +29,8 @@ class Server:
         self._app = Sanic()
         self._engine = None
         self._sessionmaker = None
+        self._pool = None
+        self._executor = None
 
         # Register routes for all endpoints
         self._app.add_route(self.root_handler, '/', methods=['GET'])
@@ -47,15 +53,73 @@ class Server:
         assert self._engine is None and self._sessionmaker is None, (
             'server is already running')
 
+        # Pick the JSON library requests and responses are handled with
+        CODEC.configure(self._config.json_codec)
+        logger.info('Using %s to encode and decode JSON', CODEC.name)
+
+        # Set up logging for slow and sampled DB queries
+        querylog.QUERY_LOG.configure(
+            slow_query_ms=self._config.slow_query_ms,
+            sample_rate=self._config.query_sample_rate,
+            explain=self._config.explain_slow_queries)
+
+        # Size the search result caches
+        for search_cache in (club.SEARCH_CACHE, user.SEARCH_CACHE):
+            search_cache.configure(
+                max_size=self._config.search_cache_size,
+                ttl=self._config.search_cache_ttl)
+
+        # Size the membership role cache used for authorization checks
+        membership.ROLE_CACHE.configure(
+            max_size=self._config.role_cache_size,
+            ttl=self._config.role_cache_ttl)
+
         # Set up engine for interacting with the DB
         self._engine = db.create_engine(
-            DB_DRIVER, self._config.postgres_user,
-            self._config.postgres_password, self._config.postgres_host,
-            self._config.postgres_port, self._config.postgres_db)
+            DB_DRIVER,
+            self._config.postgres_user,
+            self._config.postgres_password,
+            self._config.postgres_host,
+            self._config.postgres_port,
+            self._config.postgres_db,
+            pool_size=self._config.postgres_pool_size,
+            max_overflow=self._config.postgres_max_overflow,
+            pool_timeout=self._config.postgres_pool_timeout,
+            pool_recycle=self._config.postgres_pool_recycle,
+            pool_pre_ping=self._config.postgres_pool_pre_ping)
+
+        # Open the minimum number of connections now rather than on the first
+        # requests
+        if self._config.postgres_pool_prewarm:
+            db.prewarm(self._engine, self._config.postgres_pool_size)
 
         # Set up the sessionmaker we'll use to create DB sessions
         self._sessionmaker = db.get_sessionmaker(self._engine)
 
+        # Load club names and usernames for typeahead suggestions, and taken
+        # usernames and emails for availability checks
+        session = self._sessionmaker()
+        try:
+            club.load_name_index(session)
+            user.load_username_index(session)
+            user.load_taken_filters(session)
+        finally:
+            session.close()
+
+        # Set up the thread pool we'll run blocking calls on
+        self._executor = BlockingExecutor(self._config.executor_size)
+
+        # Size the process pool passwords are hashed on
+        HASHER.configure(
+            size=self._config.hasher_size,
+            queue_size=self._config.hasher_queue_size)
+
+        # The async connection pool has to be created on the loop the app
+        # runs on, so open it when the server starts and close it when it
+        # stops
+        self._app.listener('before_server_start')(self._open_pool)
+        self._app.listener('after_server_stop')(self._close_pool)
+
         # Start listening on the configured port
         if not test:
             self._app.run(host='0.0.0.0', port=self._config.server_port)
@@ -65,6 +129,30 @@ class Server:
         # First make sure this server is actually running
         assert self._engine and self._sessionmaker, 'server was not running'
         self._app.stop()
+        self._executor.shutdown()
+        HASHER.shutdown()
+
+    async def _open_pool(self, *_):
+        """Creates the async DB connection pool."""
+        if self._config.postgres_pool_prewarm:
+            min_size = self._config.postgres_pool_size
+        else:
+            min_size = min(db.ASYNC_POOL_MIN_SIZE,
+                           self._config.postgres_pool_size)
+        self._pool = await db.create_pool(
+            self._config.postgres_user,
+            self._config.postgres_password,
+            self._config.postgres_host,
+            self._config.postgres_port,
+            self._config.postgres_db,
+            min_size=min_size,
+            max_size=(self._config.postgres_pool_size +
+                      self._config.postgres_max_overflow))
+
+    async def _close_pool(self, *_):
+        """Closes the async DB connection pool."""
+        await self._pool.close()
+        self._pool = None
 
     @property
     def app(self):
@@ -81,6 +169,23 @@ class Server:
         """Create a new DB session."""
         return self._sessionmaker(autoflush=True)
 
+    @property
+    def db_connection(self):
+        """Acquire a connection from the async DB pool. Use as
+        `async with server.db_connection as conn`."""
+        return db.InstrumentedAcquire(self._pool)
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """Runs the given blocking function on the server's bounded thread
+        pool and returns its result without blocking the event loop."""
+        return await self._executor.run(func, *args, **kwargs)
+
+    async def run_hasher(self, func, *args):
+        """Runs the given password hashing function on the process pool
+        shared by all servers and returns its result. Raises HasherBusy if
+        too many calls are waiting."""
+        return await HASHER.run(func, *args)
+
     async def root_handler(self, _):
         """Returns an HTTP 200 reponse containing a simple message."""
         return response.text('Bounce API accepting requests!')
@@ -11,6 +11,9 @@ from sanic import response
 from sanic.log import logger
 
 from . import util
+from ..codec import CODEC
+from ..hasher import RETRY_AFTER, HasherBusy
+from ..loader import DataLoader
 
 HTTP_METHODS = set(
     ['get', 'put', 'post', 'delete', 'head', 'connect', 'options', 'trace'])
@@ -22,16 +25,18 @@ IMAGE_SIZE_LIMIT = 1000000
 class APIError(Exception):
     """Represents an error that occurs while handling a request."""
 
-    def __init__(self, message, status=500):
+    def __init__(self, message, status=500, headers=None):
         """Creates a new APIError
 
         Args:
             message (str): the error message
             status (int): the HTTP status code to return
+            headers (dict): extra headers to return
         """
         super().__init__(message)
         self._message = message
         self._status = status
+        self._headers = headers or {}
 
     @property
     def message(self):
@@ -45,6 +50,39 @@ class APIError(Exception):
         raised."""
         return self._status
 
+    @property
+    def headers(self):
+        """Returns the extra HTTP headers to be returned when this error is
+        raised."""
+        return self._headers
+
+
+class LazySession:
+    """
+    Stands in for the SQLAlchemy session a request's handler is given. The
+    session is only created when the handler first uses it, so handlers that
+    only use the loader's connection (or none) never open one.
+    """
+
+    def __init__(self, server):
+        """Creates a new lazy session.
+
+        Args:
+            server (Server): the server whose sessions to use
+        """
+        self._server = server
+        self._session = None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self._server.db_session
+        return getattr(self._session, name)
+
+    @property
+    def used(self):
+        """Returns whether the session has been created."""
+        return self._session is not None
+
 
 class Endpoint:
     """
@@ -84,6 +122,26 @@ class Endpoint:
         """Returns a list of HTTP methods allowed on this endpoint."""
         return list(self._allowed_methods)
 
+    async def run_blocking(self, func, *args, **kwargs):
+        """Runs the given blocking function (e.g. one that does work with a
+        DB session, writes files or hashes passwords) on the server's bounded
+        thread pool so it doesn't block other requests, and returns its
+        result.
+        """
+        return await self.server.run_blocking(func, *args, **kwargs)
+
+    async def run_hasher(self, func, *args):
+        """Runs the given password hashing function (e.g. util.hash_password)
+        on the server's process pool and returns its result. Responds with a
+        503 if too many calls are already waiting."""
+        try:
+            return await self.server.run_hasher(func, *args)
+        except HasherBusy:
+            raise APIError(
+                'Server busy',
+                status=503,
+                headers={'Retry-After': str(RETRY_AFTER)})
+
     # pylint: disable=unused-argument
     async def options(self, _, *args, **kwargs):
         """Default handler for OPTIONS requests.
@@ -102,7 +160,7 @@ class Endpoint:
                     'Access-Control-Allow-Headers': '*',
                     'Access-Control-Allow-Methods': methods,
                 })
-        return response.json({'error': 'Method not allowed'}, status=405)
+        return CODEC.response({'error': 'Method not allowed'}, status=405)
 
     # pylint: enable=unused-argument
 
@@ -114,8 +172,11 @@ class Endpoint:
             request (Request): the incoming request to route
         """
         # Create a SQLAlchemy session for handling DB transactions in this
-        # request
-        session = self.server.db_session
+        # request, and a loader for the club and membership lookups handlers
+        # make. Neither connects to the DB until the handler uses it.
+        session = LazySession(self.server)
+        loader = DataLoader(self.server)
+        request['loader'] = loader
         result = None
         try:
             # Call the handler with the same name as the request method
@@ -127,13 +188,16 @@ class Endpoint:
             logger.exception(
                 'An error occurred during the handling of a %s '
                 'request to %s', request.method, self.__class__.__name__)
-            result = response.json({'error': err.message}, status=err.status)
+            result = CODEC.response(
+                {
+                    'error': err.message
+                }, status=err.status, headers=err.headers)
         except Exception:
             # An error occurred during the handling of this request
             logger.exception(
                 'An error occurred during the handling of a %s '
                 'request to %s', request.method, self.__class__.__name__)
-            result = response.json(
+            result = CODEC.response(
                 {
                     'error': 'Internal server error'
                 }, status=500)
@@ -143,8 +207,11 @@ class Endpoint:
                     result.headers, 'Access-Control-Allow-Origin'):
                 result.headers[
                     'Access-Control-Allow-Origin'] = self._allowed_origin
-            # Make sure the session is closed
-            session.close()
+            # Make sure the session is closed. This may roll back an open
+            # transaction, so don't do it on the event loop.
+            await loader.close()
+            if session.used:
+                await self.run_blocking(session.close)
 
         return result
 
@@ -164,12 +231,12 @@ def verify_token():
         async def wrapper(endpoint, session, request, *args, **kwargs):
             if not request.token:
                 logger.error('No token provided in request')
-                return response.json({'error': 'Unauthorized'}, status=401)
+                return CODEC.response({'error': 'Unauthorized'}, status=401)
             user_id = util.check_jwt(request.token,
                                      endpoint.server.config.secret)
             if not user_id:
                 logger.error('Invalid auth token')
-                return response.json({'error': 'Unauthorized'}, status=401)
+                return CODEC.response({'error': 'Unauthorized'}, status=401)
             kwargs['id_from_token'] = user_id
 
             # Call the request handler
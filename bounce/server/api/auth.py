@@ -1,10 +1,11 @@
 """Endpoints for authenticating users."""
 
-from sanic import response
+from sanic.log import logger
 
 from . import APIError, Endpoint, util
 from ...db import user
-from ..resource import validate
+from ..hasher import HasherBusy
+from ..resource import Payload, validate
 from ..resource.auth import AuthenticateUserRequest, AuthenticateUserResponse
 
 
@@ -14,20 +15,39 @@ class LoginEndpoint(Endpoint):
     __uri__ = '/auth/login'
 
     @validate(AuthenticateUserRequest, AuthenticateUserResponse)
-    async def post(self, session, request):
+    async def post(self, _session, request):
         """Handles a POST /auth/login request by validating the user's
-        credentials and issuing them a JSON Web Token."""
+        credentials and issuing them a JSON Web Token. Secrets hashed with a
+        bcrypt cost other than the configured one are rehashed."""
         body = request.json
 
         # Fetch the user's info from the DB
-        user_row = user.select(session, body['username'])
+        async with self.server.db_connection as conn:
+            user_row = await user.select_async(conn, body['username'])
         if not user_row:
             raise APIError('Unauthorized', status=401)
 
         # Check that the user's password is correct
-        if not util.check_password(body['password'], user_row.secret):
+        if not await self.run_hasher(util.check_password, body['password'],
+                                     user_row.secret):
             raise APIError('Unauthorized', status=401)
 
+        # Now that we have the password, rehash it if the secret's cost is
+        # out of date. If the hasher is busy, try again on the next login
+        # rather than failing this one.
+        cost = self.server.config.bcrypt_cost
+        if util.secret_cost(user_row.secret) != cost:
+            try:
+                secret = await self.server.run_hasher(
+                    util.hash_password, body['password'], cost)
+            except HasherBusy:
+                logger.warning('Skipped rehashing secret for user %s',
+                               user_row.identifier)
+            else:
+                async with self.server.db_connection as conn:
+                    await user.update_secret_async(conn, user_row.identifier,
+                                                   secret)
+
         # Issue the user a token
         token = util.create_jwt(user_row.identifier, self.server.config.secret)
-        return response.json({'token': token}, status=200)
+        return Payload({'token': token}, status=200)
@@ -7,13 +7,14 @@ from sanic import response
 from sqlalchemy.exc import IntegrityError
 
 from . import IMAGE_SIZE_LIMIT, APIError, Endpoint, util, verify_token
-from ...db import Roles, club, image, membership
+from ...db import Roles, SearchMode, Totals, club, image, membership
 from ...db.club import MAX_SIZE, MIN_SIZE
 from ...db.image import EntityType
-from ..resource import validate
+from ..resource import Payload, validate
 from ..resource.club import (DeleteClubRequest, GetClubResponse,
                              PostClubsRequest, PutClubRequest,
-                             SearchClubsRequest, SearchClubsResponse)
+                             SearchClubsRequest, SearchClubsResponse,
+                             SuggestClubsRequest, SuggestClubsResponse)
 
 
 class ClubEndpoint(Endpoint):
@@ -22,32 +23,35 @@ class ClubEndpoint(Endpoint):
     __uri__ = "/clubs/<name:string>"
 
     @validate(None, GetClubResponse)
-    async def get(self, session, _, name):
+    async def get(self, _session, request, name):
         """Handles a GET /clubs/<name> request by returning the club with
         the given name."""
         # Decode the name, since special characters will be URL-encoded
         name = unquote(name)
         # Fetch club data from DB
-        club_data = club.select(session, name)
+        club_data = await request['loader'].club(name)
         if not club_data:
             # Failed to find a club with that name
             raise APIError('No such club', status=404)
-        return response.json(club_data, status=200)
+        return Payload(club_data, status=200)
 
     @verify_token()
     @validate(PutClubRequest, GetClubResponse)
-    async def put(self, session, request, name, id_from_token=None):
+    async def put(self, _session, request, name, id_from_token=None):
         """Handles a PUT /clubs/<name> request by updating the club with
         the given name and returning the updated club info."""
         # Decode the name, since special characters will be URL-encoded
         name = unquote(name)
         body = util.strip_whitespace(request.json)
+        club_id = await request['loader'].club_id(name)
+        if club_id is None:
+            raise APIError('No such club', status=404)
+        editors_role = await request['loader'].role(club_id, id_from_token)
         try:
-            editor_attr = membership.select(session, name, id_from_token,
-                                            Roles.president.value)
-            editors_role = editor_attr[0]['role']
-            updated_club = club.update(
-                session,
+            if not editors_role:
+                raise PermissionError('Only members can update the club')
+            updated_club = await club.update_async(
+                await request['loader'].connection(),
                 name,
                 editors_role,
                 new_name=body.get('name', None),
@@ -58,21 +62,27 @@ class ClubEndpoint(Endpoint):
                 twitter_url=body.get('twitter_url', None))
         except PermissionError:
             raise APIError('Forbidden', status=403)
-        return response.json(updated_club, status=200)
+        if updated_club is None:
+            raise APIError('No such club', status=404)
+        return Payload(updated_club, status=200)
 
     @verify_token()
     @validate(DeleteClubRequest, None)
-    async def delete(self, session, _, name, id_from_token=None):
+    async def delete(self, _session, request, name, id_from_token=None):
         """Handles a DELETE /clubs/<name> request by deleting the club with
         the given name."""
         # Decode the name, since special characters will be URL-encoded
 
         name = unquote(name)
+        club_id = await request['loader'].club_id(name)
+        if club_id is None:
+            raise APIError('No such club', status=404)
+        editors_role = await request['loader'].role(club_id, id_from_token)
         try:
-            membership_attr = membership.select(session, name, id_from_token,
-                                                Roles.president.value)
-            editors_role = membership_attr[0]['role']
-            club.delete(session, name, editors_role)
+            if not editors_role:
+                raise PermissionError('Only members can delete the club')
+            await club.delete_async(await request['loader'].connection(),
+                                    name, editors_role)
         except PermissionError:
             raise APIError('Forbidden', status=403)
         return response.text('', status=204)
@@ -90,7 +100,8 @@ class ClubsEndpoint(Endpoint):
         # Put the club in the DB
         body = util.strip_whitespace(request.json)
         try:
-            club.insert(
+            club_id = await self.run_blocking(
+                club.insert,
                 session,
                 name=body.get('name', None),
                 description=body.get('description', None),
@@ -101,9 +112,9 @@ class ClubsEndpoint(Endpoint):
         except IntegrityError:
             raise APIError('Club already exists', status=409)
         # Give the creator of the club a President membership
-        membership.insert(session, body.get('name', None), id_from_token,
-                          Roles.president.value, Roles.president.value,
-                          'Owner')
+        await self.run_blocking(membership.insert, session, club_id,
+                                id_from_token, Roles.president.value,
+                                Roles.president.value, 'Owner')
         return response.text('', status=201)
 
 
@@ -113,7 +124,7 @@ class SearchClubsEndpoint(Endpoint):
     __uri__ = '/clubs/search'
 
     @validate(SearchClubsRequest, SearchClubsResponse)
-    async def get(self, session, request):
+    async def get(self, _session, request):
         """Handles a GET /club/search request by returning
         clubs that contain content from the query."""
 
@@ -124,6 +135,8 @@ class SearchClubsEndpoint(Endpoint):
         if 'description' in request.args:
             description = request.args['description']
 
+        mode = SearchMode(request.args['mode'])
+        totals = Totals(request.args['totals'])
         page = int(request.args['page'])
         size = int(request.args['size'])
         if size > MAX_SIZE:
@@ -131,23 +144,51 @@ class SearchClubsEndpoint(Endpoint):
         if size < MIN_SIZE:
             raise APIError('size too low', status=400)
 
-        queried_clubs, result_count, total_pages = club.search(
-            session, name, description, page, size)
+        # In cursor mode start at the given cursor, or the first page if
+        # there isn't one
+        cursor = util.query_param(
+            request, 'cursor',
+            '' if request.args['pagination'] == 'cursor' else None)
+
+        try:
+            async with self.server.db_connection as conn:
+                result = await club.search_async(conn, name, description, page,
+                                                 size, mode, cursor, totals)
+        except ValueError:
+            raise APIError('Invalid cursor', status=400)
 
-        if not queried_clubs:
-            # Failed to find clubs that match the query
-            raise APIError('No clubs match your query', status=404)
-        results = []
-        for result in queried_clubs.all():
-            results.append(result.to_dict())
         info = {
-            'results': results,
-            'result_count': result_count,
-            'page': page,
-            'total_pages': total_pages
+            'results': result.results,
+            'result_count': result.result_count,
         }
+        if cursor is None:
+            info['page'] = page
+            info['total_pages'] = result.total_pages
+        else:
+            info['next_cursor'] = result.next_cursor
+
+        return Payload(info, status=200)
+
+
+class SuggestClubsEndpoint(Endpoint):
+    """Handles requests to /clubs/suggest."""
+
+    __uri__ = '/clubs/suggest'
+
+    @validate(SuggestClubsRequest, SuggestClubsResponse)
+    async def get(self, _session, request):
+        """Handles a GET /clubs/suggest request by returning the names of
+        clubs that start with the given prefix. This doesn't query the DB so
+        it's fast enough to call on every keystroke."""
+        size = int(request.args['size'])
+        if size > MAX_SIZE:
+            raise APIError('size too high', status=400)
+        if size < MIN_SIZE:
+            raise APIError('size too low', status=400)
 
-        return response.json(info, status=200)
+        names = club.suggest(request.args['prefix'], size)
+        info = {'results': [{'name': name} for name in names]}
+        return Payload(info, status=200)
 
 
 class ClubImagesEndpoint(Endpoint):
@@ -184,7 +225,7 @@ class ClubImagesEndpoint(Endpoint):
             raise APIError('Invalid image name', status=400)
 
         # Make sure the user is updating an image they own
-        club_info = club.select(session, name)
+        club_info = await self.run_blocking(club.select, session, name)
         if not club_info:
             raise APIError('No such image', status=404)
 
@@ -199,8 +240,9 @@ class ClubImagesEndpoint(Endpoint):
         if len(image_upload.body) > IMAGE_SIZE_LIMIT:
             raise APIError('Image too large', status=400)
 
-        image.save(self.server.config.image_dir, EntityType.CLUB, name,
-                   image_name, image_upload.body)
+        await self.run_blocking(image.save, self.server.config.image_dir,
+                                EntityType.CLUB, name, image_name,
+                                image_upload.body)
 
         return response.text('', status=200)
 
@@ -211,11 +253,12 @@ class ClubImagesEndpoint(Endpoint):
         if not util.check_image_name(image_name):
             raise APIError('Invalid image name', status=400)
         # Make sure the user is deleting their own image
-        club_info = club.select(session, name)
+        club_info = await self.run_blocking(club.select, session, name)
         if not club_info:
             raise APIError('No such image', status=404)
         try:
-            image.delete(
+            await self.run_blocking(
+                image.delete,
                 self.server.config.image_dir,
                 EntityType.CLUB,
                 name,
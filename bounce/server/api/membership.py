@@ -1,16 +1,38 @@
 """Request handlers for the /users endpoint."""
 
+import asyncio
 from urllib.parse import unquote
 
 from sanic import response
-from sqlalchemy.exc import IntegrityError
 
 from . import APIError, Endpoint, util, verify_token
-from ...db import Roles, club, membership
-from ..resource import validate
+from ...db import iterate, membership
+from ..codec import CODEC
+from ..resource import Payload, check_sample, validate
 from ..resource.membership import (
     DeleteMembershipRequest, GetMembershipsRequest, GetMembershipsResponse,
-    PutMembershipRequest)
+    ImportMembershipsResponse, PutMembershipRequest)
+
+# A streamed roster stops reading rows while more than this many bytes are
+# waiting to be sent to the client, and checks again every DRAIN_INTERVAL
+# seconds
+STREAM_BUFFER_LIMIT = 64 * 1024
+DRAIN_INTERVAL = 0.01
+
+
+async def drain(transport):
+    """Waits until the given transport has no more than STREAM_BUFFER_LIMIT
+    bytes left to send. Sanic's streaming responses write straight to the
+    transport, which gives them no other way to wait for a slow client.
+
+    Raises:
+        ConnectionError: the client disconnected
+    """
+    while not transport.is_closing():
+        if transport.get_write_buffer_size() <= STREAM_BUFFER_LIMIT:
+            return
+        await asyncio.sleep(DRAIN_INTERVAL)
+    raise ConnectionError('Client disconnected')
 
 
 class MembershipEndpoint(Endpoint):
@@ -20,48 +42,134 @@ class MembershipEndpoint(Endpoint):
 
     @verify_token()
     @validate(GetMembershipsRequest, GetMembershipsResponse)
-    async def get(self, session, request, club_name, id_from_token=None):
+    async def get(self, _session, request, club_name, id_from_token=None):
         """
         Handles a GET /memberships/<club_name> request
         by returning the membership that associates the given user with the
         given club. If no user ID is given, returns all memberships for the
         given club.
         """
+        # Decode the club name and make sure the club exists
+        club_id = await request['loader'].club_id(unquote(club_name))
+        if club_id is None:
+            raise APIError('No such club', status=404)
+        return await self.get_memberships(request, club_id, id_from_token)
 
+    @verify_token()
+    @validate(PutMembershipRequest, None)
+    async def put(self, _session, request, club_name, id_from_token=None):
+        """Handles a PUT /memberships/<club_name>?user_id=<user_id> request by
+        creating or updating the membership for the given user and club."""
         # Decode the club name
-        club_name = unquote(club_name)
+        club_id = await request['loader'].club_id(unquote(club_name))
+        if club_id is None:
+            raise APIError('Bad request', status=400)
+        return await self.put_membership(request, club_id, id_from_token)
 
-        # Make sure the club exists
-        club_row = club.select(session, club_name)
-        if not club_row:
+    @verify_token()
+    @validate(DeleteMembershipRequest, None)
+    async def delete(self, _session, request, club_name, id_from_token=None):
+        """
+        Handles a DELETE /memberships/<club_name> request
+        by deleting the membership that associates the given user with the
+        given club.
+        """
+        # Decode the club name and make sure the club exists
+        club_id = await request['loader'].club_id(unquote(club_name))
+        if club_id is None:
             raise APIError('No such club', status=404)
+        return await self.delete_memberships(request, club_id, id_from_token)
+
+    async def get_memberships(self, request, club_id, id_from_token):
+        """Returns a response containing the membership of the user given in
+        the request in the club with the given ID. If no user is given,
+        returns the club's roster from oldest to newest membership, one page
+        at a time if a limit or cursor is given and streamed as
+        newline-delimited JSON if the ndjson format is requested."""
+        loader = request['loader']
+
         try:
-            # If not a member, the editors_role is defaulted to None
-            editors_role = None
-            # Otherwise, check his or her membership
-            membership_attr = membership.select(
-                self.server.db_session, club_name, id_from_token, Roles.member)
-            if membership_attr:
-                editors_role = membership_attr[0]['role']
+            # If not a member, the editors_role is None
+            editors_role = await loader.role(club_id, id_from_token)
+            if not membership.can_select(editors_role):
+                raise PermissionError(
+                    'Permission denied for selecting membership.')
             # Fetch the club's memberships
-            if 'user_id' in request.args:
-                user_id = int(request.args['user_id'])
-                membership_info = membership.select(
-                    self.server.db_session, club_name, user_id, editors_role)
-            else:
-                membership_info = membership.select_all(
-                    self.server.db_session, club_name, editors_role)
+            if 'user_id' not in request.args:
+                return await self.get_roster(request, club_id, editors_role)
+            membership_attr = await loader.membership(
+                club_id, int(request.args['user_id']))
+            membership_info = [membership_attr] if membership_attr else []
         except PermissionError:
             raise APIError('Forbidden', status=403)
-        return response.json(membership_info, status=200)
+        return Payload(membership_info, status=200)
 
-    @verify_token()
-    @validate(PutMembershipRequest, None)
-    async def put(self, session, request, club_name, id_from_token=None):
-        """Handles a PUT /memberships/<club_name>?user_id=<user_id> request by
-        creating or updating the membership for the given user and club."""
-        # Decode the club name
-        club_name = unquote(club_name)
+    async def get_roster(self, request, club_id, editors_role):
+        """Returns a response containing the roster of the club with the
+        given ID as seen by a member with the given role."""
+        loader = request['loader']
+        headers = {}
+        limit = None
+        if 'limit' in request.args:
+            limit = int(request.args['limit'])
+            if not 0 < limit <= membership.MAX_ROSTER_PAGE_SIZE:
+                raise APIError('Invalid limit', status=400)
+        cursor = util.query_param(request, 'cursor')
+        if cursor is not None and limit is None:
+            limit = membership.ROSTER_PAGE_SIZE
+
+        try:
+            if request.args['format'] == 'ndjson':
+                statement = membership.roster_statement(
+                    club_id, editors_role, limit, cursor)
+                return self.stream_roster(statement)
+            if limit is None:
+                membership_info = await membership.select_all_async(
+                    await loader.connection(), club_id, editors_role)
+            else:
+                membership_info, next_cursor = \
+                    await membership.select_page_async(
+                        await loader.connection(), club_id, editors_role,
+                        limit, cursor)
+                if next_cursor:
+                    headers['X-Next-Cursor'] = next_cursor
+        except ValueError:
+            raise APIError('Invalid cursor', status=400)
+        return Payload(membership_info, status=200, headers=headers)
+
+    def stream_roster(self, statement):
+        """Returns a response that streams the memberships selected by the
+        given (query, params) as newline-delimited JSON. The rows are read
+        from a server-side cursor on a connection of their own, since the
+        response is written after the request's connection is released.
+        Reading waits for a slow client to catch up, so at most about one
+        cursor prefetch and STREAM_BUFFER_LIMIT bytes are held at once.
+
+        Each row is validated as an entry of GetMembershipsResponse as often
+        as `validate` validates whole responses. The response has started by
+        then, so rows that don't match are only logged and counted."""
+        server = self.server
+        rate = server.config.response_validation_rate
+
+        async def write_rows(stream):
+            async with server.db_connection as conn:
+                rows = iterate(conn, *statement)
+                try:
+                    async for row in rows:
+                        info = dict(row)
+                        check_sample(GetMembershipsResponse, [info], rate)
+                        stream.write(CODEC.dumps(info) + b'\n')
+                        await drain(stream.transport)
+                finally:
+                    await rows.aclose()
+
+        return response.stream(
+            write_rows, content_type='application/x-ndjson')
+
+    @staticmethod
+    async def put_membership(request, club_id, id_from_token):
+        """Creates or updates the membership of the user given in the request
+        in the club with the given ID."""
         body = util.strip_whitespace(request.json)
         position = body.get('position', None)
         members_role = body.get('members_role', None)
@@ -72,71 +180,123 @@ class MembershipEndpoint(Endpoint):
         except KeyError:
             raise APIError('No user ID provided', status=400)
 
-        # get the editors role using id_from_token
-        # to see if the editor has access to insert/update
-        # the memberships table.
-        editor_attr = membership.select(session, club_name, id_from_token,
-                                        Roles.president)
-        if not editor_attr:
-            # Either the club doesn't exist, or the user is not a member of
+        # Check the editor's permissions and write the membership in one
+        # statement
+        try:
+            await membership.upsert_async(
+                await request['loader'].connection(), club_id, id_from_token,
+                user_id, members_role, position)
+        except PermissionError:
+            raise APIError('Forbidden', status=403)
+        except ValueError:
+            # Either the user doesn't exist or the editor is not a member of
             # the club
             raise APIError('Bad request', status=400)
+        return response.text('', status=201)
+
+    @staticmethod
+    async def delete_memberships(request, club_id, id_from_token):
+        """Deletes the membership of the user given in the request in the
+        club with the given ID, or all memberships except Presidents' if no
+        user is given."""
+        loader = request['loader']
 
-        editors_role = editor_attr[0]['role']
-        membership_attr = membership.select(session, club_name, user_id,
-                                            Roles.president)
+        user_id = None
+        if 'user_id' in request.args:
+            user_id = int(request.args['user_id'])
+            # Load the editor's and the member's memberships in one query so
+            # the role lookups below don't each make one
+            await loader.memberships(club_id, [id_from_token, user_id])
 
         try:
-            # If the membership exists already in the table, update entry
-            if membership_attr:
-                current_members_role = membership_attr[0]['role']
-                membership.update(session, club_name, user_id, editors_role,
-                                  current_members_role, position, members_role)
-            # Otherwise, insert new entry
+            editors_role = await loader.role(club_id, id_from_token)
+            if not editors_role:
+                raise PermissionError('Only members can delete memberships')
+
+            if user_id is not None:
+                members_role = await loader.role(club_id, user_id)
+                if not members_role:
+                    raise APIError('Bad request', status=400)
+
+                await membership.delete_async(await loader.connection(),
+                                              club_id, id_from_token, user_id,
+                                              editors_role, members_role)
             else:
-                membership.insert(session, club_name, user_id, editors_role,
-                                  members_role, position)
+                await membership.delete_all_async(await loader.connection(),
+                                                  club_id, editors_role)
         except PermissionError:
             raise APIError('Forbidden', status=403)
-        except IntegrityError:
-            raise APIError('Bad request', status=400)
         return response.text('', status=201)
 
+
+class ClubMembershipEndpoint(MembershipEndpoint):
+    """Handles requests to /clubs/<club_id>/memberships, which work like
+    /memberships/<club_name> for clients that already have the club's ID."""
+
+    __uri__ = '/clubs/<club_id:int>/memberships'
+
     @verify_token()
-    @validate(DeleteMembershipRequest, None)
-    async def delete(self, session, request, club_name, id_from_token=None):
-        """
-        Handles a DELETE /memberships/<club_name> request
-        by deleting the membership that associates the given user with the
-        given club.
-        """
+    @validate(GetMembershipsRequest, GetMembershipsResponse)
+    async def get(self, _session, request, club_id, id_from_token=None):
+        """Handles a GET /clubs/<club_id>/memberships request."""
+        if not await request['loader'].club_by_id(club_id):
+            raise APIError('No such club', status=404)
+        return await self.get_memberships(request, club_id, id_from_token)
 
-        # Decode the club name
-        club_name = unquote(club_name)
+    @verify_token()
+    @validate(PutMembershipRequest, None)
+    async def put(self, _session, request, club_id, id_from_token=None):
+        """Handles a PUT /clubs/<club_id>/memberships?user_id=<user_id>
+        request."""
+        if not await request['loader'].club_by_id(club_id):
+            raise APIError('No such club', status=404)
+        return await self.put_membership(request, club_id, id_from_token)
 
-        # Make sure the club exists
-        club_row = club.select(session, club_name)
-        if not club_row:
+    @verify_token()
+    @validate(DeleteMembershipRequest, None)
+    async def delete(self, _session, request, club_id, id_from_token=None):
+        """Handles a DELETE /clubs/<club_id>/memberships request."""
+        if not await request['loader'].club_by_id(club_id):
             raise APIError('No such club', status=404)
+        return await self.delete_memberships(request, club_id, id_from_token)
 
-        try:
-            editor_attr = membership.select(session, club_name, id_from_token,
-                                            Roles.president)
 
-            editors_role = editor_attr[0]['role']
+class ImportMembershipsEndpoint(Endpoint):
+    """Handles requests to /memberships/<club_name>/import."""
 
-            if 'user_id' in request.args:
-                user_id = int(request.args['user_id'])
-                member_attr = membership.select(session, club_name, user_id,
-                                                Roles.president)
-                if not member_attr:
-                    raise APIError('Bad request', status=400)
+    __uri__ = '/memberships/<club_name:string>/import'
 
-                members_role = member_attr[0]['role']
-                membership.delete(session, club_name, id_from_token, user_id,
-                                  editors_role, members_role)
+    @verify_token()
+    @validate(None, ImportMembershipsResponse)
+    async def post(self, session, request, club_name, id_from_token=None):
+        """
+        Handles a POST /memberships/<club_name>/import request by creating or
+        updating the memberships in the request body. The body is either a
+        JSON array of objects or CSV (with a text/csv Content-Type) with a
+        header, and each membership has a `username` or `user_id`, a `role`
+        and a `position`. Responds with the number of memberships imported
+        and the rows that couldn't be.
+        """
+        # Decode the club name and make sure the club exists
+        club_id = await request['loader'].club_id(unquote(club_name))
+        if club_id is None:
+            raise APIError('No such club', status=404)
+
+        content_type = request.headers.get('Content-Type', '')
+        try:
+            if content_type.startswith('text/csv'):
+                rows = membership.parse_import_csv(
+                    request.body.decode('utf-8'))
             else:
-                membership.delete_all(session, club_name, editors_role)
+                rows = CODEC.loads(request.body)
+        except ValueError:
+            raise APIError('Invalid import body', status=400)
+
+        try:
+            report = await self.run_blocking(
+                membership.import_rows, session, club_id, id_from_token, rows)
         except PermissionError:
             raise APIError('Forbidden', status=403)
-        return response.text('', status=201)
+        except ValueError as err:
+            raise APIError(str(err), status=400)
+        return Payload(report, status=200)
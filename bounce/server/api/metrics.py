@@ -0,0 +1,19 @@
+"""Request handlers for the /metrics endpoint."""
+
+from . import Endpoint
+from ...metrics import REGISTRY
+from ..codec import CODEC
+
+
+class MetricsEndpoint(Endpoint):
+    """Handles requests to /metrics."""
+
+    __uri__ = '/metrics'
+
+    # pylint: disable=unused-argument
+    async def get(self, session, _):
+        """Handles a GET /metrics request by returning the current value of
+        every metric the server records."""
+        return CODEC.response(REGISTRY.snapshot(), status=200)
+
+    # pylint: enable=unused-argument
@@ -6,12 +6,16 @@ from sanic import response
 from sqlalchemy.exc import IntegrityError
 
 from . import IMAGE_SIZE_LIMIT, APIError, Endpoint, util, verify_token
-from ...db import image, user
+from ...db import SearchMode, Totals, image, membership, user
 from ...db.image import EntityType
 from ...db.user import MAX_SIZE, MIN_SIZE
-from ..resource import validate
+from ..resource import Payload, validate
+from ..resource.membership import GetUserMembershipsResponse
 from ..resource.user import (GetUserResponse, PostUsersRequest, PutUserRequest,
-                             SearchUsersRequest, SearchUsersResponse)
+                             SearchUsersRequest, SearchUsersResponse,
+                             SuggestUsersRequest, SuggestUsersResponse,
+                             UserAvailabilityRequest,
+                             UserAvailabilityResponse)
 
 
 class UserEndpoint(Endpoint):
@@ -20,15 +24,16 @@ class UserEndpoint(Endpoint):
     __uri__ = "/users/<username:string>"
 
     @validate(None, GetUserResponse)
-    async def get(self, session, _, username):
+    async def get(self, _session, _, username):
         """Handles a GET /users/<username> request by returning the user with
         the given membership."""
         # Fetch user data from DB
-        user_row = user.select(session, username)
+        async with self.server.db_connection as conn:
+            user_row = await user.select_async(conn, username)
         if not user_row:
             # Failed to find a user with that username
             raise APIError('No such user', status=404)
-        return response.json(user_row.to_dict(), status=200)
+        return Payload(user_row.to_dict(), status=200)
 
     @verify_token()
     @validate(PutUserRequest, GetUserResponse)
@@ -39,7 +44,7 @@ class UserEndpoint(Endpoint):
         secret = None
         email = None
         # Make sure the ID from the token is for the user we're updating
-        user_row = user.select(session, username)
+        user_row = await self.run_blocking(user.select, session, username)
         if not user_row:
             raise APIError('No such user', status=404)
         if user_row.identifier != id_from_token:
@@ -49,7 +54,8 @@ class UserEndpoint(Endpoint):
             if not body.get('password'):
                 raise APIError('Password not provided', status=400)
             # Check that user's password is correct
-            if not util.check_password(body['password'], user_row.secret):
+            if not await self.run_hasher(
+                    util.check_password, body['password'], user_row.secret):
                 raise APIError('Unauthorized', status=401)
             if body.get('new_password'):
                 raise APIError(
@@ -61,7 +67,8 @@ class UserEndpoint(Endpoint):
             if not body.get('password'):
                 raise APIError('Current Password not provided', status=400)
             # Check that the user's password is correct
-            if not util.check_password(body['password'], user_row.secret):
+            if not await self.run_hasher(
+                    util.check_password, body['password'], user_row.secret):
                 raise APIError('Unauthorized', status=401)
             # Make sure the password is valid (no need
             # to check email, this is done
@@ -71,9 +78,12 @@ class UserEndpoint(Endpoint):
             # Create a secret from the user's password
             #  that we can use to securely
             # verify their password when they log in
-            secret = util.hash_password(body['new_password'])
+            secret = await self.run_hasher(util.hash_password,
+                                           body['new_password'],
+                                           self.server.config.bcrypt_cost)
         # Update the user
-        updated_user = user.update(
+        updated_user = await self.run_blocking(
+            user.update,
             session,
             username,
             secret=secret,
@@ -81,26 +91,50 @@ class UserEndpoint(Endpoint):
             email=email,
             bio=body.get('bio', None))
         # Returns the updated user info
-        return response.json(updated_user.to_dict(), status=200)
+        return Payload(updated_user.to_dict(), status=200)
 
     @verify_token()
     async def delete(self, session, _, username, id_from_token=None):
         """Handles a DELETE /users/<username> request by deleting the user with
         the given username. """
         # Make sure the ID from the token is for the user we're deleting
-        user_row = user.select(session, username)
+        user_row = await self.run_blocking(user.select, session, username)
         if not user_row:
             raise APIError('No such user', status=404)
         elif user_row.identifier != id_from_token:
             raise APIError('Forbidden', status=403)
         # Delete the user
-        user.delete(session, username)
+        await self.run_blocking(user.delete, session, username)
         # Delete the user's images
-        image.delete_dir(self.server.config.image_dir, EntityType.USER,
-                         user_row.identifier)
+        await self.run_blocking(image.delete_dir, self.server.config.image_dir,
+                                EntityType.USER, user_row.identifier)
         return response.text('', status=204)
 
 
+class UserMembershipsEndpoint(Endpoint):
+    """Handles requests to /users/<username>/memberships."""
+
+    __uri__ = '/users/<username:string>/memberships'
+
+    # Any signed in user can see which clubs a user belongs to
+    # pylint: disable=unused-argument
+    @verify_token()
+    @validate(None, GetUserMembershipsResponse)
+    async def get(self, _session, request, username, id_from_token=None):
+        """Handles a GET /users/<username>/memberships request by returning
+        the clubs the user with the given username is a member of and their
+        role in each."""
+        conn = await request['loader'].connection()
+        clubs = await membership.select_clubs_async(conn, username)
+        # Only look the user up when there are no memberships to tell
+        # whether they exist
+        if not clubs and not await user.select_async(conn, username):
+            raise APIError('No such user', status=404)
+        return Payload(clubs, status=200)
+
+    # pylint: enable=unused-argument
+
+
 class UsersEndpoint(Endpoint):
     """Handles requests to /users."""
 
@@ -117,13 +151,22 @@ class UsersEndpoint(Endpoint):
         # by a jsonschema formatter)
         if not util.validate_password(body['password']):
             raise APIError('Invalid password', status=400)
+        # Make sure the username and email are available before spending
+        # time hashing the password
+        taken = await user.taken_async(
+            await request['loader'].connection(), body['username'],
+            body['email'])
+        if any(taken.values()):
+            raise APIError('User already exists', status=409)
         # Create a secret from the user's password that we can use to securely
         # verify their password when they log in
-        secret = util.hash_password(body['password'])
+        secret = await self.run_hasher(util.hash_password, body['password'],
+                                       self.server.config.bcrypt_cost)
         # Put the user in the DB
         try:
-            user.insert(session, body['full_name'], body['username'], secret,
-                        body['email'], body['bio'])
+            await self.run_blocking(user.insert, session, body['full_name'],
+                                    body['username'], secret, body['email'],
+                                    body['bio'])
         except IntegrityError:
             raise APIError('User already exists', status=409)
         return response.text('', status=201)
@@ -167,7 +210,8 @@ class UserImagesEndpoint(Endpoint):
             raise APIError('Invalid image name', status=400)
 
         # Make sure the user is updating an image they own
-        user_info = user.select_by_id(session, user_id)
+        user_info = await self.run_blocking(user.select_by_id, session,
+                                            user_id)
         if not user_info:
             raise APIError('No such image', status=404)
         if not user_info.identifier == id_from_token:
@@ -184,8 +228,9 @@ class UserImagesEndpoint(Endpoint):
         if len(image_upload.body) > IMAGE_SIZE_LIMIT:
             raise APIError('Image too large', status=400)
         try:
-            image.save(self.server.config.image_dir, EntityType.USER, user_id,
-                       image_name, image_upload.body)
+            await self.run_blocking(image.save, self.server.config.image_dir,
+                                    EntityType.USER, user_id, image_name,
+                                    image_upload.body)
         except FileExistsError:
             raise APIError('No such image', status=404)
 
@@ -198,13 +243,15 @@ class UserImagesEndpoint(Endpoint):
         if not util.check_image_name(image_name):
             raise APIError('Invalid image name', status=400)
         # Make sure the user is deleting their own image
-        user_info = user.select_by_id(session, user_id)
+        user_info = await self.run_blocking(user.select_by_id, session,
+                                            user_id)
         if not user_info:
             raise APIError('No such image', status=404)
         if not user_info.identifier == id_from_token:
             raise APIError('Forbidden', status=403)
         try:
-            image.delete(
+            await self.run_blocking(
+                image.delete,
                 self.server.config.image_dir,
                 EntityType.USER,
                 user_id,
@@ -221,7 +268,7 @@ class SearchUsersEndpoint(Endpoint):
     __uri__ = '/users/search'
 
     @validate(SearchUsersRequest, SearchUsersResponse)
-    async def get(self, session, request):
+    async def get(self, _session, request):
         """Handles a GET /club/search request by returning
         users that contain content from the query."""
 
@@ -244,6 +291,8 @@ class SearchUsersEndpoint(Endpoint):
             created_at = request.args['created at']
         # pylint: enable=too-many-locals
 
+        mode = SearchMode(request.args['mode'])
+        totals = Totals(request.args['totals'])
         page = int(request.args['page'])
 
         size = int(request.args['size'])
@@ -252,20 +301,79 @@ class SearchUsersEndpoint(Endpoint):
         if size < MIN_SIZE:
             raise APIError('size too low', status=400)
 
-        queried_users, result_count, total_pages = user.search(
-            session, full_name, email, identifier, username, created_at, page,
-            size)
-        if not queried_users:
-            # Failed to find users that match the query
-            raise APIError('No users match your query', status=404)
-        results = []
-        for result in queried_users.all():
-            results.append(result.to_dict())
+        # In cursor mode start at the given cursor, or the first page if
+        # there isn't one
+        cursor = util.query_param(
+            request, 'cursor',
+            '' if request.args['pagination'] == 'cursor' else None)
+
+        try:
+            async with self.server.db_connection as conn:
+                result = await user.search_async(
+                    conn,
+                    full_name=full_name,
+                    username=username,
+                    identifier=identifier,
+                    email=email,
+                    created_at=created_at,
+                    page=page,
+                    size=size,
+                    mode=mode,
+                    cursor=cursor,
+                    totals=totals)
+        except ValueError:
+            raise APIError('Invalid cursor', status=400)
+
         info = {
-            'results': results,
-            'result_count': result_count,
-            'page': page,
-            'total_pages': total_pages
+            'results': result.results,
+            'result_count': result.result_count,
         }
+        if cursor is None:
+            info['page'] = page
+            info['total_pages'] = result.total_pages
+        else:
+            info['next_cursor'] = result.next_cursor
+
+        return Payload(info, status=200)
+
+
+class SuggestUsersEndpoint(Endpoint):
+    """Handles requests to /users/suggest."""
+
+    __uri__ = '/users/suggest'
+
+    @validate(SuggestUsersRequest, SuggestUsersResponse)
+    async def get(self, _session, request):
+        """Handles a GET /users/suggest request by returning the usernames of
+        users whose usernames start with the given prefix. This doesn't query
+        the DB so it's fast enough to call on every keystroke."""
+        size = int(request.args['size'])
+        if size > MAX_SIZE:
+            raise APIError('size too high', status=400)
+        if size < MIN_SIZE:
+            raise APIError('size too low', status=400)
 
-        return response.json(info, status=200)
+        usernames = user.suggest(request.args['prefix'], size)
+        info = {'results': [{'username': username} for username in usernames]}
+        return Payload(info, status=200)
+
+
+class UserAvailabilityEndpoint(Endpoint):
+    """Handles requests to /users/available."""
+
+    __uri__ = '/users/available'
+
+    @validate(UserAvailabilityRequest, UserAvailabilityResponse)
+    async def get(self, _session, request):
+        """Handles a GET /users/available request by returning whether the
+        given username and email are free to sign up with. This is a hint
+        for the signup form: a name taken through another server process
+        since this one started can be reported as available, in which case
+        signing up with it still gets a 409."""
+        username = util.query_param(request, 'username')
+        email = util.query_param(request, 'email')
+        taken = await user.taken_async(await request['loader'].connection(),
+                                       username, email)
+        return Payload({field: not value
+                        for field, value in taken.items()},
+                       status=200)
@@ -2,11 +2,14 @@
 
 import hashlib
 import re
+import time
 from datetime import datetime, timedelta
 
 import bcrypt
 from jose import exceptions, jwt
 
+from ...cache import MISSING, TTLCache
+
 # Regexes for validating passwords and usernames
 # pylint: disable=anomalous-backslash-in-string
 UPPERCASE = re.compile('[A-Z]+')
@@ -24,9 +27,28 @@ MIN_PASSWORD_LENGTH = 8
 MIN_USERNAME_LENGTH = 3
 MAX_USERNAME_LENGTH = 20
 
+# The bcrypt cost (log2 of the number of rounds) new secrets are hashed with
+# by default, and the range bcrypt supports
+DEFAULT_BCRYPT_COST = 12
+MIN_BCRYPT_COST = 4
+MAX_BCRYPT_COST = 31
+
+# The password hashed when benchmarking bcrypt costs
+BENCHMARK_PASSWORD = 'Val1dPassword!'
+
 # The lifetime of an access token issued by the Bounce API
 TOKEN_LIFETIME = timedelta(days=30)
 
+# The number of validated tokens to cache and the longest a token is cached
+# for. Tokens are never cached past their expiry.
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 3600
+
+# Maps (secret, token) to the ID of the user a valid token was issued to, so
+# tokens presented again don't have to be decoded and verified
+TOKEN_CACHE = TTLCache(
+    'tokens', max_size=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
 
 def validate_password(password):
     """Returns True if the password meets password restrictions and False
@@ -78,13 +100,15 @@ def validate_username(username):
     return len(username) == 0
 
 
-def hash_password(password):
+def hash_password(password, cost=DEFAULT_BCRYPT_COST):
     """Returns a secret created by hashing the user's password with some salt.
     This secret is used to securely verify the user's password when they
     log in.
 
     Args:
         password (str): the user's password
+        cost (int): the bcrypt cost to hash with. Each increment doubles the
+            time hashing and checking the password takes.
     """
     # SHA256 hash the password so the result of a fixed length
     # (bcrypt only handles passwords up to 76 bytes in length).
@@ -92,7 +116,59 @@ def hash_password(password):
     # Combine the password with so that even if users have the
     # same password they won't have the same secret
     return bcrypt.hashpw(bytes(digest, 'utf-8'),
-                         bcrypt.gensalt()).decode('utf-8')
+                         bcrypt.gensalt(rounds=cost)).decode('utf-8')
+
+
+def secret_cost(hashed_pw):
+    """Returns the bcrypt cost the given secret was hashed with, or None if
+    it isn't a bcrypt secret.
+
+    Args:
+        hashed_pw (str): a secret returned by `hash_password`
+    """
+    # Secrets look like $2b$<cost>$<salt and hash>
+    parts = hashed_pw.split('$')
+    if len(parts) != 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def time_hash(cost, samples=3):
+    """Returns the fastest of the given number of times, in seconds, that
+    hashing a password with the given bcrypt cost took on this host."""
+    times = []
+    for _ in range(samples):
+        started_at = time.perf_counter()
+        hash_password(BENCHMARK_PASSWORD, cost)
+        times.append(time.perf_counter() - started_at)
+    return min(times)
+
+
+def benchmark_costs(budget, min_cost=MIN_BCRYPT_COST,
+                    max_cost=MAX_BCRYPT_COST, samples=3):
+    """Times hashing with each bcrypt cost from min_cost up, stopping after
+    the first that takes longer than the budget.
+
+    Args:
+        budget (float): the most seconds hashing (or checking) a password
+            should take
+        min_cost (int): the lowest cost to time
+        max_cost (int): the highest cost to time
+        samples (int): the number of times to hash with each cost
+
+    Returns:
+        tuple: a list of (cost, seconds) for each cost timed, and the highest
+            cost that fits the budget (or None if none do)
+    """
+    timings = []
+    recommended = None
+    for cost in range(min_cost, max_cost + 1):
+        seconds = time_hash(cost, samples)
+        timings.append((cost, seconds))
+        if seconds > budget:
+            break
+        recommended = cost
+    return timings, recommended
 
 
 def check_password(password, hashed_pw):
@@ -129,17 +205,25 @@ def create_jwt(user_id, secret):
 
 def check_jwt(token, secret):
     """Returns the ID of the user the token was issued to if the token is valid
-    and returns None is the token is not valid.
+    and returns None is the token is not valid. Valid tokens are cached in
+    TOKEN_CACHE until they expire.
 
     Args:
         token (str): the token to verify
         secret (str): the user's secret
     """
+    key = (secret, token)
+    user_id = TOKEN_CACHE.get(key)
+    if user_id is not MISSING:
+        return user_id
     try:
         payload = jwt.decode(token, secret, algorithms=['HS256'])
     except exceptions.JWTError:
         return None
-    return payload.get('id', None)
+    user_id = payload.get('id', None)
+    if user_id and isinstance(payload.get('exp'), (int, float)):
+        TOKEN_CACHE.put(key, user_id, ttl=payload['exp'] - time.time())
+    return user_id
 
 
 def strip_whitespace(obj):
@@ -159,3 +243,16 @@ def check_image_name(name):
     formatted name could cause us to send the user files we don't want to.
     """
     return re.fullmatch('[0-9a-zA-Z-]+', name)
+
+
+def query_param(request, name, default=None):
+    """
+    Returns the value of the query param with the given name, or the default
+    if the request doesn't have it. `validate` replaces the list of values
+    Sanic parses for each param with a single string, so handlers it wraps
+    can't use `request.args.get()`, which would return the string's first
+    character.
+    """
+    if name in request.args:
+        return request.args[name]
+    return default
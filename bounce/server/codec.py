@@ -0,0 +1,133 @@
+"""
+Defines the JSON codec request bodies are parsed and responses are written
+with. It uses the fastest JSON library installed unless configured to use a
+particular one.
+"""
+
+import json
+import math
+from datetime import datetime, timezone
+
+from sanic.response import HTTPResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# Picks the fastest installed library
+AUTO = 'auto'
+
+CONTENT_TYPE = 'application/json'
+
+
+def encode_datetime(value):
+    """Returns the given datetime as an integer number of seconds since the
+    epoch, which is how all our resources represent times. Naive datetimes
+    are assumed to be in UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return math.floor(value.timestamp())
+
+
+def _default(value):
+    """Converts values the JSON libraries don't handle themselves."""
+    if isinstance(value, datetime):
+        return encode_datetime(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _stdlib_dumps(value):
+    """Encodes the given value with the standard library's json module."""
+    return json.dumps(value, default=_default, separators=(',', ':')).encode()
+
+
+def _orjson_dumps(value):
+    """Encodes the given value with orjson."""
+    # orjson writes datetimes as strings unless told to pass them to default
+    return orjson.dumps(
+        value, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+def _ujson_dumps(value):
+    """Encodes the given value with ujson."""
+    return ujson.dumps(
+        value, escape_forward_slashes=False, **UJSON_OPTIONS).encode()
+
+
+# ujson 1.x (which Sanic depends on) writes datetimes as timestamps itself
+# and doesn't take a default function, while later versions need one
+UJSON_OPTIONS = {}
+if ujson is not None:
+    try:
+        ujson.dumps(None, default=_default)
+        UJSON_OPTIONS['default'] = _default
+    except TypeError:
+        pass
+
+
+# Maps the name of each installed library to the functions that encode a
+# value to bytes and decode bytes or a str, fastest first
+LIBRARIES = {}
+if orjson is not None:
+    LIBRARIES['orjson'] = (_orjson_dumps, orjson.loads)
+if ujson is not None:
+    LIBRARIES['ujson'] = (_ujson_dumps, ujson.loads)
+LIBRARIES['json'] = (_stdlib_dumps, json.loads)
+
+
+class JSONCodec:
+    """Encodes and decodes JSON with one of the installed LIBRARIES. Values
+    encoded with any of them decode to the same thing."""
+
+    def __init__(self, name=AUTO):
+        """Creates a new codec.
+
+        Args:
+            name (str): the library to use, or AUTO to use the fastest one
+        """
+        self.configure(name)
+
+    def configure(self, name=AUTO):
+        """Switches the codec to the library with the given name, or to the
+        fastest one if the name is AUTO.
+
+        Raises:
+            ValueError: the library isn't installed
+        """
+        if name == AUTO:
+            name = next(iter(LIBRARIES))
+        if name not in LIBRARIES:
+            raise ValueError(f'JSON library {name} is not installed')
+        self.name = name
+        self._dumps, self._loads = LIBRARIES[name]
+
+    def dumps(self, value):
+        """Returns the given value encoded as JSON bytes."""
+        return self._dumps(value)
+
+    def loads(self, data):
+        """Returns the value encoded in the given JSON bytes or string.
+
+        Raises:
+            ValueError: the data isn't valid JSON
+        """
+        return self._loads(data)
+
+    def response(self, body, status=200, headers=None):
+        """Returns a JSON response containing the given body. The body is
+        encoded straight to the bytes the response sends."""
+        return HTTPResponse(
+            status=status,
+            headers=headers,
+            content_type=CONTENT_TYPE,
+            body_bytes=self.dumps(body))
+
+
+# The codec shared by all servers in this process
+CODEC = JSONCodec()
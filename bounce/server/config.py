@@ -1,11 +1,29 @@
 """Configuration for the Bounce webserver."""
 
+from .. import cache, db
+from ..db import membership, querylog
+from . import codec, hasher, resource
+from .api import util
+from .executor import DEFAULT_EXECUTOR_SIZE
+
 
 class ServerConfig:
     """Stores configuration for the server."""
 
     def __init__(self, port, secret, pg_host, pg_port, pg_user, pg_password,
-                 pg_database, allowed_origin, image_dir):
+                 pg_database, allowed_origin, image_dir,
+                 executor_size=None, pg_pool_size=None,
+                 pg_max_overflow=None, pg_pool_timeout=None,
+                 pg_pool_recycle=None, pg_pool_pre_ping=None,
+                 pg_pool_prewarm=None,
+                 slow_query_ms=None, query_sample_rate=None,
+                 explain_slow_queries=False, search_cache_size=None,
+                 search_cache_ttl=None, role_cache_size=None,
+                 role_cache_ttl=None, hasher_size=None,
+                 hasher_queue_size=None, bcrypt_cost=None,
+                 response_validation_rate=None, json_codec=None):
+        # Each setting is a parameter
+        # pylint: disable=too-many-locals
         self._server_port = port
         self._secret = secret
         self._postgres_host = pg_host
@@ -15,6 +33,25 @@ class ServerConfig:
         self._postgres_db = pg_database
         self._allowed_origin = allowed_origin
         self._image_dir = image_dir
+        self._executor_size = executor_size
+        self._postgres_pool_size = pg_pool_size
+        self._postgres_max_overflow = pg_max_overflow
+        self._postgres_pool_timeout = pg_pool_timeout
+        self._postgres_pool_recycle = pg_pool_recycle
+        self._postgres_pool_pre_ping = pg_pool_pre_ping
+        self._postgres_pool_prewarm = pg_pool_prewarm
+        self._slow_query_ms = slow_query_ms
+        self._query_sample_rate = query_sample_rate
+        self._explain_slow_queries = explain_slow_queries
+        self._search_cache_size = search_cache_size
+        self._search_cache_ttl = search_cache_ttl
+        self._role_cache_size = role_cache_size
+        self._role_cache_ttl = role_cache_ttl
+        self._hasher_size = hasher_size
+        self._hasher_queue_size = hasher_queue_size
+        self._bcrypt_cost = bcrypt_cost
+        self._response_validation_rate = response_validation_rate
+        self._json_codec = json_codec
 
     # Expose attributes as properties so they can't be modified after
     # they've been set.
@@ -54,6 +91,101 @@ class ServerConfig:
         """Returns the name of our Postgres DB."""
         return self._postgres_db
 
+    @property
+    def postgres_pool_size(self):
+        """Returns the number of DB connections to keep open."""
+        if self._postgres_pool_size is None:
+            return db.POOL_SIZE
+        return int(self._postgres_pool_size)
+
+    @property
+    def postgres_max_overflow(self):
+        """Returns the number of DB connections that can be opened in addition
+        to the pool size under load."""
+        if self._postgres_max_overflow is None:
+            return db.MAX_OVERFLOW
+        return int(self._postgres_max_overflow)
+
+    @property
+    def postgres_pool_timeout(self):
+        """Returns the number of seconds to wait for a DB connection."""
+        if self._postgres_pool_timeout is None:
+            return db.POOL_TIMEOUT
+        return int(self._postgres_pool_timeout)
+
+    @property
+    def postgres_pool_recycle(self):
+        """Returns the number of seconds after which DB connections are
+        replaced."""
+        if self._postgres_pool_recycle is None:
+            return db.POOL_RECYCLE
+        return int(self._postgres_pool_recycle)
+
+    @property
+    def postgres_pool_pre_ping(self):
+        """Returns whether DB connections are tested before they're used."""
+        if self._postgres_pool_pre_ping is None:
+            return db.POOL_PRE_PING
+        return bool(self._postgres_pool_pre_ping)
+
+    @property
+    def postgres_pool_prewarm(self):
+        """Returns whether the pool size's worth of DB connections are opened
+        when the server starts."""
+        if self._postgres_pool_prewarm is None:
+            return db.POOL_PREWARM
+        return bool(self._postgres_pool_prewarm)
+
+    @property
+    def slow_query_ms(self):
+        """Returns the number of milliseconds after which a DB query is logged
+        as slow."""
+        if self._slow_query_ms is None:
+            return querylog.SLOW_QUERY_MS
+        return float(self._slow_query_ms)
+
+    @property
+    def query_sample_rate(self):
+        """Returns the fraction of DB queries that aren't slow to log."""
+        if self._query_sample_rate is None:
+            return querylog.SAMPLE_RATE
+        return float(self._query_sample_rate)
+
+    @property
+    def explain_slow_queries(self):
+        """Returns whether to log the query plans of slow DB queries."""
+        return bool(self._explain_slow_queries)
+
+    @property
+    def search_cache_size(self):
+        """Returns the maximum number of club and user searches to cache
+        results for."""
+        if self._search_cache_size is None:
+            return cache.DEFAULT_MAX_SIZE
+        return int(self._search_cache_size)
+
+    @property
+    def search_cache_ttl(self):
+        """Returns the number of seconds to cache search results for."""
+        if self._search_cache_ttl is None:
+            return cache.DEFAULT_TTL
+        return float(self._search_cache_ttl)
+
+    @property
+    def role_cache_size(self):
+        """Returns the maximum number of membership roles to cache for
+        authorization checks."""
+        if self._role_cache_size is None:
+            return membership.ROLE_CACHE_SIZE
+        return int(self._role_cache_size)
+
+    @property
+    def role_cache_ttl(self):
+        """Returns the number of seconds to cache membership roles for."""
+        if self._role_cache_ttl is None:
+            return membership.ROLE_CACHE_TTL
+        return float(self._role_cache_ttl)
+
     @property
     def allowed_origin(self):
         """Returns the name of the domain that is allowed to access data served
@@ -65,3 +197,47 @@ class ServerConfig:
     def image_dir(self):
         """Returns the path to the location images are stored at."""
         return self._image_dir
+
+    @property
+    def executor_size(self):
+        """Returns the number of threads to run blocking calls on."""
+        return int(self._executor_size or DEFAULT_EXECUTOR_SIZE)
+
+    @property
+    def hasher_size(self):
+        """Returns the number of processes to hash passwords on, or None to
+        use one per core."""
+        if self._hasher_size is None:
+            return None
+        return int(self._hasher_size)
+
+    @property
+    def hasher_queue_size(self):
+        """Returns the number of password hashing calls that can wait for a
+        process before requests are rejected."""
+        if self._hasher_queue_size is None:
+            return hasher.DEFAULT_QUEUE_SIZE
+        return int(self._hasher_queue_size)
+
+    @property
+    def bcrypt_cost(self):
+        """Returns the bcrypt cost to hash new passwords with. Secrets hashed
+        with a different cost are rehashed when their users log in."""
+        if self._bcrypt_cost is None:
+            return util.DEFAULT_BCRYPT_COST
+        return int(self._bcrypt_cost)
+
+    @property
+    def response_validation_rate(self):
+        """Returns the fraction (0 to 1) of response bodies to check against
+        their schemas. At 1 a response that doesn't match gets a 500;
+        otherwise mismatches are only logged."""
+        if self._response_validation_rate is None:
+            return resource.RESPONSE_VALIDATION_RATE
+        return float(self._response_validation_rate)
+
+    @property
+    def json_codec(self):
+        """Returns the name of the JSON library to parse requests and write
+        responses with, or 'auto' to use the fastest one installed."""
+        return self._json_codec or codec.AUTO
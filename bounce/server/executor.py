@@ -0,0 +1,65 @@
+"""
+Defines a bounded thread pool for running blocking code (DB session work,
+file I/O) without stalling the event loop. Passwords are hashed on a process
+pool instead (see hasher.py).
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ..metrics import REGISTRY
+
+# The default number of threads used to run blocking calls
+DEFAULT_EXECUTOR_SIZE = 8
+
+QUEUE_DEPTH = REGISTRY.gauge(
+    'executor.queue_depth',
+    'blocking calls waiting for a free executor thread')
+WAIT_TIME = REGISTRY.timer(
+    'executor.wait_time', 'time blocking calls spend waiting for a thread')
+RUN_TIME = REGISTRY.timer('executor.run_time',
+                          'time blocking calls spend running on a thread')
+
+
+class BlockingExecutor:
+    """Runs blocking functions on a fixed number of threads and records how
+    long they wait and run for."""
+
+    def __init__(self, size=DEFAULT_EXECUTOR_SIZE):
+        """Creates a new executor.
+
+        Args:
+            size (int): the maximum number of threads to run calls on
+        """
+        self._size = size
+        self._pool = ThreadPoolExecutor(max_workers=size)
+
+    @property
+    def size(self):
+        """Returns the number of threads in this executor."""
+        return self._size
+
+    async def run(self, func, *args, **kwargs):
+        """Runs the given function with the given arguments on one of the
+        executor's threads and returns its result once it completes.
+        Exceptions raised by the function are re-raised here.
+        """
+        queued_at = time.monotonic()
+        QUEUE_DEPTH.inc()
+
+        def call():
+            started_at = time.monotonic()
+            QUEUE_DEPTH.dec()
+            WAIT_TIME.observe(started_at - queued_at)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                RUN_TIME.observe(time.monotonic() - started_at)
+
+        return await asyncio.get_event_loop().run_in_executor(
+            self._pool, call)
+
+    def shutdown(self):
+        """Waits for running calls to complete and stops all threads."""
+        self._pool.shutdown(wait=True)
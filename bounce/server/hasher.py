@@ -0,0 +1,113 @@
+"""
+Defines a process pool for hashing and checking passwords. bcrypt is
+deliberately slow and CPU bound, so it runs in other processes where it can't
+stall the event loop or compete with other blocking work for the GIL.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ..metrics import REGISTRY
+
+# The default number of calls that can wait for a free process before new
+# calls are rejected
+DEFAULT_QUEUE_SIZE = 32
+# The number of seconds clients are asked to wait before retrying a rejected
+# request
+RETRY_AFTER = 1
+
+QUEUE_DEPTH = REGISTRY.gauge('hasher.queue_depth',
+                             'password hashing calls waiting for a process')
+LATENCY = REGISTRY.timer(
+    'hasher.latency', 'time from submitting a password hashing call to its '
+    'result, including time spent waiting')
+REJECTED = REGISTRY.counter(
+    'hasher.rejected',
+    'password hashing calls rejected because the queue was full')
+
+
+class HasherBusy(Exception):
+    """Raised when a call is submitted to a PasswordHasher whose queue is
+    full."""
+
+
+def default_size():
+    """Returns the default number of hashing processes: one per core."""
+    return os.cpu_count() or 1
+
+
+class PasswordHasher:
+    """
+    Runs password hashing functions on a pool of processes, rejecting calls
+    once a bounded number are waiting rather than letting a burst of logins
+    queue up behind each other. The pool is started on first use.
+
+    Calls must be submitted from the event loop.
+    """
+
+    def __init__(self, size=None, queue_size=DEFAULT_QUEUE_SIZE):
+        """Creates a new hasher.
+
+        Args:
+            size (int): the number of processes to run calls on, or None to
+                use one per core
+            queue_size (int): the maximum number of calls that can wait for a
+                free process
+        """
+        self._pool = None
+        self._pending = 0
+        self.configure(size, queue_size)
+        QUEUE_DEPTH.set_function(self.queue_depth)
+
+    def configure(self, size=None, queue_size=DEFAULT_QUEUE_SIZE):
+        """Updates the hasher's number of processes and queue size. The pool
+        is restarted if its size changes."""
+        size = size or default_size()
+        if self._pool is not None and size != self._size:
+            self.shutdown()
+        self._size = size
+        self.queue_size = queue_size
+
+    @property
+    def size(self):
+        """Returns the number of processes in this hasher."""
+        return self._size
+
+    def queue_depth(self):
+        """Returns the number of calls waiting for a free process."""
+        return max(self._pending - self._size, 0)
+
+    async def run(self, func, *args):
+        """Runs the given module-level function with the given (picklable)
+        arguments in one of the hasher's processes and returns its result.
+
+        Raises:
+            HasherBusy: the queue is full
+        """
+        if self._pending >= self._size + self.queue_size:
+            REJECTED.inc()
+            raise HasherBusy('Too many password hashing calls are waiting')
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self._size)
+
+        started_at = time.monotonic()
+        self._pending += 1
+        try:
+            return await asyncio.get_event_loop().run_in_executor(
+                self._pool, func, *args)
+        finally:
+            self._pending -= 1
+            LATENCY.observe(time.monotonic() - started_at)
+
+    def shutdown(self):
+        """Stops the hasher's processes once running calls complete. The
+        pool is started again if the hasher is used afterwards."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+# The hasher shared by all servers in this process
+HASHER = PasswordHasher()
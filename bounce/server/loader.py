@@ -0,0 +1,109 @@
+"""
+Defines a per-request loader that memoizes and batches the club and
+membership lookups request handlers make.
+"""
+
+from ..db import club, membership
+
+
+class DataLoader:
+    """
+    Loads clubs and memberships for a single request. Every lookup is
+    remembered so a handler never repeats one, and all of them share one
+    connection from the server's async pool, which is acquired on first use
+    and released when the request completes.
+
+    Lookups are not refreshed after the request writes to the DB.
+    """
+
+    def __init__(self, server):
+        """Creates a new loader.
+
+        Args:
+            server (Server): the server whose connection pool to use
+        """
+        self._server = server
+        self._acquire = None
+        self._conn = None
+        self._clubs = {}
+        self._clubs_by_id = {}
+        self._club_ids = {}
+        self._memberships = {}
+
+    async def connection(self):
+        """Returns the asyncpg connection this loader uses, acquiring it if
+        necessary. Handlers can run their own queries on it too."""
+        if self._conn is None:
+            acquire = self._server.db_connection
+            self._conn = await acquire.__aenter__()
+            self._acquire = acquire
+        return self._conn
+
+    async def close(self):
+        """Releases the loader's connection if it acquired one."""
+        if self._conn is not None:
+            acquire = self._acquire
+            self._conn = self._acquire = None
+            await acquire.__aexit__(None, None, None)
+
+    async def club(self, name):
+        """Returns the club with the given name, or None if there is no such
+        club."""
+        if name not in self._clubs:
+            self._clubs[name] = await club.select_async(
+                await self.connection(), name)
+        return self._clubs[name]
+
+    async def club_by_id(self, club_id):
+        """Returns the club with the given ID, or None if there is no such
+        club."""
+        if club_id not in self._clubs_by_id:
+            self._clubs_by_id[club_id] = await club.select_by_id_async(
+                await self.connection(), club_id)
+        return self._clubs_by_id[club_id]
+
+    async def club_id(self, name):
+        """Returns the ID of the club with the given name, or None if there
+        is no such club. IDs are also cached across requests."""
+        if name not in self._club_ids:
+            self._club_ids[name] = await club.select_id_async(
+                await self.connection(), name)
+        return self._club_ids[name]
+
+    async def memberships(self, club_id, user_ids):
+        """Returns a mapping from each of the given user IDs to the user's
+        membership in the club with the given ID, or None if they aren't a
+        member. Memberships that haven't been loaded yet are fetched in one
+        query.
+        """
+        missing = {
+            user_id
+            for user_id in user_ids
+            if (club_id, user_id) not in self._memberships
+        }
+        if missing:
+            rows = await membership.select_many_async(
+                await self.connection(), club_id, list(missing), None)
+            found = {row['user_id']: row for row in rows}
+            for user_id in missing:
+                self._memberships[club_id, user_id] = found.get(user_id)
+        return {
+            user_id: self._memberships[club_id, user_id]
+            for user_id in user_ids
+        }
+
+    async def role(self, club_id, user_id):
+        """Returns the given user's role in the club with the given ID, or
+        None if they aren't a member. Roles are also cached across requests
+        for authorization checks."""
+        if (club_id, user_id) in self._memberships:
+            row = self._memberships[club_id, user_id]
+            return row['role'] if row else None
+        return await membership.select_role_async(await self.connection(),
+                                                  club_id, user_id)
+
+    async def membership(self, club_id, user_id):
+        """Returns the given user's membership in the club with the given ID,
+        or None if they aren't a member."""
+        memberships = await self.memberships(club_id, [user_id])
+        return memberships[user_id]
@@ -3,17 +3,35 @@ Defines a base Resource class that allows easy endpoint and HTTP request
 handler definition and registration.
 """
 
-import json
 import logging
+import random
+from datetime import datetime
 from functools import wraps
 
 import jsonschema
 from jsonschema.validators import Draft4Validator
-from sanic import response
+
+from ...metrics import REGISTRY
+from ..codec import CODEC, encode_datetime
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
+# The default fraction of responses to validate against their schemas
+RESPONSE_VALIDATION_RATE = 1.0
+
+# A step in a defaults plan path that means every item of an array
+EACH = object()
+
+# The format checker shared by every resource's validators
+FORMAT_CHECKER = jsonschema.FormatChecker()
+
+VALIDATED = REGISTRY.counter('responses.validated',
+                             'response bodies checked against their schemas')
+DRIFTED = REGISTRY.counter(
+    'responses.schema_drift',
+    'response bodies that did not match their schemas')
+
 
 class ResourceMeta(type):
     """
@@ -28,7 +46,11 @@ class ResourceMeta(type):
         subclasses.
 
         This will validate the body and params schemas declared on a resource
-        and raise a ValidationError if the schema is invalid.
+        and raise a ValidationError if the schema is invalid. Validators for
+        valid schemas are compiled once here and stored on the class as
+        `__body_validator__` and `__params_validator__` so requests don't
+        pay to build them, along with the defaults each schema declares as
+        `__body_defaults__` and `__params_defaults__`.
 
         Args:
             mcs (type): the metaclass
@@ -37,32 +59,159 @@ class ResourceMeta(type):
             values (dict): a mapping from attribute name to attribute
                 value on the new class
         """
-        if hasattr(values, '__body__'):
-            # Check that the body schema is valid
-            try:
-                Draft4Validator.check_schema(values['__body__'])
-            except jsonschema.ValidationError:
-                raise jsonschema.ValidationError(
-                    f'Invalid body schema declared for resource {cls_name}')
-
-        if hasattr(values, '__params__'):
-            # Check that the params schema is valid
-            try:
-                Draft4Validator.check_schema(values['__params__'])
-            except jsonschema.ValidationError:
-                raise jsonschema.ValidationError(
-                    f'Invalid params schema declared for resource {cls_name}')
+        if '__body__' in values:
+            values['__body_validator__'] = _compile(values['__body__'],
+                                                    'body', cls_name)
+            values['__body_defaults__'] = _compile_defaults(
+                values['__body__'])
+
+        if '__params__' in values:
+            values['__params_validator__'] = _compile(values['__params__'],
+                                                      'params', cls_name)
+            values['__params_defaults__'] = _compile_defaults(
+                values['__params__'])
 
         # Create the class
         return super(ResourceMeta, mcs).__new__(mcs, cls_name, superclasses,
                                                 values)
 
 
+def _compile(schema, kind, cls_name):
+    """Checks the given schema and returns a validator for it.
+
+    Args:
+        schema (dict): the schema to compile
+        kind (str): what the schema describes, e.g. 'body'
+        cls_name (str): the name of the resource the schema belongs to
+
+    Raises:
+        ValidationError: the schema is invalid
+    """
+    try:
+        Draft4Validator.check_schema(schema)
+    except jsonschema.SchemaError:
+        raise jsonschema.ValidationError(
+            f'Invalid {kind} schema declared for resource {cls_name}')
+    return Draft4Validator(schema, format_checker=FORMAT_CHECKER)
+
+
+def _compile_defaults(schema, path=()):
+    """Returns a plan for filling in the defaults the given schema declares
+    in values that match it: a list of (path, key, default) tuples meaning
+    that `key` should be set to `default` in the object at `path` if it's
+    missing or empty. Each path is a tuple of the keys leading to the object
+    from the root, with EACH standing for every item of an array.
+
+    Schemas that declare no defaults, like most response schemas, compile to
+    an empty plan so filling in their defaults costs nothing.
+    """
+    plan = []
+    if schema.get('type') == 'array' and isinstance(
+            schema.get('items'), dict):
+        plan.extend(_compile_defaults(schema['items'], path + (EACH, )))
+    for key, sub_schema in schema.get('properties', {}).items():
+        if 'default' in sub_schema:
+            plan.append((path, key, sub_schema['default']))
+        plan.extend(_compile_defaults(sub_schema, path + (key, )))
+    return plan
+
+
+def _targets(value, path):
+    """Yields the values at the given defaults plan path in the given
+    value."""
+    if not path:
+        yield value
+    elif path[0] is EACH:
+        if isinstance(value, list):
+            for item in value:
+                yield from _targets(item, path[1:])
+    elif isinstance(value, dict) and path[0] in value:
+        yield from _targets(value[path[0]], path[1:])
+
+
+def apply_defaults(plan, info):
+    """Fills in the defaults in the given plan (see `_compile_defaults`) on
+    the given value and returns it."""
+    for path, key, default in plan:
+        for target in _targets(info, path):
+            # Empty values (e.g. a query parameter with nothing after the
+            # '=') are replaced too
+            if isinstance(target, dict) and not target.get(key):
+                target[key] = default
+    return info
+
+
+def as_sent(value):
+    """Returns a copy of the given response body with its datetimes replaced
+    by the integer timestamps the codec writes for them, so that it can be
+    validated as clients will receive it."""
+    if isinstance(value, datetime):
+        return encode_datetime(value)
+    if isinstance(value, dict):
+        return {key: as_sent(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [as_sent(item) for item in value]
+    return value
+
+
+def check_sample(response_cls, body, rate):
+    """Validates the given response body against the resource's schema with
+    the given probability (see `validate`), counting and logging bodies that
+    don't match it.
+
+    Returns:
+        the ValidationError for a body that was checked and doesn't match
+        the schema, otherwise None
+    """
+    if rate < 1 and random.random() >= rate:
+        return None
+    VALIDATED.inc()
+    try:
+        response_cls.__body_validator__.validate(as_sent(body))
+    except jsonschema.ValidationError as err:
+        DRIFTED.inc()
+        logger.exception('response body does not fit schema for resource %s',
+                         response_cls.__name__)
+        return err
+    return None
+
+
+class Payload:
+    """
+    A response body that hasn't been serialized yet. Handlers wrapped with
+    `validate` return one of these rather than a JSON response so that
+    defaults can be filled in and the body checked before it is serialized.
+    """
+
+    def __init__(self, body, status=200, headers=None):
+        """Creates a new payload.
+
+        Args:
+            body: the JSON-serializable response body
+            status (int): the HTTP status code to return
+            headers (dict): extra headers to return
+        """
+        self.body = body
+        self.status = status
+        self.headers = headers or {}
+
+    def to_response(self):
+        """Returns a JSON response containing this payload."""
+        return CODEC.response(
+            self.body, status=self.status, headers=self.headers)
+
+
 def validate(request_cls, response_cls):
     """
     Wraps a request handler in a JSONSchema validator to ensure that the
     request and response bodies match their respective schemas.
 
+    The handler returns a Payload (or an already built response, which is
+    passed through untouched). A fraction of payloads set by the server's
+    `response_validation_rate` config are validated. When every payload is
+    validated, as in tests, one that doesn't match its schema gets a 500;
+    otherwise the mismatch is logged and the payload is returned anyway.
+
     Args:
         request_cls (object): the class containing the schema the request
             body should match
@@ -70,47 +219,6 @@ def validate(request_cls, response_cls):
             body should match
     """
 
-    def set_defaults(schema, info, parent_key=None, parent_schema=None):
-        """Sets the default values for params and bodies"""
-        for key in schema:
-            value = schema[key]
-            # base case used for recursion
-            if key == 'default':
-                # need to make sure the key is in the schema,
-                # else we'd be putting in keys
-                # that are not valid properties
-                if parent_key in parent_schema:
-                    # if the key is not specified or there's
-                    # an empty string value for the key,
-                    # update info with the default value
-                    if parent_key not in info or not info[parent_key]:
-                        info[parent_key] = value
-            # recurse if there's more keys at the next level of the schema
-            if isinstance(value, dict) and key != 'items':
-                sub_schema = value
-                parent_key = key
-                set_defaults(sub_schema, info, parent_key, schema)
-            # if value is an array, then update each item in the array
-            # using the json schema
-            if value == 'array':
-                sub_schema = schema['items']['properties']
-                # get the items in the array
-                if parent_key:
-                    items = info[parent_key]
-                    for item in items:
-                        item = set_defaults(sub_schema, item, parent_key,
-                                            sub_schema)
-                    # add updated items to info
-                    info[parent_key] = items
-                else:
-                    items = info
-                    for item in items:
-                        item = set_defaults(sub_schema, item, parent_key,
-                                            sub_schema)
-                    # add updated items to info
-                    info = items
-        return info
-
     # pylint: disable=missing-docstring
     def decorator(coro):
         @wraps(coro)
@@ -120,17 +228,21 @@ def validate(request_cls, response_cls):
                 # required schema
                 # Body values come as arrays of length 1 so turn
                 # them into single values
-                set_defaults(request_cls.__body__, request.json)
+                if request.parsed_json is None and request.body:
+                    try:
+                        request.parsed_json = CODEC.loads(request.body)
+                    except ValueError:
+                        return CODEC.response(
+                            {'error': 'Invalid JSON body'}, status=400)
+                apply_defaults(request_cls.__body_defaults__, request.json)
                 try:
-                    jsonschema.validate(
-                        request.json or {},
-                        request_cls.__body__,
-                        format_checker=jsonschema.FormatChecker())
+                    request_cls.__body_validator__.validate(request.json or {})
                 except jsonschema.ValidationError as err:
                     logger.exception(
                         'request body does not fit schema for resource %s',
                         request_cls.__name__)
-                    return response.json({'error': err}, status=400)
+                    return CODEC.response({'error': err.message},
+                                          status=400)
 
             if hasattr(request_cls, '__params__'):
                 # Return a 400 if the request params do not meet the
@@ -139,40 +251,32 @@ def validate(request_cls, response_cls):
                 # them into single values
                 for key in request.args:
                     request.args[key] = request.args.get(key)
-                set_defaults(request_cls.__params__, request.args)
+                apply_defaults(request_cls.__params_defaults__, request.args)
                 try:
-                    jsonschema.validate(
-                        request.args,
-                        request_cls.__params__,
-                        format_checker=jsonschema.FormatChecker())
+                    request_cls.__params_validator__.validate(request.args)
                 except jsonschema.ValidationError as err:
                     logger.exception(
                         'request params do not fit schema for resource %s',
                         request_cls.__name__)
-                    return response.json({'error': err}, status=400)
+                    return CODEC.response({'error': err.message},
+                                          status=400)
 
             # Call the request handler
             result = await coro(endpoint, session, request, *args, **kwargs)
+            # Responses the handler built itself (e.g. streamed ones) can't
+            # be validated here
+            if not isinstance(result, Payload):
+                return result
 
             if hasattr(response_cls, '__body__'):
-                # Return a 500 if the response does not meet the required
-                # format and raise an error
-                body_no_defaults = json.loads(result.body)
-                body = set_defaults(response_cls.__body__, body_no_defaults)
-                # TODO: is this the right type of encoding
-                result.body = bytes(json.dumps(body), 'utf-8')
-                try:
-                    jsonschema.validate(
-                        body,
-                        response_cls.__body__,
-                        format_checker=jsonschema.FormatChecker())
-                except jsonschema.ValidationError as err:
-                    logger.exception(
-                        'response body does not fit schema for resource %s',
-                        response_cls.__name__)
-                    return response.json({'error': err}, status=500)
+                body = apply_defaults(response_cls.__body_defaults__,
+                                      result.body)
+                rate = endpoint.server.config.response_validation_rate
+                err = check_sample(response_cls, body, rate)
+                if err is not None and rate >= 1:
+                    return CODEC.response({'error': err.message}, status=500)
 
-            return result
+            return result.to_response()
 
         return wrapper
 
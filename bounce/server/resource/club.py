@@ -113,6 +113,21 @@ class SearchClubsRequest(metaclass=ResourceMeta):
             'description': {
                 'type': 'string',
             },
+            'mode': {
+                'enum': ['fulltext', 'substring'],
+                'default': 'fulltext',
+            },
+            'pagination': {
+                'enum': ['page', 'cursor'],
+                'default': 'page',
+            },
+            'cursor': {
+                'type': 'string',
+            },
+            'totals': {
+                'enum': ['exact', 'estimate', 'none'],
+                'default': 'exact',
+            },
             'page': {
                 'type': 'string',
                 'default': '0',
@@ -128,57 +143,107 @@ class SearchClubsRequest(metaclass=ResourceMeta):
 class SearchClubsResponse(metaclass=ResourceMeta):
     """Defines the schema for a search query response."""
     __body__ = {
-        'results': {
-            'type': 'array',
-            'items': {
-                'type':
-                'object',
-                'required': [
-                    'name', 'description', 'website_url', 'facebook_url',
-                    'instagram_url', 'twitter_url', 'id', 'created_at'
-                ],
-                'additionalProperties':
-                False,
-                'properties': {
-                    'name': {
-                        'type': 'string',
-                    },
-                    'description': {
-                        'type': 'string',
-                    },
-                    'website_url': {
-                        'type': 'string',
-                    },
-                    'facebook_url': {
-                        'type': 'string',
-                    },
-                    'instagram_url': {
-                        'type': 'string',
-                    },
-                    'twitter_url': {
-                        'type': 'string',
-                    },
-                    'id': {
-                        'type': 'integer',
-                        'minimum': 0,
-                    },
-                    'created_at': {
-                        'type': 'integer',
-                    },
+        'type': 'object',
+        'required': ['results', 'result_count'],
+        'additionalProperties': False,
+        'properties': {
+            'results': {
+                'type': 'array',
+                'items': {
+                    'type':
+                    'object',
+                    'required': [
+                        'name', 'description', 'website_url', 'facebook_url',
+                        'instagram_url', 'twitter_url', 'id', 'created_at'
+                    ],
+                    'additionalProperties':
+                    False,
+                    'properties': {
+                        'name': {
+                            'type': 'string',
+                        },
+                        'description': {
+                            'type': 'string',
+                        },
+                        'website_url': {
+                            'type': 'string',
+                        },
+                        'facebook_url': {
+                            'type': 'string',
+                        },
+                        'instagram_url': {
+                            'type': 'string',
+                        },
+                        'twitter_url': {
+                            'type': 'string',
+                        },
+                        'id': {
+                            'type': 'integer',
+                            'minimum': 0,
+                        },
+                        'created_at': {
+                            'type': 'integer',
+                        },
+                    }
+                }
+            },
+            'result_count': {
+                'type': ['integer', 'null'],
+                'minimum': 0,
+            },
+            'page': {
+                'type': 'integer',
+                'minimum': 0,
+            },
+            'total_pages': {
+                'type': ['integer', 'null'],
+                'minimum': 0,
+            },
+            'next_cursor': {
+                'type': ['string', 'null'],
+            },
+        }
+    }
+
+
+class SuggestClubsRequest(metaclass=ResourceMeta):
+    """Defines the schema for a GET /clubs/suggest request."""
+    __params__ = {
+        'type': 'object',
+        'required': ['prefix'],
+        'properties': {
+            'prefix': {
+                'type': 'string',
+                'minLength': 1,
+            },
+            'size': {
+                'type': 'string',
+                'default': '10',
+            }
+        }
+    }
+
+
+class SuggestClubsResponse(metaclass=ResourceMeta):
+    """Defines the schema for a GET /clubs/suggest response."""
+    __body__ = {
+        'type': 'object',
+        'required': ['results'],
+        'additionalProperties': False,
+        'properties': {
+            'results': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'required': ['name'],
+                    'additionalProperties': False,
+                    'properties': {
+                        'name': {
+                            'type': 'string',
+                        },
+                    }
                 }
             }
-        },
-        'resultCount': {
-            'type': 'integer',
-            'minimum': 0,
-        },
-        'page': {
-            'type': 'integer',
-            'minimum': 0,
-        },
-        'totalPages': {
-            'type': 'integer',
-            'minimum': 0,
         }
     }
 
@@ -12,7 +12,18 @@ class GetMembershipsRequest(metaclass=ResourceMeta):
             'user_id': {
                 'type': 'string',
                 'minimum': 0,
-            }
+            },
+            'limit': {
+                'type': 'string',
+                'pattern': '^[0-9]+$',
+            },
+            'cursor': {
+                'type': 'string',
+            },
+            'format': {
+                'enum': ['json', 'ndjson'],
+                'default': 'json',
+            },
         }
     }
 
@@ -95,3 +106,55 @@ class DeleteMembershipRequest(metaclass=ResourceMeta):
             },
         }
     }
+
+
+class ImportMembershipsResponse(metaclass=ResourceMeta):
+    """Defines the schema for a POST /memberships/<club_name>/import
+    response."""
+    __body__ = {
+        'type': 'object',
+        'required': ['imported', 'failures'],
+        'properties': {
+            'imported': {
+                'type': 'integer',
+            },
+            'failures': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'required': ['row', 'error'],
+                    'properties': {
+                        'row': {
+                            'type': 'integer',
+                        },
+                        'error': {
+                            'type': 'string',
+                        },
+                    }
+                }
+            },
+        }
+    }
+
+
+class GetUserMembershipsResponse(metaclass=ResourceMeta):
+    """Defines the schema for a GET /users/<username>/memberships
+    response."""
+    __body__ = {
+        'type': 'array',
+        'items': {
+            'type': 'object',
+            'required': ['club_id', 'name', 'role'],
+            'properties': {
+                'club_id': {
+                    'type': 'integer',
+                },
+                'name': {
+                    'type': 'string',
+                },
+                'role': {
+                    'enum': ['President', 'Admin', 'Member']
+                },
+            }
+        }
+    }
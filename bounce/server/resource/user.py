@@ -108,6 +108,21 @@ class SearchUsersRequest(metaclass=ResourceMeta):
             'created_at': {
                 'type': 'string',
             },
+            'mode': {
+                'enum': ['fulltext', 'substring'],
+                'default': 'fulltext',
+            },
+            'pagination': {
+                'enum': ['page', 'cursor'],
+                'default': 'page',
+            },
+            'cursor': {
+                'type': 'string',
+            },
+            'totals': {
+                'enum': ['exact', 'estimate', 'none'],
+                'default': 'exact',
+            },
             'page': {
                 'type': 'string',
                 'default': '0',
@@ -123,49 +138,136 @@ class SearchUsersRequest(metaclass=ResourceMeta):
 class SearchUsersResponse(metaclass=ResourceMeta):
     """Defines the schema for a search query response."""
     __body__ = {
-        'results': {
-            'type': 'array',
-            'items': {
-                'type':
-                'object',
-                'required':
-                ['full_name', 'username', 'email', 'id', 'created_at', 'bio'],
-                'additionalProperties':
-                False,
-                'properties': {
-                    'full_name': {
-                        'type': 'string'
-                    },
-                    'username': {
-                        'type': 'string',
-                    },
-                    'email': {
-                        'type': 'string',
-                        'format': 'email',
-                    },
-                    'id': {
-                        'type': 'integer',
-                        'minimum': 0,
-                    },
-                    'created_at': {
-                        'type': 'integer',
-                    },
-                    'bio': {
-                        'type': 'string',
+        'type': 'object',
+        'required': ['results', 'result_count'],
+        'additionalProperties': False,
+        'properties': {
+            'results': {
+                'type': 'array',
+                'items': {
+                    'type':
+                    'object',
+                    'required': [
+                        'full_name', 'username', 'email', 'id', 'created_at',
+                        'bio'
+                    ],
+                    'additionalProperties':
+                    False,
+                    'properties': {
+                        'full_name': {
+                            'type': 'string'
+                        },
+                        'username': {
+                            'type': 'string',
+                        },
+                        'email': {
+                            'type': 'string',
+                            'format': 'email',
+                        },
+                        'id': {
+                            'type': 'integer',
+                            'minimum': 0,
+                        },
+                        'created_at': {
+                            'type': 'integer',
+                        },
+                        'bio': {
+                            'type': 'string',
+                        }
+                    }
+                }
+            },
+            'result_count': {
+                'type': ['integer', 'null'],
+                'minimum': 0,
+            },
+            'page': {
+                'type': 'integer',
+                'minimum': 0,
+            },
+            'total_pages': {
+                'type': ['integer', 'null'],
+                'minimum': 0,
+            },
+            'next_cursor': {
+                'type': ['string', 'null'],
+            },
+        }
+    }
+
+
+class SuggestUsersRequest(metaclass=ResourceMeta):
+    """Defines the schema for a GET /users/suggest request."""
+    __params__ = {
+        'type': 'object',
+        'required': ['prefix'],
+        'properties': {
+            'prefix': {
+                'type': 'string',
+                'minLength': 1,
+            },
+            'size': {
+                'type': 'string',
+                'default': '10',
+            }
+        }
+    }
+
+
+class SuggestUsersResponse(metaclass=ResourceMeta):
+    """Defines the schema for a GET /users/suggest response."""
+    __body__ = {
+        'type': 'object',
+        'required': ['results'],
+        'additionalProperties': False,
+        'properties': {
+            'results': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'required': ['username'],
+                    'additionalProperties': False,
+                    'properties': {
+                        'username': {
+                            'type': 'string',
+                        },
                     }
                 }
             }
-        },
-        'resultCount': {
-            'type': 'integer',
-            'minimum': 0,
-        },
-        'page': {
-            'type': 'integer',
-            'minimum': 0,
-        },
-        'totalPages': {
-            'type': 'integer',
-            'minimum': 0,
+        }
+    }
+
+
+class UserAvailabilityRequest(metaclass=ResourceMeta):
+    """Defines the schema for a GET /users/available request."""
+    __params__ = {
+        'type': 'object',
+        'additionalProperties': False,
+        'minProperties': 1,
+        'properties': {
+            'username': {
+                'type': 'string',
+                'minLength': 1,
+            },
+            'email': {
+                'type': 'string',
+                'minLength': 1,
+            },
+        }
+    }
+
+
+class UserAvailabilityResponse(metaclass=ResourceMeta):
+    """Defines the schema for a GET /users/available response."""
+    __body__ = {
+        'type': 'object',
+        'additionalProperties': False,
+        'properties': {
+            'username': {
+                'type': 'boolean',
+            },
+            'email': {
+                'type': 'boolean',
+            },
         }
     }
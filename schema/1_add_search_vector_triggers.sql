@@ -0,0 +1,40 @@
+-- Populates the clubs and users search vectors, keeps them up to date with
+-- triggers, and indexes them for full-text search.
+
+CREATE OR REPLACE FUNCTION clubs_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS clubs_search_vector_update ON clubs;
+CREATE TRIGGER clubs_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, description ON clubs
+    FOR EACH ROW EXECUTE PROCEDURE clubs_search_vector_update();
+
+CREATE OR REPLACE FUNCTION users_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.full_name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.username, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.bio, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_search_vector_update ON users;
+CREATE TRIGGER users_search_vector_update
+    BEFORE INSERT OR UPDATE OF full_name, username, bio ON users
+    FOR EACH ROW EXECUTE PROCEDURE users_search_vector_update();
+
+-- Backfill existing rows (this fires the triggers above)
+UPDATE clubs SET name = name;
+UPDATE users SET full_name = full_name;
+
+CREATE INDEX IF NOT EXISTS clubs_search_vector_idx
+    ON clubs USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS users_search_vector_idx
+    ON users USING GIN (search_vector);
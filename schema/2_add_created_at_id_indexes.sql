@@ -0,0 +1,5 @@
+-- Indexes clubs and users in (created_at, id) order so keyset (cursor)
+-- pagination through search results doesn't have to sort the whole table.
+
+CREATE INDEX IF NOT EXISTS clubs_created_at_id_idx ON clubs (created_at, id);
+CREATE INDEX IF NOT EXISTS users_created_at_id_idx ON users (created_at, id);
@@ -0,0 +1,15 @@
+-- Adds trigram indexes so substring searches (ILIKE '%...%') on club names
+-- and descriptions and user names and emails don't scan the whole table.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS clubs_name_trgm_idx ON clubs
+    USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS clubs_description_trgm_idx ON clubs
+    USING GIN (description gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS users_username_trgm_idx ON users
+    USING GIN (username gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS users_full_name_trgm_idx ON users
+    USING GIN (full_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS users_email_trgm_idx ON users
+    USING GIN (email gin_trgm_ops);
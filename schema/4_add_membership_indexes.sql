@@ -0,0 +1,8 @@
+-- Indexes memberships by club and role, so listing a club's memberships and
+-- deleting all but its Presidents don't scan the table, and by user with the
+-- columns needed to list a user's clubs and roles from the index alone.
+
+CREATE INDEX IF NOT EXISTS memberships_club_id_role_idx
+    ON memberships (club_id, role);
+CREATE INDEX IF NOT EXISTS memberships_user_id_club_id_role_idx
+    ON memberships (user_id, club_id, role);
@@ -1,3 +1,6 @@
+-- Provides trigram indexes for substring (ILIKE '%...%') search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 CREATE TYPE member_role AS ENUM ('President', 'Admin', 'Member');
 
 DROP TABLE IF EXISTS clubs CASCADE;
@@ -33,4 +36,58 @@ CREATE TABLE memberships (
     role member_role NOT NULL, 
     PRIMARY KEY (user_id, club_id),
     created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT (now() at time zone 'utc')
-);
\ No newline at end of file
+);
+
+-- Keep the search vectors used for full-text search up to date. Names are
+-- weighted above descriptions and bios so they rank higher in results.
+CREATE OR REPLACE FUNCTION clubs_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER clubs_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, description ON clubs
+    FOR EACH ROW EXECUTE PROCEDURE clubs_search_vector_update();
+
+CREATE INDEX clubs_search_vector_idx ON clubs USING GIN (search_vector);
+
+CREATE OR REPLACE FUNCTION users_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.full_name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.username, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.bio, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER users_search_vector_update
+    BEFORE INSERT OR UPDATE OF full_name, username, bio ON users
+    FOR EACH ROW EXECUTE PROCEDURE users_search_vector_update();
+
+CREATE INDEX users_search_vector_idx ON users USING GIN (search_vector);
+
+-- Keyset pagination walks these in (created_at, id) order
+CREATE INDEX clubs_created_at_id_idx ON clubs (created_at, id);
+CREATE INDEX users_created_at_id_idx ON users (created_at, id);
+
+-- Substring search matches these with ILIKE '%...%', which B-tree indexes
+-- can't answer
+CREATE INDEX clubs_name_trgm_idx ON clubs USING GIN (name gin_trgm_ops);
+CREATE INDEX clubs_description_trgm_idx ON clubs
+    USING GIN (description gin_trgm_ops);
+CREATE INDEX users_username_trgm_idx ON users
+    USING GIN (username gin_trgm_ops);
+CREATE INDEX users_full_name_trgm_idx ON users
+    USING GIN (full_name gin_trgm_ops);
+CREATE INDEX users_email_trgm_idx ON users USING GIN (email gin_trgm_ops);
+
+-- Club rosters and deleting all but a club's Presidents filter on these
+CREATE INDEX memberships_club_id_role_idx ON memberships (club_id, role);
+-- Covers listing a user's clubs and roles without reading the table
+CREATE INDEX memberships_user_id_club_id_role_idx
+    ON memberships (user_id, club_id, role);
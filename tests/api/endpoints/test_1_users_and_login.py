@@ -30,6 +30,38 @@ def test_post_users__failure(server):
     assert 'error' in response.json
 
 
+def test_post_users__taken(server):
+    _, response = server.app.test_client.post(
+        '/users',
+        data=json.dumps({
+            'username': 'test',
+            'full_name': 'Test Guy',
+            'email': 'other@test.com',
+            'bio': 'my name is test. I am a cs major',
+            'password': 'Val1dPassword!'
+        }))
+    assert response.status == 409
+
+
+def test_get_user_availability__success(server):
+    _, response = server.app.test_client.get(
+        '/users/available?username=test&email=test@test.com')
+    assert response.status == 200
+    assert response.json == {'username': False, 'email': False}
+    _, response = server.app.test_client.get(
+        '/users/available?username=nottaken')
+    assert response.status == 200
+    assert response.json == {'username': True}
+
+
+def test_get_user_availability__failure(server):
+    _, response = server.app.test_client.get('/users/available')
+    assert response.status == 400
+    _, response = server.app.test_client.get(
+        '/users/available?garbage=true')
+    assert response.status == 400
+
+
 def test_put_user__success(server):
     username = 'test'
     token = util.create_jwt(1, server.config.secret)
@@ -97,6 +129,44 @@ def test_paginate_users__failure(server):
     assert response.status == 400
 
 
+def test_paginate_users_cursor__success(server):
+    _, response = server.app.test_client.get(
+        '/users/search?pagination=cursor&size=3')
+    assert response.status == 200
+    body = response.json
+    assert body.get('result_count') == 4
+    assert len(body.get('results')) == 3
+    first_page = [user['username'] for user in body.get('results')]
+
+    _, response = server.app.test_client.get(
+        '/users/search?size=3&cursor=' + body['next_cursor'])
+    assert response.status == 200
+    body = response.json
+    assert len(body.get('results')) == 1
+    assert body.get('next_cursor') is None
+    assert body.get('results')[0]['username'] not in first_page
+
+
+def test_paginate_users_cursor__failure(server):
+    _, response = server.app.test_client.get('/users/search?cursor=garbage')
+    assert response.status == 400
+
+
+def test_suggest_users__success(server):
+    _, response = server.app.test_client.get('/users/suggest?prefix=GINS')
+    assert response.status == 200
+    assert response.json['results'] == [{
+        'username': 'ginsstaahh'
+    }, {
+        'username': 'ginsstaahh221'
+    }]
+
+
+def test_suggest_users__failure(server):
+    _, response = server.app.test_client.get('/users/suggest?prefix=')
+    assert response.status == 400
+
+
 def test_search_users__success(server):
     _, response = server.app.test_client.get(
         '/users/search?username=gin&full_name=gin')
@@ -105,6 +175,14 @@ def test_search_users__success(server):
     assert len(body.get('results')) == 2
 
 
+def test_search_users_substring__success(server):
+    _, response = server.app.test_client.get(
+        '/users/search?username=staahh&mode=substring')
+    assert response.status == 200
+    body = response.json
+    assert len(body.get('results')) == 2
+
+
 def test_get_user__success(server):
     _, response = server.app.test_client.get('/users/test')
     assert response.status == 200
@@ -148,6 +226,13 @@ def test_delete_user__success(server):
     assert response.status == 204
 
 
+def test_get_user_availability__after_delete(server):
+    _, response = server.app.test_client.get(
+        '/users/available?username=test&email=newemail@test.com')
+    assert response.status == 200
+    assert response.json == {'username': True, 'email': True}
+
+
 def test_delete_user__failure(server):
     token = util.create_jwt(1, server.config.secret)
     _, response = server.app.test_client.delete(
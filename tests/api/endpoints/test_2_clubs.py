@@ -199,6 +199,22 @@ def test_delete_club__failure(server):
         '/clubs/newtest', headers={'Authorization': token})
     assert response.status == 403
 
+    # fail when a user who isn't a member tries to delete the club
+    server.app.test_client.post(
+        '/users',
+        data=json.dumps({
+            'username': 'nonmember',
+            'full_name': 'Not A Member',
+            'bio': 'Just visiting',
+            'email': 'non@member.com',
+            'password': 'Val1dPassword!'
+        }))
+    _, response = server.app.test_client.get('/users/nonmember')
+    token = util.create_jwt(response.json['id'], server.config.secret)
+    _, response = server.app.test_client.delete(
+        '/clubs/newtest', headers={'Authorization': token})
+    assert response.status == 403
+
 
 def test_delete_club__success(server):
     # deleting clubs requires President privileges
@@ -241,6 +257,84 @@ def test_paginate_clubs__success(server):
     assert body.get('total_pages') == 2
 
 
+def test_paginate_clubs_totals__success(server):
+    _, response = server.app.test_client.get(
+        '/clubs/search?page=0&size=2&totals=none')
+    assert response.status == 200
+    body = response.json
+    assert len(body.get('results')) == 2
+    assert body.get('result_count') is None
+    assert body.get('total_pages') is None
+
+    # The estimate comes from table statistics so it may be out of date
+    _, response = server.app.test_client.get(
+        '/clubs/search?page=0&size=2&totals=estimate')
+    assert response.status == 200
+    body = response.json
+    assert len(body.get('results')) == 2
+    assert isinstance(body.get('result_count'), int)
+
+    # Empty pages still report the total
+    _, response = server.app.test_client.get('/clubs/search?page=5&size=2')
+    assert response.status == 200
+    body = response.json
+    assert body.get('results') == []
+    assert body.get('result_count') == 3
+
+
+def test_paginate_clubs_totals__failure(server):
+    _, response = server.app.test_client.get('/clubs/search?totals=garbage')
+    assert response.status == 400
+
+
+def test_paginate_clubs_cursor__success(server):
+    _, response = server.app.test_client.get(
+        '/clubs/search?pagination=cursor&size=2')
+    assert response.status == 200
+    body = response.json
+    assert body.get('result_count') == 3
+    assert len(body.get('results')) == 2
+    assert body.get('next_cursor')
+    first_page = [club['name'] for club in body.get('results')]
+
+    _, response = server.app.test_client.get(
+        '/clubs/search?size=2&cursor=' + body['next_cursor'])
+    assert response.status == 200
+    body = response.json
+    assert len(body.get('results')) == 1
+    # Only the first page counts the results
+    assert body.get('result_count') is None
+    assert body.get('next_cursor') is None
+    assert body.get('results')[0]['name'] not in first_page
+
+
+def test_paginate_clubs_cursor__failure(server):
+    _, response = server.app.test_client.get('/clubs/search?cursor=garbage')
+    assert response.status == 400
+
+
+def test_suggest_clubs__success(server):
+    _, response = server.app.test_client.get('/clubs/suggest?prefix=ubc')
+    assert response.status == 200
+    assert response.json['results'] == [{
+        'name': 'UBC biomed'
+    }, {
+        'name': 'UBC Launch Pad'
+    }]
+    _, response = server.app.test_client.get(
+        '/clubs/suggest?prefix=ubc&size=1')
+    assert response.status == 200
+    assert len(response.json['results']) == 1
+
+
+def test_suggest_clubs__failure(server):
+    _, response = server.app.test_client.get('/clubs/suggest')
+    assert response.status == 400
+    _, response = server.app.test_client.get(
+        '/clubs/suggest?prefix=ubc&size=0')
+    assert response.status == 400
+
+
 def test_search_clubs__success(server):
     _, response = server.app.test_client.get('/clubs/search?name=UBC')
     assert response.status == 200
@@ -250,3 +344,27 @@ def test_search_clubs__success(server):
     assert body.get('results')[0]['description'] == 'software engineering team'
     assert body.get('results')[1]['name'] == 'UBC biomed'
     assert body.get('results')[1]['description'] == 'something else'
+
+
+def test_search_clubs_fulltext__success(server):
+    # Words in the description match too, but rank below words in the name
+    _, response = server.app.test_client.get(
+        '/clubs/search?name=engineering')
+    assert response.status == 200
+    body = response.json
+    assert body.get('result_count') == 1
+    assert body.get('results')[0]['name'] == 'UBC Launch Pad'
+
+
+def test_search_clubs_substring__success(server):
+    _, response = server.app.test_client.get(
+        '/clubs/search?name=aunch&mode=substring')
+    assert response.status == 200
+    body = response.json
+    assert len(body.get('results')) == 1
+    assert body.get('results')[0]['name'] == 'UBC Launch Pad'
+
+
+def test_search_clubs__failure(server):
+    _, response = server.app.test_client.get('/clubs/search?mode=garbage')
+    assert response.status == 400
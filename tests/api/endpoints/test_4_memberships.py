@@ -331,6 +331,110 @@ def test_get_membership__failure(server):
     assert response.status == 404
 
 
+def test_get_memberships_by_club_id__success(server):
+    _, response = server.app.test_client.get('/users/founder')
+    user_id = response.json['id']
+    token = util.create_jwt(user_id, server.config.secret)
+    _, response = server.app.test_client.get('/clubs/testclub')
+    club_id = response.json['id']
+    _, response = server.app.test_client.get(
+        f'/clubs/{club_id}/memberships', headers={'Authorization': token})
+    assert response.status == 200
+    assert len(response.json) == 6
+
+    _, response = server.app.test_client.get(
+        f'/clubs/{club_id}/memberships?user_id={user_id}',
+        headers={'Authorization': token})
+    assert response.status == 200
+    assert response.json[0]['username'] == 'founder'
+
+
+def test_get_memberships_by_club_id__failure(server):
+    _, response = server.app.test_client.get('/users/founder')
+    token = util.create_jwt(response.json['id'], server.config.secret)
+    _, response = server.app.test_client.get(
+        '/clubs/999999/memberships', headers={'Authorization': token})
+    assert response.status == 404
+    _, response = server.app.test_client.put(
+        '/clubs/999999/memberships?user_id=3',
+        data=json.dumps({
+            'members_role': 'Member',
+            'position': 'Member'
+        }),
+        headers={'Authorization': token})
+    assert response.status == 404
+
+
+def test_get_roster_page__success(server):
+    _, response = server.app.test_client.get('/users/founder')
+    token = util.create_jwt(response.json['id'], server.config.secret)
+    _, response = server.app.test_client.get(
+        '/memberships/testclub?limit=4', headers={'Authorization': token})
+    assert response.status == 200
+    first_page = response.json
+    assert len(first_page) == 4
+    # The founder was the first member
+    assert first_page[0]['username'] == 'founder'
+    cursor = response.headers['X-Next-Cursor']
+
+    _, response = server.app.test_client.get(
+        '/memberships/testclub?cursor=' + cursor,
+        headers={'Authorization': token})
+    assert response.status == 200
+    assert len(response.json) == 2
+    assert 'X-Next-Cursor' not in response.headers
+    usernames = {m['username'] for m in first_page + response.json}
+    assert len(usernames) == 6
+
+
+def test_get_roster_page__failure(server):
+    _, response = server.app.test_client.get('/users/founder')
+    token = util.create_jwt(response.json['id'], server.config.secret)
+    _, response = server.app.test_client.get(
+        '/memberships/testclub?cursor=garbage',
+        headers={'Authorization': token})
+    assert response.status == 400
+    _, response = server.app.test_client.get(
+        '/memberships/testclub?limit=0', headers={'Authorization': token})
+    assert response.status == 400
+
+
+def test_stream_roster__success(server):
+    _, response = server.app.test_client.get('/users/founder')
+    token = util.create_jwt(response.json['id'], server.config.secret)
+    _, response = server.app.test_client.get(
+        '/memberships/testclub?format=ndjson',
+        headers={'Authorization': token})
+    assert response.status == 200
+    assert response.headers['Content-Type'] == 'application/x-ndjson'
+    memberships = [json.loads(line) for line in response.text.splitlines()]
+    assert len(memberships) == 6
+    assert memberships[0]['username'] == 'founder'
+    assert isinstance(memberships[0]['created_at'], int)
+
+
+def test_get_user_memberships__success(server):
+    _, response = server.app.test_client.get('/users/admin')
+    token = util.create_jwt(response.json['id'], server.config.secret)
+    _, response = server.app.test_client.get(
+        '/users/founder/memberships', headers={'Authorization': token})
+    assert response.status == 200
+    clubs = {club['name']: club for club in response.json}
+    assert clubs['testclub']['role'] == 'President'
+    _, response = server.app.test_client.get('/clubs/testclub')
+    assert clubs['testclub']['club_id'] == response.json['id']
+
+
+def test_get_user_memberships__failure(server):
+    _, response = server.app.test_client.get('/users/founder/memberships')
+    assert response.status == 401
+    _, response = server.app.test_client.get('/users/admin')
+    token = util.create_jwt(response.json['id'], server.config.secret)
+    _, response = server.app.test_client.get(
+        '/users/doesnotexist/memberships', headers={'Authorization': token})
+    assert response.status == 404
+
+
 def test_delete_membership__failure(server):
     # Presidents can't delete President memberships
     _, response = server.app.test_client.get('/users/founder')
@@ -417,3 +521,103 @@ def test_delete_membership__success(server):
     _, response = server.app.test_client.delete(
         '/memberships/testclub', headers={'Authorization': founder_token})
     assert response.status == 201
+
+
+def test_import_memberships__success(server):
+    _, response = server.app.test_client.get('/users/founder')
+    founder_token = util.create_jwt(response.json['id'], server.config.secret)
+    _, response = server.app.test_client.get('/users/admin2')
+    admin2_id = response.json['id']
+    _, response = server.app.test_client.post(
+        '/memberships/testclub/import',
+        data=json.dumps([
+            {
+                'username': 'member',
+                'role': 'Member',
+                'position': 'Imported',
+            },
+            {
+                'user_id': str(admin2_id),
+                'role': 'Admin',
+                'position': 'Imported',
+            },
+            {
+                'username': 'doesnotexist',
+                'role': 'Member',
+                'position': 'Imported',
+            },
+            {
+                'username': 'member',
+                'role': 'Admin',
+                'position': 'Imported',
+            },
+            {
+                'username': 'member2',
+                'role': 'Owner',
+                'position': 'Imported',
+            },
+        ]),
+        headers={'Authorization': founder_token})
+    assert response.status == 200
+    assert response.json['imported'] == 2
+    assert response.json['failures'] == [
+        {'row': 3, 'error': 'No such user'},
+        {'row': 4, 'error': 'Duplicate user'},
+        {'row': 5, 'error': 'role must be one of President, Admin, Member'},
+    ]
+
+    _, response = server.app.test_client.get(
+        '/memberships/testclub?user_id=' + str(admin2_id),
+        headers={'Authorization': founder_token})
+    assert response.json[0]['role'] == 'Admin'
+    assert response.json[0]['position'] == 'Imported'
+
+    # Admins can only import Members, and a user whose first row wasn't
+    # allowed isn't a duplicate
+    admin2_token = util.create_jwt(admin2_id, server.config.secret)
+    _, response = server.app.test_client.post(
+        '/memberships/testclub/import',
+        data='username,role,position\n'
+        'member2,Member,From CSV\n'
+        'pres2,Admin,From CSV\n'
+        'pres2,Member,From CSV\n',
+        headers={
+            'Authorization': admin2_token,
+            'Content-Type': 'text/csv',
+        })
+    assert response.status == 200
+    assert response.json['imported'] == 1
+    assert response.json['failures'] == [
+        {'row': 2, 'error': 'Permission denied'},
+        {'row': 3, 'error': 'Permission denied'},
+    ]
+
+
+def test_import_memberships__failure(server):
+    _, response = server.app.test_client.get('/users/nonmember')
+    token = util.create_jwt(response.json['id'], server.config.secret)
+    rows = json.dumps([{
+        'username': 'nonmember',
+        'role': 'Member',
+        'position': 'Imported',
+    }])
+    # Club does not exist
+    _, response = server.app.test_client.post(
+        '/memberships/doesnotexist/import',
+        data=rows,
+        headers={'Authorization': token})
+    assert response.status == 404
+    # Not a member of the club
+    _, response = server.app.test_client.post(
+        '/memberships/testclub/import',
+        data=rows,
+        headers={'Authorization': token})
+    assert response.status == 400
+    # Body is not a list
+    _, response = server.app.test_client.get('/users/founder')
+    token = util.create_jwt(response.json['id'], server.config.secret)
+    _, response = server.app.test_client.post(
+        '/memberships/testclub/import',
+        data='{}',
+        headers={'Authorization': token})
+    assert response.status == 400
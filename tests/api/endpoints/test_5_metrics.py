@@ -0,0 +1,78 @@
+"""Tests the Bounce API."""
+
+import json
+
+from bounce.server.api import util
+
+
+def test_get_metrics__success(server):
+    _, response = server.app.test_client.get('/metrics')
+    run_count = response.json['executor.run_time']['count']
+    # Handlers that don't use their DB session don't touch the executor
+    server.app.test_client.get('/users/founder')
+    _, response = server.app.test_client.get('/metrics')
+    assert response.json['executor.run_time']['count'] == run_count
+    # Looking a user up by ID uses the session on the executor
+    token = util.create_jwt(99, server.config.secret)
+    server.app.test_client.delete(
+        '/users/99/images/profile', headers={'Authorization': token})
+    _, response = server.app.test_client.get('/metrics')
+    assert response.status == 200
+    assert response.json['executor.queue_depth'] == 0
+    assert response.json['executor.run_time']['count'] > run_count
+    assert 'executor.wait_time' in response.json
+
+
+def test_get_pool_metrics__success(server):
+    # The server reads from the pool when it starts
+    _, response = server.app.test_client.get('/metrics')
+    assert response.status == 200
+    assert response.json['db.pool.checkout_time']['count'] > 0
+    assert 0 <= response.json['db.pool.saturation'] <= 1
+    assert response.json['db.async_pool.checkout_time']['count'] > 0
+
+
+def test_get_search_cache_metrics__success(server):
+    server.app.test_client.get('/clubs/search?name=metrics')
+    _, response = server.app.test_client.get('/clubs/search?name=Metrics')
+    assert response.status == 200
+    _, response = server.app.test_client.get('/metrics')
+    assert response.json['cache.club_search.hits'] > 0
+    assert response.json['cache.club_search.misses'] > 0
+    assert response.json['cache.club_search.size'] > 0
+
+
+def test_get_role_cache_metrics__success(server):
+    _, response = server.app.test_client.get('/users/founder')
+    token = util.create_jwt(response.json['id'], server.config.secret)
+    for _ in range(2):
+        server.app.test_client.get(
+            '/memberships/testclub', headers={'Authorization': token})
+    _, response = server.app.test_client.get('/metrics')
+    assert response.json['cache.membership_roles.hits'] > 0
+    assert response.json['cache.membership_roles.misses'] > 0
+
+
+def test_get_hasher_metrics__success(server):
+    _, response = server.app.test_client.post(
+        '/auth/login',
+        data=json.dumps({
+            'username': 'founder',
+            'password': 'Val1dPassword!'
+        }))
+    assert response.status == 200
+    _, response = server.app.test_client.get('/metrics')
+    assert response.json['hasher.latency']['count'] > 0
+    assert response.json['hasher.queue_depth'] == 0
+    assert response.json['hasher.rejected'] == 0
+
+
+def test_get_token_cache_metrics__success(server):
+    _, response = server.app.test_client.get('/users/founder')
+    token = util.create_jwt(response.json['id'], server.config.secret)
+    for _ in range(2):
+        server.app.test_client.get(
+            '/users/founder/memberships', headers={'Authorization': token})
+    _, response = server.app.test_client.get('/metrics')
+    assert response.json['cache.tokens.hits'] > 0
+    assert 0 < response.json['cache.tokens.hit_rate'] <= 1
@@ -1,5 +1,7 @@
 """Tests Bounce API utilities."""
 
+from types import SimpleNamespace
+
 from bounce.server.api import util
 
 
@@ -55,3 +57,33 @@ def test_create_and_check_jwt__success():
 def test_create_and_check_jwt__failure():
     token = util.create_jwt(12345, 'test secret')
     assert util.check_jwt(token, 'wrong secret') is None
+
+
+def test_query_param():
+    # validate() leaves a single string for each param
+    request = SimpleNamespace(args={'cursor': 'abc'})
+    assert util.query_param(request, 'cursor') == 'abc'
+    assert util.query_param(request, 'size') is None
+    assert util.query_param(request, 'size', '20') == '20'
+
+
+def test_hash_password__cost():
+    secret = util.hash_password('Val1dPassword!', cost=5)
+    assert util.secret_cost(secret) == 5
+    assert util.check_password('Val1dPassword!', secret)
+    assert not util.check_password('WrongPassword!', secret)
+
+
+def test_secret_cost__not_bcrypt():
+    assert util.secret_cost('garbage') is None
+    assert util.secret_cost('$2b$xx$abc') is None
+
+
+def test_benchmark_costs():
+    timings, recommended = util.benchmark_costs(
+        budget=60, min_cost=4, max_cost=5, samples=1)
+    assert [cost for cost, _ in timings] == [4, 5]
+    assert recommended == 5
+    timings, recommended = util.benchmark_costs(budget=0, min_cost=4)
+    assert len(timings) == 1
+    assert recommended is None
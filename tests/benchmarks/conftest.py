@@ -0,0 +1,28 @@
+"""
+Defines fixtures for the benchmarks, which only run when BOUNCE_BENCHMARK is
+set, e.g. `BOUNCE_BENCHMARK=1 pytest tests/benchmarks`.
+"""
+
+import os
+
+import pytest
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup():
+    """Skips benchmarks unless BOUNCE_BENCHMARK is set."""
+    if not os.environ.get('BOUNCE_BENCHMARK'):
+        pytest.skip('set BOUNCE_BENCHMARK to run benchmarks')
+
+
+@pytest.fixture
+def report(request, capsys):
+    """Returns a function that writes a line of benchmark results to the
+    terminal, whether or not output is captured."""
+    reporter = request.config.pluginmanager.getplugin('terminalreporter')
+
+    def write_line(line):
+        with capsys.disabled():
+            reporter.write_line(line)
+
+    return write_line
@@ -0,0 +1,60 @@
+"""
+Benchmarks encoding our largest response bodies, search result pages and
+club rosters, with each installed JSON library.
+
+Run them with `BOUNCE_BENCHMARK=1 pytest tests/benchmarks/test_codecs.py`.
+"""
+
+import timeit
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bounce.server import codec
+
+ITERATIONS = 200
+
+CREATED_AT = datetime(2018, 5, 1, tzinfo=timezone.utc)
+
+# A page of GET /users/search results
+SEARCH_PAGE = {
+    'results': [{
+        'id': i,
+        'full_name': f'Benchmark User {i}',
+        'username': f'benchuser{i}',
+        'email': f'benchuser{i}@example.com',
+        'bio': 'Likes hiking, board games and long walks on the beach.',
+        'created_at': CREATED_AT + timedelta(minutes=i),
+    } for i in range(20)],
+    'result_count': 1000,
+    'page': 3,
+    'total_pages': 50,
+}
+
+# A club roster from GET /memberships/<club_name>
+ROSTER = [{
+    'user_id': i,
+    'full_name': f'Benchmark User {i}',
+    'username': f'benchuser{i}',
+    'role': 'Member',
+    'position': 'Member',
+    'created_at': CREATED_AT + timedelta(minutes=i),
+} for i in range(1000)]
+
+
+@pytest.mark.parametrize('payload_name, payload', [
+    ('search page', SEARCH_PAGE),
+    ('roster', ROSTER),
+])
+def test_codec_cost(report, payload_name, payload):
+    decoded = None
+    for name in codec.LIBRARIES:
+        json_codec = codec.JSONCodec(name)
+        seconds = timeit.timeit(
+            lambda: json_codec.dumps(payload), number=ITERATIONS)
+        report(f'{payload_name} with {name}: '
+               f'{seconds / ITERATIONS * 1e6:.1f}us per response')
+        # Every library writes the same response
+        result = json_codec.loads(json_codec.dumps(payload))
+        assert decoded is None or result == decoded
+        decoded = result
@@ -0,0 +1,64 @@
+"""
+Benchmarks substring search against a large users table and checks that
+Postgres answers it with the trigram indexes rather than a sequential scan.
+
+These insert a million users. Everything they insert is rolled back.
+"""
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from bounce.db import SearchMode, Totals, user
+
+USER_COUNT = 1000000
+
+
+@pytest.fixture
+def session(server):
+    """Returns a DB session with USER_COUNT extra users that are rolled back
+    once the test completes."""
+    sess = server.db_session
+    sess.execute(f"""
+        INSERT INTO users (full_name, username, secret, email, bio)
+        SELECT 'Benchmark User ' || i, 'benchuser' || i, 'secret',
+               'benchuser' || i || '@example.com', ''
+        FROM generate_series(1, {USER_COUNT}) AS i
+    """)
+    sess.execute('ANALYZE users')
+    yield sess
+    sess.rollback()
+    sess.close()
+
+
+def explain_analyze(session, statement):
+    """Returns the plan Postgres used to run the given statement."""
+    sql = statement.compile(
+        dialect=postgresql.dialect(),
+        compile_kwargs={'literal_binds': True})
+    rows = session.execute(f'EXPLAIN ANALYZE {sql}')
+    return '\n'.join(row[0] for row in rows)
+
+
+@pytest.mark.parametrize('field, term, index', [
+    ('username', 'user12345', 'users_username_trgm_idx'),
+    ('full_name', 'User 98765', 'users_full_name_trgm_idx'),
+    ('email', 'benchuser4242@', 'users_email_trgm_idx'),
+])
+def test_substring_search_uses_trigram_index(session, report, field, term,
+                                             index):
+    # pylint: disable=protected-access
+    statement, _ = user._search_statements(
+        full_name=term if field == 'full_name' else None,
+        username=term if field == 'username' else None,
+        identifier=None,
+        email=term if field == 'email' else None,
+        created_at=None,
+        mode=SearchMode.substring,
+        page=0,
+        size=user.MAX_SIZE,
+        cursor=None,
+        totals=Totals.exact)
+    plan = explain_analyze(session, statement)
+    report(plan)
+    assert index in plan
+    assert 'Seq Scan on users' not in plan
@@ -0,0 +1,70 @@
+"""
+Benchmarks the per-request cost of validating bodies against resource
+schemas, comparing the validators ResourceMeta compiles when a resource is
+defined with building a new one for every request as `jsonschema.validate`
+does, and of filling in the defaults those schemas declare.
+
+Run them with `BOUNCE_BENCHMARK=1 pytest tests/benchmarks/test_validation.py`.
+"""
+
+import timeit
+
+import jsonschema
+
+from bounce.server.resource import FORMAT_CHECKER, apply_defaults
+from bounce.server.resource.club import SearchClubsRequest
+from bounce.server.resource.membership import GetMembershipsResponse
+from bounce.server.resource.user import GetUserResponse, PostUsersRequest
+
+ITERATIONS = 1000
+
+PAYLOADS = [
+    (PostUsersRequest, {
+        'full_name': 'Benchmark User',
+        'username': 'benchuser',
+        'password': 'Val1dPassword!',
+        'email': 'benchuser@example.com',
+        'bio': 'A user created to benchmark validation.',
+    }),
+    (GetUserResponse, {
+        'full_name': 'Benchmark User',
+        'username': 'benchuser',
+        'email': 'benchuser@example.com',
+        'bio': 'A user created to benchmark validation.',
+        'id': 42,
+        'created_at': 1525000000,
+    }),
+]
+
+
+def per_call(func):
+    """Returns the mean number of microseconds a call to func takes."""
+    return timeit.timeit(func, number=ITERATIONS) / ITERATIONS * 1e6
+
+
+def test_compiled_validation_cost(report):
+    for resource, body in PAYLOADS:
+        uncompiled = per_call(lambda: jsonschema.validate(
+            body, resource.__body__, format_checker=FORMAT_CHECKER))
+        compiled = per_call(
+            lambda: resource.__body_validator__.validate(body))
+        report(f'{resource.__name__}: {uncompiled:.1f}us per request '
+               f'uncompiled, {compiled:.1f}us compiled')
+
+
+def test_default_filling_cost(report):
+    roster = [{
+        'user_id': i,
+        'created_at': 1525000000 + i,
+        'role': 'Member',
+        'position': 'Member',
+        'full_name': f'Benchmark User {i}',
+        'username': f'benchuser{i}',
+    } for i in range(1000)]
+    params = per_call(lambda: apply_defaults(
+        SearchClubsRequest.__params_defaults__, {'name': 'bench'}))
+    response = per_call(lambda: apply_defaults(
+        GetMembershipsResponse.__body_defaults__, roster))
+    report(f'SearchClubsRequest params: {params:.1f}us per request, '
+           f'GetMembershipsResponse with {len(roster)} members: '
+           f'{response:.1f}us')
@@ -5,18 +5,37 @@ import pytest
 from bounce.server import Server
 from bounce.server.api.auth import LoginEndpoint
 from bounce.server.api.clubs import (ClubEndpoint, ClubImagesEndpoint,
-                                     ClubsEndpoint, SearchClubsEndpoint)
-from bounce.server.api.membership import MembershipEndpoint
-from bounce.server.api.users import (SearchUsersEndpoint, UserEndpoint,
-                                     UserImagesEndpoint, UsersEndpoint)
+                                     ClubsEndpoint, SearchClubsEndpoint,
+                                     SuggestClubsEndpoint)
+from bounce.server.api.membership import (ClubMembershipEndpoint,
+                                          ImportMembershipsEndpoint,
+                                          MembershipEndpoint)
+from bounce.server.api.metrics import MetricsEndpoint
+from bounce.server.api.users import (SearchUsersEndpoint, SuggestUsersEndpoint,
+                                     UserAvailabilityEndpoint, UserEndpoint,
+                                     UserImagesEndpoint,
+                                     UserMembershipsEndpoint, UsersEndpoint)
 from bounce.server.config import ServerConfig
 
 
 @pytest.fixture
 def config():
     """Returns test config for the server."""
-    return ServerConfig(3131, 'test_secret', 'postgres', 5432, 'bounce-test',
-                        'bounce-test', 'bounce-test', '*', 'images')
+    return ServerConfig(
+        3131,
+        'test_secret',
+        'postgres',
+        5432,
+        'bounce-test',
+        'bounce-test',
+        'bounce-test',
+        '*',
+        'images',
+        # The test client restarts the app for every request, so don't open
+        # a full pool of connections each time
+        pg_pool_prewarm=False,
+        # Catch responses that don't match their schemas
+        response_validation_rate=1)
 
 
 @pytest.fixture
@@ -25,7 +44,10 @@ def server(config):
     serv = Server(config, [
         UserEndpoint, UsersEndpoint, ClubEndpoint, ClubsEndpoint,
         LoginEndpoint, UserImagesEndpoint, SearchClubsEndpoint,
-        SearchUsersEndpoint, ClubImagesEndpoint, MembershipEndpoint
+        SearchUsersEndpoint, SuggestClubsEndpoint, SuggestUsersEndpoint,
+        ClubImagesEndpoint, MembershipEndpoint, ClubMembershipEndpoint,
+        ImportMembershipsEndpoint, UserMembershipsEndpoint,
+        UserAvailabilityEndpoint, MetricsEndpoint
     ])
     serv.start(test=True)
     return serv
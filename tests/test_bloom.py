@@ -0,0 +1,34 @@
+"""Tests the counting Bloom filter."""
+
+from bounce.bloom import BloomFilter
+
+
+def test_contains__no_false_negatives():
+    values = [f'user{i}' for i in range(1000)]
+    bloom = BloomFilter(values, capacity=1000)
+    assert all(value in bloom for value in values)
+
+
+def test_contains__false_positive_rate():
+    bloom = BloomFilter((f'user{i}' for i in range(1000)), capacity=1000)
+    false_positives = sum(f'other{i}' in bloom for i in range(10000))
+    # Allow some slack over the 1% the filter is sized for
+    assert false_positives < 300
+
+
+def test_add_and_remove():
+    bloom = BloomFilter()
+    assert 'founder' not in bloom
+    bloom.add('founder')
+    bloom.add('admin')
+    assert 'founder' in bloom
+    bloom.remove('founder')
+    assert 'founder' not in bloom
+    assert 'admin' in bloom
+
+
+def test_rebuild__replaces_values():
+    bloom = BloomFilter(['old'])
+    bloom.rebuild(['new'])
+    assert 'old' not in bloom
+    assert 'new' in bloom
@@ -0,0 +1,86 @@
+"""Tests the in-process TTL cache."""
+
+import time
+
+from bounce.cache import MISSING, TTLCache
+from bounce.metrics import REGISTRY
+
+
+def test_get__hit_and_miss():
+    cache = TTLCache('test_hit_and_miss')
+    assert cache.get('key') is MISSING
+    cache.put('key', None)
+    assert cache.get('key') is None
+    assert REGISTRY.counter('cache.test_hit_and_miss.hits').value == 1
+    assert REGISTRY.counter('cache.test_hit_and_miss.misses').value == 1
+
+
+def test_put__evicts_least_recently_used():
+    cache = TTLCache('test_lru', max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    # Reading a makes b the least recently used entry
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert REGISTRY.counter('cache.test_lru.evictions').value == 1
+
+
+def test_get__expired():
+    cache = TTLCache('test_expired', ttl=0.01)
+    cache.put('key', 'value')
+    time.sleep(0.02)
+    assert cache.get('key') is MISSING
+    assert len(cache) == 0
+
+
+def test_put__after_invalidate():
+    cache = TTLCache('test_invalidate')
+    cache.put('a', 1)
+    generation = cache.generation
+    cache.invalidate()
+    assert cache.get('a') is MISSING
+    # Values read before the invalidation are stale
+    cache.put('a', 1, generation)
+    assert cache.get('a') is MISSING
+    cache.put('a', 2, cache.generation)
+    assert cache.get('a') == 2
+
+
+def test_put__disabled():
+    cache = TTLCache('test_disabled', max_size=0)
+    cache.put('key', 'value')
+    assert cache.get('key') is MISSING
+
+
+def test_invalidate__counts_invalidations():
+    cache = TTLCache('test_invalidations')
+    cache.put('a', 1)
+    cache.invalidate('a')
+    cache.invalidate()
+    assert cache.get('a') is MISSING
+    invalidations = REGISTRY.counter('cache.test_invalidations.invalidations')
+    assert invalidations.value == 2
+
+
+def test_put__entry_ttl():
+    cache = TTLCache('test_entry_ttl', ttl=60)
+    cache.put('short', 1, ttl=0.01)
+    cache.put('expired', 2, ttl=-1)
+    cache.put('long', 3, ttl=120)
+    time.sleep(0.02)
+    assert cache.get('short') is MISSING
+    assert cache.get('expired') is MISSING
+    assert cache.get('long') == 3
+
+
+def test_hit_rate():
+    cache = TTLCache('test_hit_rate')
+    assert cache.hit_rate() == 0
+    cache.put('a', 1)
+    cache.get('a')
+    cache.get('b')
+    assert cache.hit_rate() == 0.5
+    assert REGISTRY.gauge('cache.test_hit_rate.hit_rate').value == 0.5
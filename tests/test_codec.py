@@ -0,0 +1,57 @@
+"""Tests the JSON codec requests and responses are handled with."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bounce.server import codec
+
+CREATED_AT = datetime(2018, 5, 1, 12, 30, 15, 500, tzinfo=timezone.utc)
+TIMESTAMP = 1525177815
+
+
+@pytest.mark.parametrize('name', list(codec.LIBRARIES))
+def test_codec__round_trip(name):
+    json_codec = codec.JSONCodec(name)
+    value = {
+        'name': 'Bounce',
+        'members': [{
+            'id': 1,
+            'created_at': CREATED_AT,
+        }, {
+            'id': 2,
+            'created_at': CREATED_AT.replace(tzinfo=None),
+        }, {
+            'id': 3,
+            'created_at': CREATED_AT.astimezone(timezone(-timedelta(hours=7))),
+        }],
+        'description': 'café / club',
+        'total': None,
+    }
+    data = json_codec.dumps(value)
+    assert isinstance(data, bytes)
+    decoded = json_codec.loads(data)
+    assert [m['created_at'] for m in decoded['members']] == [TIMESTAMP] * 3
+    assert decoded['description'] == value['description']
+    assert decoded['total'] is None
+    # All libraries agree
+    assert codec.JSONCodec('json').loads(data) == decoded
+
+
+def test_codec__invalid_json():
+    with pytest.raises(ValueError):
+        codec.JSONCodec().loads(b'{"name": ')
+
+
+def test_codec__not_installed():
+    with pytest.raises(ValueError):
+        codec.JSONCodec('simplejson')
+
+
+def test_codec__response():
+    result = codec.JSONCodec('json').response(
+        {'error': 'Not found'}, status=404, headers={'X-Test': 'yes'})
+    assert result.status == 404
+    assert result.content_type == codec.CONTENT_TYPE
+    assert result.headers['X-Test'] == 'yes'
+    assert result.body == b'{"error":"Not found"}'
@@ -0,0 +1,23 @@
+"""Tests the async query layer's statement compilation."""
+
+import sqlalchemy
+
+from bounce.db import compile_statement
+from bounce.db.club import Club
+
+
+def test_compile_statement__literals():
+    query, args = compile_statement(
+        "SELECT :name, '12:30', 'a%' || CAST(:name AS text)", {'name': 'x'})
+    assert query == "SELECT $1, '12:30', 'a%' || CAST($2 AS text)"
+    assert args == ['x', 'x']
+
+
+def test_compile_statement__core():
+    statement = sqlalchemy.select([
+        Club.identifier, sqlalchemy.literal_column("'1:2%'")
+    ]).where(Club.name == 'test').where(Club.description.like('%a%'))
+    query, args = compile_statement(statement)
+    assert "'1:2%'" in query
+    assert 'clubs.name = $1 AND clubs.description LIKE $2' in query
+    assert args == ['test', '%a%']
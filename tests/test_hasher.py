@@ -0,0 +1,57 @@
+"""Tests the process pool passwords are hashed on."""
+
+import asyncio
+import time
+
+from bounce.metrics import REGISTRY
+from bounce.server.api import util
+from bounce.server.hasher import HasherBusy, PasswordHasher
+
+
+def run(coro):
+    """Runs the given coroutine to completion on a new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_run__hashes_in_another_process():
+    hasher = PasswordHasher(size=1)
+    try:
+        secret = run(hasher.run(util.hash_password, 'Val1dPassword!'))
+        assert run(
+            hasher.run(util.check_password, 'Val1dPassword!', secret))
+        assert REGISTRY.timer('hasher.latency').snapshot()['count'] >= 2
+    finally:
+        hasher.shutdown()
+
+
+def test_run__rejects_when_queue_is_full():
+    hasher = PasswordHasher(size=1, queue_size=1)
+
+    async def submit_three():
+        return await asyncio.gather(
+            *[hasher.run(time.sleep, 0.2) for _ in range(3)],
+            return_exceptions=True)
+
+    try:
+        results = run(submit_three())
+    finally:
+        hasher.shutdown()
+    # One call runs, one waits and the third is rejected
+    assert results[:2] == [None, None]
+    assert isinstance(results[2], HasherBusy)
+    assert hasher.queue_depth() == 0
+
+
+def test_configure__restarts_pool_on_resize():
+    hasher = PasswordHasher(size=1)
+    try:
+        run(hasher.run(time.sleep, 0))
+        hasher.configure(size=2)
+        assert hasher.size == 2
+        run(hasher.run(time.sleep, 0))
+    finally:
+        hasher.shutdown()
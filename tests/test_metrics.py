@@ -0,0 +1,45 @@
+"""Tests Bounce's in-process metrics."""
+
+import pytest
+
+from bounce.metrics import Registry
+
+
+def test_counter_and_gauge__success():
+    registry = Registry()
+    counter = registry.counter('test.counter')
+    gauge = registry.gauge('test.gauge')
+    counter.inc()
+    counter.inc(2)
+    gauge.inc(5)
+    gauge.dec()
+    assert registry.counter('test.counter') is counter
+    assert registry.snapshot() == {'test.counter': 3, 'test.gauge': 4}
+
+
+def test_timer__success():
+    registry = Registry()
+    timer = registry.timer('test.timer')
+    timer.observe(0.5)
+    timer.observe(1.5)
+    with timer.time():
+        pass
+    snapshot = registry.snapshot()['test.timer']
+    assert snapshot['count'] == 3
+    assert snapshot['max_ms'] == 1500
+    assert snapshot['total_ms'] >= 2000
+
+
+def test_registry__failure():
+    registry = Registry()
+    registry.counter('test.metric')
+    with pytest.raises(ValueError):
+        registry.timer('test.metric')
+
+
+def test_gauge_function__success():
+    registry = Registry()
+    values = [1, 2]
+    registry.gauge('test.gauge').set_function(values.pop)
+    assert registry.snapshot() == {'test.gauge': 2}
+    assert registry.snapshot() == {'test.gauge': 1}
@@ -0,0 +1,22 @@
+"""Tests the in-memory prefix index."""
+
+from bounce.prefix import PrefixIndex
+
+
+def test_search():
+    index = PrefixIndex(['UBC Launch Pad', 'envision', 'UBC biomed'])
+    assert index.search('ubc', 10) == ['UBC biomed', 'UBC Launch Pad']
+    assert index.search('UBC L', 10) == ['UBC Launch Pad']
+    assert index.search('ubc', 1) == ['UBC biomed']
+    assert index.search('x', 10) == []
+
+
+def test_add_and_remove():
+    index = PrefixIndex(['bob'])
+    index.add('Bobby')
+    index.add('Bobby')
+    assert index.search('bob', 10) == ['bob', 'Bobby']
+    index.remove('bob')
+    index.remove('nobody')
+    assert index.search('bob', 10) == ['Bobby']
+    assert len(index) == 1
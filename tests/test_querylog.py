@@ -0,0 +1,41 @@
+"""Tests the slow query log."""
+
+import logging
+
+import sqlalchemy
+
+from bounce.db import querylog
+
+
+def test_record__slow(caplog):
+    query_log = querylog.QueryLogger(slow_query_ms=100)
+    slow_queries = querylog.SLOW_QUERIES.value
+    with caplog.at_level(logging.INFO, logger=querylog.__name__):
+        assert query_log.record('SELECT 1', {}, 0.2, 1)
+    assert querylog.SLOW_QUERIES.value == slow_queries + 1
+    assert 'Slow query' in caplog.text
+
+
+def test_record__sampled(caplog):
+    with caplog.at_level(logging.INFO, logger=querylog.__name__):
+        assert not querylog.QueryLogger(sample_rate=0).record(
+            'SELECT 1', {}, 0.001, 1)
+        assert not caplog.records
+        assert not querylog.QueryLogger(sample_rate=1).record(
+            'SELECT 1', {}, 0.001, 1)
+        assert 'Query' in caplog.text
+
+
+def test_should_explain():
+    assert querylog.QueryLogger(explain=True).should_explain(
+        '\n  select * from clubs')
+    assert not querylog.QueryLogger(explain=True).should_explain('BEGIN')
+    assert not querylog.QueryLogger().should_explain('SELECT 1')
+
+
+def test_install__success():
+    engine = sqlalchemy.create_engine('sqlite://')
+    querylog.install(engine)
+    queries = querylog.QUERY_TIME.count
+    engine.execute('SELECT 1')
+    assert querylog.QUERY_TIME.count == queries + 1
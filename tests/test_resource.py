@@ -0,0 +1,138 @@
+"""Tests resource schema compilation."""
+
+import asyncio
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import jsonschema
+import pytest
+
+from bounce.metrics import REGISTRY
+from bounce.server.resource import (EACH, Payload, ResourceMeta,
+                                    apply_defaults, as_sent, validate)
+from bounce.server.resource.membership import (GetMembershipsRequest,
+                                               GetMembershipsResponse)
+from bounce.server.resource.user import GetUserResponse, PostUsersRequest
+
+
+def test_resource_meta__compiles_validators():
+    assert isinstance(PostUsersRequest.__body_validator__,
+                      jsonschema.Draft4Validator)
+    assert not hasattr(PostUsersRequest, '__params_validator__')
+    # The validator checks formats
+    with pytest.raises(jsonschema.ValidationError):
+        GetUserResponse.__body_validator__.validate({
+            'full_name': 'Test User',
+            'username': 'test',
+            'email': 'not an email',
+            'bio': '',
+            'id': 1,
+            'created_at': 0,
+        })
+
+
+def test_resource_meta__compiles_defaults():
+    assert GetMembershipsRequest.__params_defaults__ == [((), 'format',
+                                                          'json')]
+    # Nothing to do for each roster entry
+    assert GetMembershipsResponse.__body_defaults__ == []
+
+
+def test_apply_defaults():
+    plan = [((), 'size', '20'), (('results', EACH), 'bio', ''),
+            (('owner', ), 'role', 'Member')]
+    info = {
+        'page': '1',
+        'size': '',
+        'results': [{'bio': 'Hi'}, {}, 'not an object'],
+    }
+    assert apply_defaults(plan, info) is info
+    assert info == {
+        'page': '1',
+        'size': '20',
+        'results': [{'bio': 'Hi'}, {'bio': ''}, 'not an object'],
+    }
+    assert apply_defaults(plan, None) is None
+
+
+def test_resource_meta__invalid_schema():
+    with pytest.raises(jsonschema.ValidationError) as err:
+
+        # pylint: disable=unused-variable
+        class BadRequest(metaclass=ResourceMeta):
+            __params__ = {'type': 'not a type'}
+
+    assert 'params schema' in str(err.value)
+
+
+class ThingResponse(metaclass=ResourceMeta):
+    """A response resource for testing."""
+    __body__ = {
+        'type': 'object',
+        'required': ['name', 'created_at'],
+        'properties': {
+            'name': {
+                'type': 'string',
+            },
+            'description': {
+                'type': 'string',
+                'default': 'none',
+            },
+            'created_at': {
+                'type': 'integer',
+            },
+        }
+    }
+
+
+def respond(body, rate):
+    """Returns the response a validated handler returning the given body
+    gives on a server with the given response validation rate."""
+
+    @validate(None, ThingResponse)
+    async def handler(_endpoint, _session, _request):
+        return Payload(body, headers={'X-Test': 'yes'})
+
+    endpoint = SimpleNamespace(
+        server=SimpleNamespace(
+            config=SimpleNamespace(response_validation_rate=rate)))
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(handler(endpoint, None, None))
+    finally:
+        loop.close()
+
+
+def test_validate__serializes_payload_once():
+    created_at = datetime(2018, 5, 1, tzinfo=timezone.utc)
+    result = respond({'name': 'thing', 'created_at': created_at}, 1)
+    assert result.status == 200
+    assert result.headers['X-Test'] == 'yes'
+    body = json.loads(result.body)
+    assert body['name'] == 'thing'
+    assert body['description'] == 'none'
+    assert body['created_at'] == int(created_at.timestamp())
+
+
+def test_validate__datetimes_as_sent():
+    created_at = datetime(2018, 5, 1, tzinfo=timezone.utc)
+    # Schemas check the types clients receive
+    with pytest.raises(jsonschema.ValidationError):
+        ThingResponse.__body_validator__.validate({
+            'name': 'thing',
+            'created_at': created_at,
+        })
+    assert as_sent([{'created_at': created_at}, 'thing']) == [{
+        'created_at': int(created_at.timestamp())
+    }, 'thing']
+
+
+def test_validate__schema_drift():
+    drifted = REGISTRY.counter('responses.schema_drift').value
+    # Every response is validated, so a bad one is an error
+    assert respond({'name': 'thing'}, 1).status == 500
+    assert REGISTRY.counter('responses.schema_drift').value == drifted + 1
+    # Unvalidated responses are sent as is
+    assert respond({'name': 'thing'}, 0).status == 200
+    assert REGISTRY.counter('responses.schema_drift').value == drifted + 1